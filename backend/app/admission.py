@@ -0,0 +1,253 @@
+"""Control de admisión: límites por IP y por clase de ruta, para HTTP, WebSocket, FTP, SMTP y DNS.
+
+Cada petición se clasifica (inference, auth, upload, download, websocket,
+session, dns o default) y antes de ejecutarla se comprueba, en este orden:
+
+1. la concurrencia global de la clase  -> 503 si está llena
+2. la concurrencia de esa IP en la clase -> 429
+3. el token bucket de esa IP en la clase -> 429 con Retry-After exacto
+
+Todo se decide en memoria y en O(clases): por IP se guarda un objeto con
+__slots__ y dos listas (tokens y peticiones en curso por clase). Las IPs
+inactivas durante ADMISSION_CLIENT_TTL segundos se eliminan en un barrido que
+corre como mucho una vez por ADMISSION_SWEEP_SECONDS, dentro de admit().
+"""
+import json
+import math
+import time
+from typing import Optional
+
+from app.config import settings
+from app.metrics import registry
+
+admission_rejections = registry.counter(
+    "admission_rejections_total", "Peticiones rechazadas por el control de admisión.", ("route_class", "reason")
+)
+
+
+class RouteClass:
+    __slots__ = ("name", "index", "rate", "burst", "per_client", "global_limit", "in_flight")
+
+    def __init__(self, name: str, index: int, spec: str):
+        # spec = "peticiones/s / ráfaga / concurrencia por IP / concurrencia global" (0 = sin límite)
+        rate, burst, per_client, global_limit = (float(part) for part in spec.split("/"))
+        self.name = name
+        self.index = index
+        self.rate = rate
+        self.burst = max(burst, 1.0) if rate else 0.0
+        self.per_client = int(per_client)
+        self.global_limit = int(global_limit)
+        self.in_flight = 0
+
+    def config(self) -> dict:
+        return {
+            "rate_per_second": self.rate or None,
+            "burst": self.burst or None,
+            "per_client_concurrency": self.per_client or None,
+            "global_concurrency": self.global_limit or None,
+        }
+
+
+class _Client:
+    __slots__ = ("tokens", "in_flight", "updated")
+
+    def __init__(self, classes: list[RouteClass], now: float):
+        self.tokens = [c.burst for c in classes]
+        self.in_flight = [0] * len(classes)
+        self.updated = now
+
+
+class Rejection:
+    __slots__ = ("status", "retry_after", "reason")
+
+    def __init__(self, status: int, retry_after: float, reason: str):
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionController:
+    def __init__(self, limits: dict[str, str], exempt: tuple = (), client_ttl: float = 300.0,
+                 sweep_interval: float = 30.0, enabled: bool = True):
+        self.classes = {name: RouteClass(name, i, spec) for i, (name, spec) in enumerate(limits.items())}
+        self._class_list = list(self.classes.values())
+        self.clients: dict[str, _Client] = {}
+        self.exempt = frozenset(exempt)
+        self.client_ttl = client_ttl
+        self.sweep_interval = sweep_interval
+        self.enabled = enabled
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.expired = 0
+
+    def admit(self, client: str, class_name: str) -> Optional[Rejection]:
+        """Reserva un lugar para client en la clase; None si se admite (luego hay que llamar a release)."""
+        route_class = self.classes[class_name]
+        route_class.in_flight += 1
+        if not self.enabled or client in self.exempt:
+            return None
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        rejection = None
+        state = self.clients.get(client)
+        if state is None:
+            state = self.clients[client] = _Client(self._class_list, now)
+        elif now > state.updated:
+            # Recarga perezosa de todos los buckets de la IP
+            elapsed = now - state.updated
+            tokens = state.tokens
+            for c in self._class_list:
+                if c.rate and tokens[c.index] < c.burst:
+                    tokens[c.index] = min(c.burst, tokens[c.index] + elapsed * c.rate)
+            state.updated = now
+
+        i = route_class.index
+        if route_class.global_limit and route_class.in_flight > route_class.global_limit:
+            rejection = Rejection(503, 1.0, "global_concurrency")
+        elif route_class.per_client and state.in_flight[i] >= route_class.per_client:
+            rejection = Rejection(429, 1.0, "client_concurrency")
+        elif route_class.rate and state.tokens[i] < 1.0:
+            rejection = Rejection(429, (1.0 - state.tokens[i]) / route_class.rate, "rate")
+
+        if rejection is not None:
+            route_class.in_flight -= 1
+            admission_rejections.inc(route_class=class_name, reason=rejection.reason)
+            return rejection
+        if route_class.rate:
+            state.tokens[i] -= 1.0
+        state.in_flight[i] += 1
+        return None
+
+    def release(self, client: str, class_name: str) -> None:
+        route_class = self.classes[class_name]
+        route_class.in_flight -= 1
+        state = self.clients.get(client)
+        if state is not None and state.in_flight[route_class.index] > 0:
+            state.in_flight[route_class.index] -= 1
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Elimina las IPs sin actividad ni peticiones en curso durante client_ttl."""
+        now = time.monotonic() if now is None else now
+        self._next_sweep = now + self.sweep_interval
+        cutoff = now - self.client_ttl
+        idle = [ip for ip, state in self.clients.items() if state.updated < cutoff and not any(state.in_flight)]
+        for ip in idle:
+            del self.clients[ip]
+        self.expired += len(idle)
+        return len(idle)
+
+    def in_flight_by_class(self) -> dict:
+        return {(c.name,): c.in_flight for c in self._class_list}
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "tracked_clients": len(self.clients),
+            "expired_clients": self.expired,
+            "classes": {c.name: {**c.config(), "in_flight": c.in_flight} for c in self._class_list},
+        }
+
+
+# Clasificación por prefijo de ruta: va antes del router, así que no hay plantillas todavía
+HTTP_ROUTE_CLASSES = (
+    ("/predict", "inference"),
+    ("/login", "auth"),
+    ("/register", "auth"),
+    ("/streaming/upload", "upload"),
+    ("/ftp/upload", "upload"),
+    ("/web/bundle", "upload"),
+    ("/web/deploy", "upload"),
+    ("/streaming/play/", "download"),
+    ("/streaming/record/", "download"),
+    ("/ftp/download/", "download"),
+    ("/ftp/archive", "download"),
+)
+
+
+def classify(scope) -> str:
+    if scope["type"] == "websocket":
+        return "websocket"
+    path = scope["path"]
+    for prefix, class_name in HTTP_ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return class_name
+    return "default"
+
+
+admission = AdmissionController(
+    {
+        "inference": settings.ADMISSION_INFERENCE,
+        "auth": settings.ADMISSION_AUTH,
+        "upload": settings.ADMISSION_UPLOAD,
+        "download": settings.ADMISSION_DOWNLOAD,
+        "websocket": settings.ADMISSION_WEBSOCKET,
+        "session": settings.ADMISSION_SESSION,
+        "dns": settings.ADMISSION_DNS,
+        "default": settings.ADMISSION_DEFAULT,
+    },
+    exempt=tuple(settings.ADMISSION_EXEMPT_IPS),
+    client_ttl=settings.ADMISSION_CLIENT_TTL,
+    sweep_interval=settings.ADMISSION_SWEEP_SECONDS,
+    enabled=settings.ADMISSION_ENABLED,
+)
+registry.gauge(
+    "admission_in_flight", "Peticiones y conexiones admitidas en curso por clase.", ("route_class",),
+    collect=admission.in_flight_by_class,
+)
+registry.gauge(
+    "admission_tracked_clients", "IPs con estado en el control de admisión.",
+    collect=lambda: len(admission.clients),
+)
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI que aplica el control de admisión a HTTP y WebSocket.
+
+    Rechaza antes de tocar el router: 429/503 con Retry-After y el mismo cuerpo
+    {"detail": ...} que HTTPException. Un WebSocket rechazado recibe la misma
+    respuesta HTTP si el servidor soporta la extensión websocket.http.response,
+    y si no se cierra con el código 1013 (try again later).
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        client = scope["client"][0] if scope.get("client") else "unknown"
+        class_name = classify(scope)
+        rejection = self.controller.admit(client, class_name)
+        if rejection is not None:
+            await self._reject(scope, receive, send, rejection)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(client, class_name)
+
+    async def _reject(self, scope, receive, send, rejection: Rejection) -> None:
+        detail = "Demasiadas peticiones" if rejection.status == 429 else "Servicio saturado, intente más tarde"
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", rejection.retry_after_header.encode("ascii")),
+        ]
+        if scope["type"] == "http":
+            await send({"type": "http.response.start", "status": rejection.status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+        await receive()  # websocket.connect
+        if "websocket.http.response" in scope.get("extensions", {}):
+            await send({"type": "websocket.http.response.start", "status": rejection.status, "headers": headers})
+            await send({"type": "websocket.http.response.body", "body": body})
+        else:
+            await send({"type": "websocket.close", "code": 1013})
@@ -0,0 +1,190 @@
+"""Planificador de ancho de banda para /streaming/play y /ftp/download.
+
+Dos niveles de token bucket con reserva: uno global (el uplink completo) y
+uno por cliente (IP). Cada chunk reserva sus bytes en ambos buckets y espera
+lo que indique el más atrasado. Como una transferencia solo pide el siguiente
+chunk después de enviar el anterior, las reservas se atienden en orden de
+llegada y el ancho de banda global se reparte por turnos entre las
+transferencias activas (fair queuing con quantum = un chunk).
+
+El bucket de cada cliente admite una ráfaga de BANDWIDTH_BURST_SECONDS a su
+tasa (más un chunk), para que la reproducción arranque rápido. La ráfaga es del
+cliente y no de cada transferencia: abrir varias a la vez no la multiplica. El
+límite global se respeta siempre. Una tasa 0 significa sin límite.
+
+Los buckets de clientes sin transferencias en curso se eliminan tras
+BANDWIDTH_CLIENT_TTL segundos sin uso (nunca antes de que se hayan recargado
+por completo, así que eliminarlos no regala ráfaga), en un barrido que corre
+como mucho una vez por BANDWIDTH_SWEEP_SECONDS.
+"""
+import asyncio
+import itertools
+import os
+import time
+from typing import AsyncIterator, Optional
+
+import aiofiles
+
+from app.metrics import bytes_streamed
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Descuenta amount (puede quedar en deuda) y devuelve cuántos segundos esperar."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class Transfer:
+    def __init__(self, transfer_id: int, kind: str, client: str, name: str, size: int):
+        self.id = transfer_id
+        self.kind = kind
+        self.client = client
+        self.name = name
+        self.size = size
+        self.bytes_sent = 0
+        self.throttled_seconds = 0.0
+        self.started = time.monotonic()
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "client": self.client,
+            "file": self.name,
+            "bytes_sent": self.bytes_sent,
+            "bytes_total": self.size,
+            "elapsed_seconds": round(elapsed, 3),
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "throughput_bytes_per_second": round(self.bytes_sent / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+class BandwidthScheduler:
+    def __init__(self, global_rate: int = 0, client_rate: int = 0, burst_seconds: float = 0.0,
+                 chunk_size: int = 256 * 1024, client_ttl: float = 300.0, sweep_interval: float = 30.0):
+        self.global_rate = global_rate
+        self.client_rate = client_rate
+        self.burst_seconds = burst_seconds
+        self.chunk_size = chunk_size
+        # Global: capacidad de un chunk, sin ráfagas por encima de la tasa
+        self.global_bucket = TokenBucket(global_rate, chunk_size) if global_rate else None
+        self.client_capacity = chunk_size + client_rate * burst_seconds
+        # Un bucket sin uso durante capacidad/tasa ya está lleno: igual que uno nuevo
+        self.client_ttl = max(client_ttl, self.client_capacity / client_rate) if client_rate else client_ttl
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.client_buckets: dict[str, TokenBucket] = {}
+        self.transfers: dict[int, Transfer] = {}
+        self._ids = itertools.count(1)
+        self.completed = 0
+        self.bytes_total = 0
+        self.expired_clients = 0
+
+    def _client_bucket(self, client: str) -> Optional[TokenBucket]:
+        if not self.client_rate:
+            return None
+        bucket = self.client_buckets.get(client)
+        if bucket is None:
+            bucket = self.client_buckets[client] = TokenBucket(self.client_rate, self.client_capacity)
+        return bucket
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Elimina los buckets de clientes sin transferencias en curso ni uso durante client_ttl."""
+        now = time.monotonic() if now is None else now
+        self._next_sweep = now + self.sweep_interval
+        cutoff = now - self.client_ttl
+        active = {t.client for t in self.transfers.values()}
+        idle = [c for c, bucket in self.client_buckets.items() if bucket.updated < cutoff and c not in active]
+        for client in idle:
+            del self.client_buckets[client]
+        self.expired_clients += len(idle)
+        return len(idle)
+
+    def open(self, kind: str, client: str, name: str, size: int) -> Transfer:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+        transfer = Transfer(next(self._ids), kind, client, name, size)
+        self.transfers[transfer.id] = transfer
+        return transfer
+
+    def close(self, transfer: Transfer) -> None:
+        self.transfers.pop(transfer.id, None)
+        self.completed += 1
+
+    async def acquire(self, transfer: Transfer, amount: int) -> None:
+        delay = 0.0
+        bucket = self._client_bucket(transfer.client)
+        if bucket is not None:
+            delay = bucket.reserve(amount)
+        if self.global_bucket is not None:
+            delay = max(delay, self.global_bucket.reserve(amount))
+        if delay > 0:
+            transfer.throttled_seconds += delay
+            await asyncio.sleep(delay)
+
+    async def stream_file(self, path: str, start: int, end: int, kind: str, client: str) -> AsyncIterator[bytes]:
+        """Genera los bytes [start, end] de path respetando los límites de tasa."""
+        transfer = self.open(kind, client, os.path.basename(path), end - start + 1)
+        try:
+            async with aiofiles.open(path, "rb") as f:
+                await f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    size = min(self.chunk_size, remaining)
+                    await self.acquire(transfer, size)
+                    chunk = await f.read(size)
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    transfer.bytes_sent += len(chunk)
+                    self.bytes_total += len(chunk)
+                    bytes_streamed.inc(len(chunk), source=kind)
+                    yield chunk
+        finally:
+            self.close(transfer)
+
+    async def throttle(self, source: AsyncIterator[bytes], kind: str, client: str, name: str,
+                       size: int) -> AsyncIterator[bytes]:
+        """Aplica los límites a un flujo que se genera al vuelo (p. ej. un ZIP)."""
+        transfer = self.open(kind, client, name, size)
+        try:
+            async for chunk in source:
+                await self.acquire(transfer, len(chunk))
+                transfer.bytes_sent += len(chunk)
+                self.bytes_total += len(chunk)
+                bytes_streamed.inc(len(chunk), source=kind)
+                yield chunk
+        finally:
+            self.close(transfer)
+
+    def active_by_kind(self) -> dict:
+        counts: dict = {}
+        for transfer in list(self.transfers.values()):
+            counts[(transfer.kind,)] = counts.get((transfer.kind,), 0) + 1
+        return counts
+
+    def status(self) -> dict:
+        return {
+            "global_rate_bytes_per_second": self.global_rate or None,
+            "client_rate_bytes_per_second": self.client_rate or None,
+            "burst_seconds": self.burst_seconds,
+            "chunk_size": self.chunk_size,
+            "active_transfers": len(self.transfers),
+            "tracked_clients": len(self.client_buckets),
+            "expired_clients": self.expired_clients,
+            "completed_transfers": self.completed,
+            "bytes_total": self.bytes_total,
+            "transfers": [t.stats() for t in self.transfers.values()],
+        }
@@ -7,6 +7,123 @@ class Settings(BaseSettings):
     EMAIL_PASSWORD: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60  # 1 hour expiration
 
+    # Base de datos: pool y caches de sentencias
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 256
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
+    # Auth: pool de bcrypt y cache de tokens verificados
+    PASSWORD_HASH_WORKERS: int = 4
+    TOKEN_CACHE_TTL_SECONDS: int = 60
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 300
+    USER_CACHE_MAX_ENTRIES: int = 10000
+
+    # Correo: servidores IMAP/SMTP (Gmail por defecto) y relay local de /mail/send
+    MAIL_IMAP_HOST: str = "imap.gmail.com"
+    MAIL_IMAP_PORT: int = 993
+    MAIL_IMAP_SSL: bool = True
+    MAIL_SMTP_HOST: str = "smtp.gmail.com"
+    MAIL_SMTP_PORT: int = 465
+    MAIL_SMTP_SSL: bool = True
+    MAIL_RELAY_HOST: str = "localhost"
+    MAIL_RELAY_PORT: int = 1025
+    # Bandeja: bytes del texto que se bajan para la vista previa y tamaño de cada FETCH de adjuntos
+    MAIL_PREVIEW_BYTES: int = 64 * 1024
+    MAIL_FETCH_CHUNK_BYTES: int = 512 * 1024
+
+    # Web: tamaño máximo descomprimido de un bundle
+    WEB_BUNDLE_MAX_BYTES: int = 200 * 1024 * 1024
+
+    # Observabilidad: nivel y formato de logs ("text" o "json"), /metrics
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"
+    METRICS_ENABLED: bool = True
+
+    # Ancho de banda de /streaming/play y /ftp/download (bytes/s, 0 = sin límite)
+    BANDWIDTH_GLOBAL_BYTES_PER_SEC: int = 0
+    BANDWIDTH_CLIENT_BYTES_PER_SEC: int = 0
+    BANDWIDTH_BURST_SECONDS: float = 5.0
+    BANDWIDTH_CHUNK_BYTES: int = 256 * 1024
+    BANDWIDTH_CLIENT_TTL: float = 300.0
+    BANDWIDTH_SWEEP_SECONDS: float = 30.0
+    # Nivel de deflate de /ftp/archive para archivos no comprimidos (la media va sin comprimir)
+    ZIP_COMPRESS_LEVEL: int = 6
+
+    # Grabación (DVR) de los streams en vivo en STREAMING_DIR
+    RECORDING_ENABLED: bool = True
+    RECORDING_AUTO: bool = False
+    RECORDING_FLUSH_BYTES: int = 1024 * 1024
+    RECORDING_FLUSH_INTERVAL: float = 1.0
+    RECORDING_INDEX_INTERVAL: float = 1.0
+    RECORDING_MAX_BUFFER_BYTES: int = 64 * 1024 * 1024
+
+    # Catálogo de media: análisis en segundo plano con ffprobe/ffmpeg (si están en el PATH)
+    MEDIA_PROBE_WORKERS: int = 2
+    MEDIA_PROBE_TIMEOUT: float = 30.0
+    FFPROBE_PATH: str = "ffprobe"
+    FFMPEG_PATH: str = "ffmpeg"
+    MEDIA_POSTER_WIDTH: int = 320
+
+    # Servidores de protocolo en el mismo event loop (FTP pasivo, DNS UDP, SMTP)
+    SERVICES_ENABLED: bool = True
+    SERVICES_HOST: str = "127.0.0.1"
+    FTP_PORT: int = 2121
+    FTP_ALLOW_ANONYMOUS: bool = False
+    FTP_PASSIVE_ADDRESS: str | None = None
+    DNS_PORT: int = 5353
+    DNS_TTL: int = 60
+    DNS_RECORDS_FILE: str = "dns_records.json"
+    SMTP_PORT: int = 1025
+    SMTP_MAX_MESSAGE_BYTES: int = 25 * 1024 * 1024
+
+    # Servidor de producción (python -m app.serve); SERVER_WORKERS=0 usa un worker por CPU
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 1
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    SERVER_LIMIT_CONCURRENCY: int | None = None
+    SERVER_MAX_REQUESTS: int | None = None
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: int = 30
+    SERVER_ACCESS_LOG: bool = False
+    WS_MAX_MESSAGE_BYTES: int = 16 * 1024 * 1024
+    WS_MAX_QUEUE: int = 32
+    WS_PING_INTERVAL: float | None = 20.0
+    WS_PING_TIMEOUT: float | None = 20.0
+    WS_PER_MESSAGE_DEFLATE: bool = False
+    # Al apagar, los WebSockets se liberan escalonados en esta ventana; vigencia de los resume tokens
+    WS_DRAIN_JITTER_SECONDS: float = 10.0
+    WS_RESUME_TTL_SECONDS: int = 300
+
+    # Control de admisión por IP. Cada clase: "peticiones/s/ráfaga/concurrencia por IP/concurrencia global"
+    # (0 = sin límite). session = conexiones FTP/SMTP, dns = consultas UDP
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_INFERENCE: str = "20/40/4/64"
+    ADMISSION_AUTH: str = "2/10/4/0"
+    ADMISSION_UPLOAD: str = "2/10/2/32"
+    ADMISSION_DOWNLOAD: str = "20/60/8/512"
+    ADMISSION_WEBSOCKET: str = "2/10/8/2000"
+    ADMISSION_SESSION: str = "5/20/8/200"
+    ADMISSION_DNS: str = "50/100/0/0"
+    ADMISSION_DEFAULT: str = "50/200/32/0"
+    ADMISSION_EXEMPT_IPS: list[str] = []
+    ADMISSION_CLIENT_TTL: float = 300.0
+    ADMISSION_SWEEP_SECONDS: float = 30.0
+
+    # Diagnóstico: endpoints /debug (profiler y monitor del event loop)
+    DIAGNOSTICS_ENABLED: bool = False
+    LOOP_LAG_MONITOR: bool = False
+    LOOP_LAG_THRESHOLD_MS: int = 100
+    LOOP_LAG_INTERVAL_MS: int = 50
+    PROFILER_MAX_SECONDS: int = 60
+    PROFILER_MAX_HZ: int = 1000
+
     class Config:
         env_file = "app/.env"
 
@@ -1,10 +1,205 @@
+import time
+import logging
+import threading
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
+from app.metrics import registry
+from app.models import Base
 
-engine = create_async_engine(settings.DATABASE_URL, future=True, echo=True)
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """Acumula el tiempo de espera al obtener conexiones del pool."""
+
+    # Límites superiores (segundos) del histograma de espera
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.errors = 0
+        self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+            else:
+                self.bucket_counts[-1] += 1
+
+    def observe_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def observe_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets = {str(b): c for b, c in zip(self.BUCKETS, self.bucket_counts)}
+            buckets["+Inf"] = self.bucket_counts[-1]
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "wait_seconds_total": self.wait_total,
+                "wait_seconds_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+                "wait_seconds_max": self.wait_max,
+                "wait_seconds_buckets": buckets,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Pool que mide cuánto tarda cada checkout.
+
+    El tiempo medido incluye la espera en la cola y, cuando el pool abre una
+    conexión nueva (hasta pool_size + max_overflow), también el connect al
+    servidor: no es solo contención del pool.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.observe_timeout()
+            raise
+        except Exception:
+            # Fallos al conectar (servidor caído, credenciales): no son timeouts del pool
+            pool_metrics.observe_error()
+            raise
+        pool_metrics.observe(time.perf_counter() - start)
+        return conn
+
+
+def _engine_options(database_url: str) -> tuple:
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    options = {"echo": settings.DB_ECHO, "future": True}
+    connect_args = {}
+
+    in_memory = backend == "sqlite" and url.database in (None, "", ":memory:")
+    if not in_memory:
+        options.update(
+            poolclass=TimedAsyncQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+
+    if backend == "postgresql":
+        # Cache de prepared statements: el del dialecto de SQLAlchemy y el de asyncpg
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+        )
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+    elif backend == "sqlite":
+        connect_args["timeout"] = settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+
+    if connect_args:
+        options["connect_args"] = connect_args
+    return url, options
+
+
+_url, _options = _engine_options(settings.DATABASE_URL)
+engine = create_async_engine(_url, **_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
 
+
+if _url.get_backend_name() == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL permite lectores concurrentes con un escritor; busy_timeout evita
+        # "database is locked" inmediato cuando hay contención.
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+def pool_status() -> dict:
+    status = pool_metrics.snapshot()
+    pool = engine.sync_engine.pool
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    return status
+
+def _pool_gauge(key: str):
+    return lambda: pool_status().get(key, 0)
+
+
+for _key, _doc in (
+    ("checked_out", "Conexiones del pool en uso."),
+    ("overflow", "Conexiones abiertas por encima de pool_size."),
+):
+    registry.gauge(f"db_pool_{_key}", _doc, collect=_pool_gauge(_key))
+registry.counter("db_pool_checkouts_total", "Checkouts del pool.", collect=_pool_gauge("checkouts"))
+registry.counter("db_pool_timeouts_total", "Checkouts que agotaron pool_timeout.", collect=_pool_gauge("timeouts"))
+registry.counter(
+    "db_pool_checkout_errors_total", "Checkouts fallidos por otros errores (p. ej. al conectar).",
+    collect=_pool_gauge("errors"),
+)
+registry.counter(
+    "db_pool_wait_seconds_total", "Tiempo total de checkout del pool (cola y apertura de conexiones).",
+    collect=_pool_gauge("wait_seconds_total"),
+)
+
+
+def _users_columns(sync_conn) -> list:
+    return [c["name"] for c in inspect(sync_conn).get_columns("users")]
+
+
+async def _add_mail_password_column() -> None:
+    # create_all no altera tablas existentes: las creadas antes de mail_password no la tienen
+    async with engine.begin() as conn:
+        if "mail_password" in await conn.run_sync(_users_columns):
+            return
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("ALTER TABLE users ADD COLUMN mail_password VARCHAR"))
+    except DBAPIError as e:
+        # Otro worker pudo agregarla al mismo tiempo
+        async with engine.begin() as conn:
+            if "mail_password" in await conn.run_sync(_users_columns):
+                return
+        raise RuntimeError(
+            "La tabla users no tiene la columna mail_password y no se pudo agregar; "
+            "ejecute: ALTER TABLE users ADD COLUMN mail_password VARCHAR"
+        ) from e
+    logger.info("db_column_added", extra={"table": "users", "column": "mail_password"})
+
+
+async def init_models():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await _add_mail_password_column()
+
 async def get_db():
     async with SessionLocal() as session:
         yield session
@@ -1,28 +1,47 @@
+import time
 from fastapi import Depends, HTTPException, status
 import jwt
+from app.cache import TTLCache
 from app.config import settings
 from app.database import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models import User
+from app.repository import user_repository
 from app.schemas import UserResponse
 
+# Tokens ya verificados -> usuario. La clave es el token completo (incluye la
+# firma), y cada entrada vive como máximo hasta el "exp" del propio token.
+token_cache = TTLCache(
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES,
+    ttl=settings.TOKEN_CACHE_TTL_SECONDS,
+)
+
 async def get_current_user(token: str, db: AsyncSession = Depends(get_db)) -> UserResponse:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+    cached = token_cache.get(token)
+    if cached is not None:
+        expires_at, user = cached
+        if expires_at > time.time():
+            return user
+        token_cache.pop(token)
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-    except JWTError:
+    except jwt.PyJWTError:
         raise credentials_exception
 
-    user = await db.execute("SELECT * FROM users WHERE username = :username", {"username": username})
-    user = user.fetchone()
+    user = await user_repository.get_by_username(db, username)
     if user is None:
         raise credentials_exception
 
-    return UserResponse(id=user.id, username=user.username)
+    user = UserResponse(id=user.id, username=user.username)
+    expires_at = payload.get("exp", 0)
+    token_cache.set(token, (expires_at, user), ttl=expires_at - time.time())
+    return user
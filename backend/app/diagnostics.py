@@ -0,0 +1,226 @@
+"""Diagnóstico en producción: monitor de bloqueo del event loop y profiler por muestreo.
+
+LoopLagMonitor: una tarea del loop actualiza un latido cada interval segundos
+y un hilo vigilante compara contra el reloj; si el latido se atrasa más de
+threshold, el loop está bloqueado por código síncrono y se registra la pila
+actual del hilo del loop (que apunta al handler culpable).
+
+SamplingProfiler: un hilo toma sys._current_frames() a la frecuencia pedida
+y acumula las pilas en formato "collapsed" (frame;frame;frame N), que
+consumen directamente flamegraph.pl, speedscope o inferno.
+"""
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Retraso del latido del event loop respecto al intervalo esperado.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+loop_stalls = registry.counter("event_loop_stalls_total", "Bloqueos del event loop por encima del umbral.")
+
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def collapse_stack(frame, limit: int = 128) -> str:
+    """Pila de la raíz a la hoja, separada por ';' (formato collapsed)."""
+    names = []
+    while frame is not None and len(names) < limit:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class LoopLagMonitor:
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, history: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: collections.deque = collections.deque(maxlen=history)
+        self.max_lag = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._beat(), name="loop-lag-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join(timeout=1)
+
+    async def _beat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def _watch(self) -> None:
+        stalled_since = None
+        poll = min(self.interval, self.threshold / 4)
+        while not self._stop.wait(poll):
+            behind = time.monotonic() - self._heartbeat - self.interval
+            if behind > self.threshold and stalled_since is None:
+                stalled_since = self._heartbeat
+                self._report(behind)
+            elif behind <= self.threshold and stalled_since is not None:
+                duration = self._heartbeat - stalled_since
+                logger.warning("event_loop_recovered", extra={"blocked_ms": round(duration * 1000, 1)})
+                if self.stalls:
+                    self.stalls[-1]["blocked_ms"] = round(duration * 1000, 1)
+                stalled_since = None
+
+    def _report(self, behind: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        stall = {
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "lag_ms": round(behind * 1000, 1),
+            "task": task.get_name() if task is not None else None,
+            "coroutine": getattr(task.get_coro(), "__qualname__", None) if task is not None else None,
+            "frame": _format_frame(frame) if frame is not None else None,
+            "stack": "".join(stack[-30:]),
+        }
+        self.stalls.append(stall)
+        loop_stalls.inc()
+        logger.warning("event_loop_blocked", extra=dict(stall))
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "interval_ms": self.interval * 1000,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": list(self.stalls),
+        }
+
+
+class SamplingProfiler:
+    """Muestrea las pilas de los hilos del proceso; un perfil a la vez."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float, hz: int, thread_ids: Optional[set] = None) -> tuple[collections.Counter, int]:
+        """Bloqueante: ejecutar en un hilo. Devuelve (pilas collapsed -> conteo, número de muestras)."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Ya hay un perfil en curso")
+        try:
+            own = threading.get_ident()
+            stacks: collections.Counter = collections.Counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            period = 1.0 / hz
+            deadline = time.monotonic() + seconds
+            samples = 0
+            next_tick = time.monotonic()
+            while next_tick < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own or (thread_ids is not None and ident not in thread_ids):
+                        continue
+                    thread = names.get(ident, str(ident))
+                    stacks[f"{thread};{collapse_stack(frame)}"] += 1
+                samples += 1
+                next_tick += period
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            return stacks, samples
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def render_collapsed(stacks: collections.Counter) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+loop_monitor = LoopLagMonitor(
+    threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000,
+    interval=settings.LOOP_LAG_INTERVAL_MS / 1000,
+)
+profiler = SamplingProfiler()
+
+# Solo se monta con DIAGNOSTICS_ENABLED=true (ver app/main.py)
+router = APIRouter(prefix="/debug")
+
+
+@router.get("/loop")
+async def loop_status():
+    return loop_monitor.status()
+
+
+@router.post("/loop")
+async def toggle_loop_monitor(enabled: bool = True):
+    if enabled:
+        loop_monitor.start()
+    else:
+        await loop_monitor.stop()
+    return loop_monitor.status()
+
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    hz: int = Query(100, ge=1),
+    threads: str = Query("all", pattern="^(all|loop)$"),
+    download: bool = False,
+):
+    """Perfila el proceso durante los próximos `seconds` y devuelve pilas collapsed.
+
+    La salida se pasa tal cual a flamegraph.pl o se abre en speedscope.app.
+    """
+    seconds = min(seconds, settings.PROFILER_MAX_SECONDS)
+    hz = min(hz, settings.PROFILER_MAX_HZ)
+    thread_ids = {threading.get_ident()} if threads == "loop" else None
+    try:
+        stacks, samples = await asyncio.to_thread(profiler.sample, seconds, hz, thread_ids)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    headers = {"X-Profile-Samples": str(samples), "X-Profile-Seconds": str(seconds)}
+    if download:
+        headers["Content-Disposition"] = f'attachment; filename="profile-{time.strftime("%Y%m%d-%H%M%S")}.collapsed"'
+    return PlainTextResponse(profiler.render_collapsed(stacks), headers=headers)
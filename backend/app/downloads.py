@@ -0,0 +1,236 @@
+"""Descargas de archivos: rangos HTTP (Range / If-Range) y ZIP generados al vuelo.
+
+ZipStream arma el ZIP mientras se envía: cada entrada lleva un data
+descriptor (el CRC se calcula leyendo), así no hace falta ni un archivo
+temporal ni tener el ZIP en memoria; el consumo es un chunk por transferencia.
+La media y los formatos ya comprimidos van "stored" y el resto con deflate.
+Si todas las entradas son stored el tamaño final se conoce de antemano y se
+puede enviar Content-Length. Se usa ZIP64 cuando un archivo, un offset o la
+cantidad de entradas no caben en los campos de 32/16 bits.
+"""
+import asyncio
+import mimetypes
+import os
+import struct
+import time
+import zlib
+from email.utils import formatdate
+from typing import AsyncIterator, Optional
+
+import aiofiles
+
+# --- Rangos ---
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def file_validators(st: os.stat_result) -> tuple[str, str]:
+    """(ETag, Last-Modified) a partir de mtime y tamaño, sin leer el archivo."""
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    return etag, formatdate(st.st_mtime, usegmt=True)
+
+
+def parse_range(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """Rango único "bytes=a-b", "bytes=a-" o "bytes=-n" -> (inicio, fin) inclusivo.
+
+    Devuelve None si no hay rango, si la sintaxis no es válida o si pide
+    varios rangos (se responde el archivo completo, RFC 9110 14.2). Lanza
+    RangeNotSatisfiable si el rango queda fuera del archivo.
+    """
+    unit, _, spec = range_header.strip().partition("=")
+    if unit.strip().lower() != "bytes" or not spec or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            # Sufijo: los últimos n bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def if_range_matches(if_range: Optional[str], etag: str, last_modified: str) -> bool:
+    """True si no hay If-Range o si el validador coincide (comparación fuerte)."""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    return if_range == last_modified
+
+
+# --- ZIP en streaming ---
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+STORED = 0
+DEFLATED = 8
+
+# Formatos que ya vienen comprimidos: deflate solo gastaría CPU
+COMPRESSED_EXTENSIONS = {
+    "zip", "gz", "tgz", "bz2", "xz", "7z", "rar", "zst", "br", "jar", "apk", "docx", "xlsx", "pptx",
+    "pdf", "woff", "woff2", "heic", "webp", "avif",
+}
+
+
+def is_compressed(name: str) -> bool:
+    extension = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    if extension in COMPRESSED_EXTENSIONS:
+        return True
+    media_type = mimetypes.guess_type(name)[0] or ""
+    return media_type.startswith(("video/", "audio/", "image/")) and media_type != "image/svg+xml"
+
+
+def _dos_datetime(mtime: float) -> tuple[int, int]:
+    t = time.localtime(max(mtime, 315619200))  # ZIP no representa fechas anteriores a 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), \
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class ZipEntry:
+    __slots__ = ("path", "name", "size", "mtime", "method", "zip64", "crc", "compressed_size", "offset")
+
+    def __init__(self, path: str, name: str, st: os.stat_result, method: int):
+        self.path = path
+        self.name = name.encode("utf-8")
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.method = method
+        # Deflate puede crecer un poco sobre datos incomprimibles
+        self.zip64 = self.size * (1.05 if method == DEFLATED else 1) >= ZIP64_LIMIT
+        self.crc = 0
+        self.compressed_size = self.size if method == STORED else 0
+        self.offset = 0
+
+    def local_header(self) -> bytes:
+        dos_time, dos_date = _dos_datetime(self.mtime)
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if self.zip64 else b""
+        sizes = ZIP64_LIMIT if self.zip64 else 0
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if self.zip64 else 20, FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            self.method, dos_time, dos_date, 0, sizes, sizes, len(self.name), len(extra),
+        ) + self.name + extra
+
+    def data_descriptor(self) -> bytes:
+        if self.zip64:
+            return struct.pack("<IIQQ", 0x08074B50, self.crc, self.compressed_size, self.size)
+        return struct.pack("<IIII", 0x08074B50, self.crc, self.compressed_size, self.size)
+
+    def central_header(self) -> bytes:
+        dos_time, dos_date = _dos_datetime(self.mtime)
+        values = []
+        size = self.size
+        compressed_size = self.compressed_size
+        offset = self.offset
+        if self.zip64 or size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT:
+            values += [size, compressed_size]
+            size = compressed_size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            values.append(offset)
+            offset = ZIP64_LIMIT
+        extra = struct.pack("<HH" + "Q" * len(values), 0x0001, 8 * len(values), *values) if values else b""
+        version = 45 if values else 20
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | version, version, FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            self.method, dos_time, dos_date, self.crc, compressed_size, size, len(self.name), len(extra),
+            0, 0, 0, 0o100644 << 16, offset,
+        ) + self.name + extra
+
+
+def _end_records(count: int, directory_offset: int, directory_size: int) -> bytes:
+    records = b""
+    if count > ZIP_FILECOUNT_LIMIT or directory_offset >= ZIP64_LIMIT or directory_size >= ZIP64_LIMIT:
+        zip64_end_offset = directory_offset + directory_size
+        records += struct.pack(
+            "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, directory_size, directory_offset,
+        )
+        records += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+        count = min(count, ZIP_FILECOUNT_LIMIT)
+        directory_offset = min(directory_offset, ZIP64_LIMIT)
+        directory_size = min(directory_size, ZIP64_LIMIT)
+    return records + struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, count, count, directory_size, directory_offset, 0,
+    )
+
+
+class ZipStream:
+    def __init__(self, files: list[tuple[str, str]], chunk_size: int = 256 * 1024, compress_level: int = 6):
+        """files: pares (ruta en disco, nombre dentro del ZIP)."""
+        self.chunk_size = chunk_size
+        self.compress_level = compress_level
+        self.entries = []
+        for path, name in files:
+            st = os.stat(path)
+            method = STORED if is_compressed(name) else DEFLATED
+            self.entries.append(ZipEntry(path, name, st, method))
+
+    def content_length(self) -> Optional[int]:
+        """Tamaño exacto del ZIP si todas las entradas son stored (el de deflate no se conoce)."""
+        if any(entry.method != STORED for entry in self.entries):
+            return None
+        offset = 0
+        directory_size = 0
+        for entry in self.entries:
+            entry.offset = offset
+            offset += len(entry.local_header()) + entry.size + len(entry.data_descriptor())
+        for entry in self.entries:
+            directory_size += len(entry.central_header())
+        return offset + directory_size + len(_end_records(len(self.entries), offset, directory_size))
+
+    async def _read_entry(self, entry: ZipEntry) -> AsyncIterator[bytes]:
+        compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15) if entry.method == DEFLATED else None
+        crc = 0
+        remaining = entry.size
+        compressed_size = 0
+        async with aiofiles.open(entry.path, "rb") as f:
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    # El archivo se achicó después del stat: el ZIP ya no sería coherente
+                    raise IOError(f"{entry.path} cambió durante la descarga")
+                remaining -= len(chunk)
+                crc = zlib.crc32(chunk, crc)
+                if compressor is not None:
+                    chunk = await asyncio.to_thread(compressor.compress, chunk)
+                    if not chunk:
+                        continue
+                compressed_size += len(chunk)
+                yield chunk
+        if compressor is not None:
+            tail = compressor.flush()
+            compressed_size += len(tail)
+            if tail:
+                yield tail
+        entry.crc = crc
+        entry.compressed_size = compressed_size
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            header = entry.local_header()
+            offset += len(header)
+            yield header
+            async for chunk in self._read_entry(entry):
+                offset += len(chunk)
+                yield chunk
+            descriptor = entry.data_descriptor()
+            offset += len(descriptor)
+            yield descriptor
+        directory = b"".join(entry.central_header() for entry in self.entries)
+        yield directory + _end_records(len(self.entries), offset, len(directory))
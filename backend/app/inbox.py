@@ -0,0 +1,359 @@
+"""Lectura de la bandeja IMAP sin descargar los mensajes completos.
+
+list_messages pide en un solo FETCH la cabecera (BODY.PEEK[HEADER]) y la
+estructura MIME (BODYSTRUCTURE) de los últimos mensajes; con la estructura se
+sabe qué parte es el texto y cuáles son adjuntos sin bajar ni un byte de
+ellos. Del texto se piden solo los primeros MAIL_PREVIEW_BYTES
+(BODY.PEEK[n]<0.N>). Cabeceras y texto se decodifican con BytesFeedParser.
+
+Los adjuntos se bajan bajo demanda, parte por parte y en trozos
+(BODY.PEEK[n]<offset.N>), decodificando base64/quoted-printable a medida que
+llegan: la memoria usada no depende del tamaño del adjunto.
+
+imaplib es bloqueante: todas las funciones de aquí se llaman con
+asyncio.to_thread desde las rutas.
+"""
+import binascii
+import email.policy
+import imaplib
+import re
+from email.header import decode_header, make_header
+from email.parser import BytesFeedParser
+from email.utils import parsedate_to_datetime
+from typing import Iterator, Optional
+from urllib.parse import unquote
+
+from app.config import settings
+
+
+class MailError(Exception):
+    pass
+
+
+def connect(user: str, password: str) -> imaplib.IMAP4:
+    if settings.MAIL_IMAP_SSL:
+        mail = imaplib.IMAP4_SSL(settings.MAIL_IMAP_HOST, settings.MAIL_IMAP_PORT)
+    else:
+        mail = imaplib.IMAP4(settings.MAIL_IMAP_HOST, settings.MAIL_IMAP_PORT)
+    try:
+        mail.login(user, password)
+        mail.select("inbox", readonly=True)
+    except Exception:
+        mail.shutdown()
+        raise
+    return mail
+
+
+def logout(mail: imaplib.IMAP4) -> None:
+    try:
+        mail.logout()
+    except Exception:
+        pass
+
+
+# --- Respuestas FETCH ---
+
+_TOKEN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}\r\n|(NIL)(?=[\s()])|([^\s()"]+))')
+
+
+def _join_response(data: list) -> bytes:
+    # imaplib entrega los literales {n} como tuplas (línea, contenido)
+    out = []
+    for item in data:
+        if isinstance(item, tuple):
+            out.append(item[0] + b"\r\n" + item[1])
+        elif item is not None:
+            out.append(item)
+    return b"".join(out)
+
+
+def _parse_items(data: bytes) -> list:
+    """Convierte la respuesta en listas anidadas; los strings quedan como bytes y NIL como None."""
+    stack: list = [[]]
+    pos = 0
+    while pos < len(data):
+        match = _TOKEN.match(data, pos)
+        if match is None:
+            if data[pos:].strip():
+                raise MailError("Respuesta IMAP inválida")
+            break
+        pos = match.end()
+        opened, closed, quoted, literal, nil, atom = match.groups()
+        if opened:
+            stack.append([])
+        elif closed:
+            if len(stack) == 1:
+                raise MailError("Respuesta IMAP inválida")
+            item = stack.pop()
+            stack[-1].append(item)
+        elif quoted is not None:
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", quoted))
+        elif literal is not None:
+            size = int(literal)
+            stack[-1].append(data[pos:pos + size])
+            pos += size
+        elif nil:
+            stack[-1].append(None)
+        else:
+            stack[-1].append(atom)
+    return stack[0]
+
+
+def parse_fetch(data: list) -> list[dict]:
+    """Respuesta de FETCH -> un dict por mensaje {"UID": b"5", "BODY[HEADER]": b"...", ...}."""
+    items = _parse_items(_join_response(data))
+    messages = []
+    for i in range(0, len(items) - 1, 2):
+        # Cada mensaje es "<número> (CLAVE valor CLAVE valor ...)"
+        values = items[i + 1]
+        if not isinstance(values, list):
+            continue
+        messages.append({
+            values[j].decode("ascii").upper(): values[j + 1] for j in range(0, len(values) - 1, 2)
+        })
+    return messages
+
+
+# --- BODYSTRUCTURE ---
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.decode("utf-8", "replace") if isinstance(value, bytes) else str(value)
+
+
+def _params(values) -> dict:
+    if not isinstance(values, list):
+        return {}
+    return {_text(values[i]).lower(): _text(values[i + 1]) for i in range(0, len(values) - 1, 2)}
+
+
+def _decode_filename(params: dict) -> Optional[str]:
+    for key in ("filename*", "name*"):
+        if params.get(key):
+            # RFC 2231: charset'idioma'valor-con-%XX
+            charset, _, rest = params[key].partition("'")
+            _, _, value = rest.partition("'")
+            return unquote(value, encoding=charset or "utf-8", errors="replace")
+    for key in ("filename", "name"):
+        if params.get(key):
+            return str(make_header(decode_header(params[key])))
+    return None
+
+
+def flatten_structure(node: list, prefix: str = "") -> list[dict]:
+    """Aplana BODYSTRUCTURE en la lista de partes hoja con su número IMAP ("1", "2.1", ...)."""
+    if node and isinstance(node[0], list):
+        # Multipart: primero las partes hijas, después el subtipo y la extensión
+        parts = []
+        for i, child in enumerate(node):
+            if not isinstance(child, list):
+                break
+            parts += flatten_structure(child, f"{prefix}{i + 1}.")
+        return parts
+
+    main_type = (_text(node[0]) or "application").lower()
+    sub_type = (_text(node[1]) or "octet-stream").lower()
+    params = _params(node[2])
+    # Los campos de extensión se corren según el tipo (RFC 3501, 7.4.2)
+    if main_type == "text":
+        disposition_index = 9
+    elif main_type == "message" and sub_type == "rfc822":
+        disposition_index = 11
+    else:
+        disposition_index = 8
+    disposition = node[disposition_index] if len(node) > disposition_index else None
+    disposition_type = None
+    if isinstance(disposition, list) and disposition:
+        disposition_type = (_text(disposition[0]) or "").lower()
+        params = {**params, **_params(disposition[1] if len(disposition) > 1 else None)}
+    size = node[6]
+    return [{
+        "part": prefix.rstrip(".") or "1",
+        "type": f"{main_type}/{sub_type}",
+        "charset": params.get("charset"),
+        "encoding": (_text(node[5]) or "7bit").lower(),
+        "size": int(size) if size and size.isdigit() else 0,
+        "filename": _decode_filename(params),
+        "disposition": disposition_type,
+    }]
+
+
+def is_attachment(part: dict) -> bool:
+    if part["disposition"] == "attachment" or part["filename"]:
+        return True
+    return not part["type"].startswith("text/")
+
+
+def text_part(parts: list[dict]) -> Optional[dict]:
+    """Primera parte text/plain que no sea adjunto (o text/html si no hay)."""
+    for wanted in ("text/plain", "text/html"):
+        for part in parts:
+            if part["type"] == wanted and not is_attachment(part):
+                return part
+    return None
+
+
+def attachment_info(part: dict) -> dict:
+    return {
+        "part": part["part"],
+        "filename": part["filename"] or f"part-{part['part']}",
+        "content_type": part["type"],
+        # El tamaño de BODYSTRUCTURE es el codificado: en base64 cada 57 bytes son una línea de 76 + CRLF
+        "size": part["size"] * 57 // 78 if part["encoding"] == "base64" else part["size"],
+    }
+
+
+# --- Decodificación ---
+
+def _feed(data: bytes):
+    parser = BytesFeedParser(policy=email.policy.default)
+    parser.feed(data)
+    return parser.close()
+
+
+def parse_headers(data: bytes) -> dict:
+    message = _feed(data)
+    date = "Unknown date"
+    try:
+        date = parsedate_to_datetime(message["date"]).strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        pass
+    return {"subject": message["subject"] or "", "from": message["from"] or "", "date": date}
+
+
+def decode_text(part: dict, data: bytes, truncated: bool) -> str:
+    if truncated:
+        # Cortar en un límite seguro para la codificación
+        if part["encoding"] in ("base64", "quoted-printable") and b"\n" in data:
+            data = data[:data.rindex(b"\n") + 1]
+        if part["encoding"] == "base64":
+            data = b"".join(data.split())
+            data = data[:len(data) // 4 * 4]
+    charset = part["charset"] or "utf-8"
+    mime = (f"Content-Type: {part['type']}; charset=\"{charset}\"\r\n"
+            f"Content-Transfer-Encoding: {part['encoding']}\r\n\r\n").encode("ascii", "replace")
+    try:
+        return _feed(mime + data).get_content()
+    except (LookupError, binascii.Error):
+        return data.decode("utf-8", "replace")
+
+
+class TransferDecoder:
+    """Decodifica base64 / quoted-printable por trozos."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self._pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        if self.encoding == "base64":
+            data = self._pending + b"".join(data.split())
+            cut = len(data) // 4 * 4
+            self._pending = data[cut:]
+            return binascii.a2b_base64(data[:cut]) if cut else b""
+        if self.encoding == "quoted-printable":
+            # Una línea qp nunca se parte entre dos trozos
+            data = self._pending + data
+            cut = data.rfind(b"\n") + 1
+            self._pending = data[cut:]
+            return binascii.a2b_qp(data[:cut]) if cut else b""
+        return data
+
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b""
+        if not pending:
+            return b""
+        if self.encoding == "base64":
+            return binascii.a2b_base64(pending + b"=" * (-len(pending) % 4))
+        return binascii.a2b_qp(pending)
+
+
+# --- Operaciones ---
+
+def _uid_fetch(mail: imaplib.IMAP4, uids: str, items: str) -> list[dict]:
+    status, data = mail.uid("FETCH", uids, items)
+    if status != "OK":
+        raise MailError(f"FETCH falló: {status}")
+    return parse_fetch(data)
+
+
+def iter_messages(mail: imaplib.IMAP4, limit: int = 10, preview_bytes: int = 64 * 1024) -> Iterator[dict]:
+    """Los últimos limit mensajes, del más reciente al más antiguo, con cabeceras,
+    vista previa del texto y lista de adjuntos (uno por uno a medida que se bajan los textos).
+    """
+    status, data = mail.uid("SEARCH", None, "ALL")
+    if status != "OK":
+        raise MailError(f"SEARCH falló: {status}")
+    uids = data[0].split()[-limit:]
+    if not uids:
+        return
+
+    fetched = _uid_fetch(mail, b",".join(uids).decode("ascii"), "(UID BODY.PEEK[HEADER] BODYSTRUCTURE)")
+    messages = {}
+    for item in fetched:
+        uid = _text(item.get("UID"))
+        if uid is None:
+            continue
+        parts = flatten_structure(item.get("BODYSTRUCTURE") or [])
+        messages[uid] = {
+            "uid": uid,
+            **parse_headers(item.get("BODY[HEADER]") or b""),
+            "body": "",
+            "truncated": False,
+            "attachments": [attachment_info(part) for part in parts if is_attachment(part)],
+            "_text": text_part(parts),
+        }
+
+    # Más recientes primero, como la bandeja original
+    for uid in reversed(uids):
+        message = messages.get(uid.decode("ascii"))
+        if message is None:
+            continue
+        part = message.pop("_text")
+        if part is not None:
+            for item in _uid_fetch(mail, message["uid"], f"(BODY.PEEK[{part['part']}]<0.{preview_bytes}>)"):
+                data = item.get(f"BODY[{part['part']}]<0>")
+                if data is None:
+                    continue
+                truncated = part["size"] > len(data)
+                message["body"] = decode_text(part, data, truncated)
+                message["truncated"] = truncated
+        yield message
+
+
+def list_messages(mail: imaplib.IMAP4, limit: int = 10, preview_bytes: int = 64 * 1024) -> list[dict]:
+    return list(iter_messages(mail, limit, preview_bytes))
+
+
+def get_structure(mail: imaplib.IMAP4, uid: str) -> list[dict]:
+    fetched = _uid_fetch(mail, uid, "(UID BODYSTRUCTURE)")
+    if not fetched or "BODYSTRUCTURE" not in fetched[0]:
+        raise MailError("Mensaje no encontrado")
+    return flatten_structure(fetched[0]["BODYSTRUCTURE"])
+
+
+def fetch_part_chunk(mail: imaplib.IMAP4, uid: str, part: str, offset: int, size: int) -> bytes:
+    fetched = _uid_fetch(mail, uid, f"(BODY.PEEK[{part}]<{offset}.{size}>)")
+    if not fetched:
+        return b""
+    return fetched[0].get(f"BODY[{part}]<{offset}>") or b""
+
+
+def iter_part(mail: imaplib.IMAP4, uid: str, part: dict, chunk_size: int) -> Iterator[bytes]:
+    """Baja y decodifica una parte en trozos (generador síncrono: cada next() hace un FETCH)."""
+    decoder = TransferDecoder(part["encoding"])
+    offset = 0
+    while True:
+        chunk = fetch_part_chunk(mail, uid, part["part"], offset, chunk_size)
+        if not chunk:
+            break
+        offset += len(chunk)
+        decoded = decoder.feed(chunk)
+        if decoded:
+            yield decoded
+        if len(chunk) < chunk_size:
+            break
+    tail = decoder.flush()
+    if tail:
+        yield tail
@@ -0,0 +1,130 @@
+"""JSON rápido para todas las respuestas y listados en streaming como NDJSON.
+
+FastJSONResponse serializa con orjson (si está instalado; si no, con json de
+la biblioteca estándar en modo compacto) y es la clase de respuesta por defecto
+de la app. Las rutas que devuelven listados grandes la construyen ellas mismas:
+así FastAPI no pasa cada elemento por jsonable_encoder antes de serializar.
+
+Con ?format=ndjson esos listados se envían como application/x-ndjson, un
+registro JSON por línea, sacados de un generador. La respuesta empieza a salir
+con el primer registro y la memoria no depende del tamaño del listado: los
+registros se agrupan en escrituras de NDJSON_BATCH_BYTES.
+
+CleanupStreamingResponse (base de NDJSONResponse) ejecuta su tarea background
+siempre, también si el cliente se desconecta antes de que empiece el cuerpo:
+sirve para liberar recursos abiertos antes de devolver la respuesta (p. ej.
+una sesión IMAP). StreamingResponse solo la ejecuta si el envío terminó bien.
+"""
+import dataclasses
+import datetime
+import decimal
+import enum
+import itertools
+import json
+import uuid
+from pathlib import PurePath
+from typing import Any, AsyncIterator, Iterable, Iterator, Union
+
+import anyio
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.types import Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: se usa json de la biblioteca estándar
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_BATCH_BYTES = 64 * 1024
+
+
+def _default(obj: Any) -> Any:
+    """Tipos que no son JSON nativo: los mismos que resuelve jsonable_encoder."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (uuid.UUID, PurePath)):
+        return str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", "replace")
+    # Escalares y arrays de NumPy (p. ej. salidas del modelo) sin importar numpy aquí
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} no es serializable a JSON")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _take(iterator: Iterator, n: int) -> list:
+    return list(itertools.islice(iterator, n))
+
+
+async def iterate_in_thread(records: Iterable, batch_size: int = 256) -> AsyncIterator:
+    """Recorre un generador bloqueante (disco, IMAP) en un hilo, de a batch_size registros."""
+    iterator = iter(records)
+    while True:
+        batch = await anyio.to_thread.run_sync(_take, iterator, batch_size)
+        if not batch:
+            return
+        for record in batch:
+            yield record
+
+
+async def _ndjson_lines(records: Union[Iterable, AsyncIterator], batch_bytes: int) -> AsyncIterator[bytes]:
+    if not hasattr(records, "__aiter__"):
+        records = iterate_in_thread(records)
+    buffer = bytearray()
+    first = True
+    async for record in records:
+        buffer += dumps(record)
+        buffer += b"\n"
+        # El primer registro sale solo para que el cliente reciba algo de inmediato
+        if first or len(buffer) >= batch_bytes:
+            yield bytes(buffer)
+            buffer.clear()
+            first = False
+    if buffer:
+        yield bytes(buffer)
+
+
+class CleanupStreamingResponse(StreamingResponse):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # El background lo ejecutamos nosotros: Starlette lo omite si send falla (ClientDisconnect)
+        background, self.background = self.background, None
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if background is not None:
+                with anyio.CancelScope(shield=True):
+                    await background()
+
+
+class NDJSONResponse(CleanupStreamingResponse):
+    def __init__(self, records: Union[Iterable, AsyncIterator], status_code: int = 200, headers: dict = None,
+                 batch_bytes: int = NDJSON_BATCH_BYTES, background: BackgroundTask = None):
+        super().__init__(_ndjson_lines(records, batch_bytes), status_code=status_code,
+                         headers=headers, media_type=NDJSON_MEDIA_TYPE, background=background)
@@ -0,0 +1,55 @@
+"""Logging estructurado para el backend.
+
+Cada módulo usa logging.getLogger(__name__) y pasa los datos como campos
+(extra={...}) en lugar de interpolarlos en el mensaje. Con LOG_FORMAT=json
+cada registro es una línea JSON; con "text" los campos se agregan como
+clave=valor. Los mensajes debajo de LOG_LEVEL se descartan en el primer
+chequeo de nivel, sin formatear nada.
+"""
+import json
+import logging
+import sys
+import time
+
+# Atributos propios de LogRecord: todo lo demás viene de extra=
+_RESERVED = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in record.__dict__.items() if k not in _RESERVED}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class KeyValueFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def configure_logging(level: str = "INFO", fmt: str = "text") -> None:
+    """Configura el logger "app" (y sus hijos); idempotente."""
+    logger = logging.getLogger("app")
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+    logger.handlers = [handler]
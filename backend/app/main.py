@@ -1,11 +1,68 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.routes import router  # Tu archivo de rutas
-from app.database import get_db
-import os
-
-app = FastAPI()
+from contextlib import asynccontextmanager
+from app.routes import router, web_content, site_releases, video_stream_manager, recording_manager, media_catalog, UPLOAD_DIR, MAILBOX_DIR  # Tu archivo de rutas
+from app.database import get_db, init_models, pool_status
+from app.config import settings
+from app.logs import configure_logging
+from app.metrics import registry, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app import diagnostics
+from app.admission import admission, AdmissionMiddleware
+from app.jsonio import FastJSONResponse
+from app.sessions import drainer
+from app.servers import ServiceSupervisor, FTPService, DNSService, SMTPService
+import logging
+
+configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+def build_services() -> ServiceSupervisor:
+    if not settings.SERVICES_ENABLED:
+        return ServiceSupervisor([])
+    host = settings.SERVICES_HOST
+    return ServiceSupervisor([
+        FTPService(host, settings.FTP_PORT, UPLOAD_DIR, settings.FTP_ALLOW_ANONYMOUS, settings.FTP_PASSIVE_ADDRESS),
+        DNSService(host, settings.DNS_PORT, settings.DNS_RECORDS_FILE, settings.DNS_TTL),
+        SMTPService(host, settings.SMTP_PORT, MAILBOX_DIR, settings.SMTP_MAX_MESSAGE_BYTES),
+    ])
+
+
+service_supervisor = build_services()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crear tablas si no existen (ver app/migrate_users.py para importar users/)
+    await init_models()
+    # Contenido web en memoria desde el arranque
+    web_content.load()
+    site_releases.load()
+    # Con varios workers (app.serve) solo el primario abre los puertos de FTP/DNS/SMTP
+    # y revisa STREAMING_DIR al arrancar
+    primary = app.state.primary_worker
+    # FTP, DNS y SMTP escuchan en sus propios puertos dentro de este mismo loop
+    if primary:
+        await service_supervisor.start()
+    # Análisis en segundo plano de la media subida (y de lo que haya cambiado en disco)
+    await media_catalog.start(reconcile=primary)
+    if settings.LOOP_LAG_MONITOR:
+        diagnostics.loop_monitor.start()
+    yield
+    # Con app.serve el drenado ya ocurrió antes de cerrar las conexiones; aquí es idempotente
+    await drainer.drain()
+    await diagnostics.loop_monitor.stop()
+    await recording_manager.stop_all()
+    await media_catalog.stop()
+    await service_supervisor.stop()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.state.primary_worker = True
+
+# Admisión primero (más interno): los 429/503 pasan igual por CORS y métricas
+app.add_middleware(AdmissionMiddleware)
 
 # Permitir acceso desde SvelteKit (ajustar para producción)
 app.add_middleware(
@@ -16,82 +73,103 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(router)
+if settings.DIAGNOSTICS_ENABLED:
+    app.include_router(diagnostics.router)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas deshabilitadas")
+    return Response(content=registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/admission/status")
+async def admission_status():
+    return admission.status()
+
+
+@app.get("/sessions/status")
+async def sessions_status():
+    return drainer.status()
+
+
+@app.get("/services/status")
+async def services_status():
+    return service_supervisor.status()
+
+
+def _service_status(name: str) -> dict:
+    service = service_supervisor.get(name)
+    if service is None:
+        return {"service": name, "status": "disabled"}
+    return service.status()
 
 
 @app.get("/dns/status")
 async def dns_status():
-    # Lógica de DNS
-    return {"service": "DNS", "status": "running"}
+    return _service_status("DNS")
 
 
 @app.post("/dns/configure")
-async def configure_dns(settings: dict):
-    # Configura el servidor DNS con los valores proporcionados
-    # Implementar la lógica para configurar DNS en base a la configuración dada
+async def configure_dns(config: dict):
+    # {"records": {"nombre": "ip", ...}, "replace": false}; una ip vacía elimina el nombre
+    dns = service_supervisor.get("DNS")
+    if dns is None:
+        raise HTTPException(status_code=503, detail="Servidor DNS deshabilitado")
     try:
-        pass  # Lógica de configuración del servicio DNS aquí
-        return {"service": "DNS", "status": "configured", "settings": settings}
-    except Exception as e:
+        records = dns.resolver.update(config.get("records", {}), replace=bool(config.get("replace", False)))
+    except (ValueError, AttributeError) as e:
         raise HTTPException(status_code=400, detail=f"Error de configuración DNS: {str(e)}")
+    return {"service": "DNS", "status": "configured", "records": records}
 
 
 @app.get("/web/status")
 async def web_status():
-    # Lógica del estado del servidor web
-    return {"service": "Web", "status": "running"}
+    return {
+        "service": "Web",
+        "status": "running",
+        "etag": web_content.page.etag if web_content.page else None,
+        "release": site_releases.current,
+    }
 
 
 @app.get("/streaming/status")
 async def streaming_status():
-    # Lógica del estado del servidor de streaming
-    return {"service": "Streaming", "status": "running"}
+    return {
+        "service": "Streaming",
+        "status": "running",
+        "files": len(media_catalog.entries),
+        "probe_queue": media_catalog.queue_depth(),
+        "live_streams": {sid: len(conns) for sid, conns in video_stream_manager.active_streams.items()},
+        "recording": list(recording_manager.recorders),
+    }
 
 
 @app.post("/streaming/start")
 async def start_streaming():
-    # Implementa la lógica para iniciar streaming
-    try:
-        pass  # Lógica de inicio de transmisión de video/audio aquí
-        return {"service": "Streaming", "status": "started"}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error al iniciar streaming: {str(e)}")
+    # El streaming se sirve por HTTP/WebSocket desde el arranque; no hay nada que iniciar
+    return await streaming_status()
 
 
 @app.get("/mail/status")
 async def mail_status():
-    # Lógica del estado del servidor de correo
-    return {"service": "Mail", "status": "running"}
-
-
-@app.post("/mail/send")
-async def send_mail(mail_data: dict):
-    # Lógica para enviar un correo electrónico
-    try:
-        pass  # Lógica para el envío del correo aquí
-        return {"service": "Mail", "status": "sent", "details": mail_data}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error al enviar correo: {str(e)}")
+    return _service_status("SMTP")
 
 
 @app.get("/ftp/status")
 async def ftp_status():
-    # Lógica del estado del servidor FTP
-    return {"service": "FTP", "status": "running"}
+    return _service_status("FTP")
 
 
-@app.post("/ftp/upload")
-async def upload_ftp(file_data: dict):
-    # Lógica para cargar archivos al servidor FTP
-    try:
-        # Supón la lógica para manejar archivos
-        file_path = "uploads/" + file_data['filename']
-        print(file_path)
-        with open(file_path, "wb") as f:
-            f.write(file_data['content'])  # Solo ejemplo, debe manejar uploads correctamente
-        return {"service": "FTP", "status": "uploaded", "file": file_data}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error al subir archivo FTP: {str(e)}")
+@app.get("/db/status")
+async def db_status():
+    # Métricas del pool de conexiones (espera en checkout, ocupación)
+    return {"service": "Database", "pool": pool_status()}
 
 
 # Endpoints de prueba para búsqueda general
@@ -0,0 +1,368 @@
+"""Catálogo de metadatos de los archivos de STREAMING_DIR.
+
+Cada archivo subido (o grabación terminada) se encola y un pool de workers lo
+analiza en segundo plano: primero por magic bytes (contenedor y MIME reales,
+sin depender de la extensión) y luego con ffprobe, si está instalado, para
+duración, bitrate, códecs y dimensiones. Para los videos se genera un póster
+con ffmpeg. El resultado se guarda en STREAMING_DIR/.catalog/catalog.json, así
+/streaming/list responde sin tocar los archivos de media.
+
+Con varios workers (python -m app.serve) cada proceso analiza lo que recibe y
+guarda solo sus cambios, fusionándolos con el archivo bajo un flock; los demás
+recargan el catálogo cuando cambia su mtime.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Optional
+
+import aiofiles
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso, no hace falta bloquear el catálogo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SUBDIR = ".catalog"
+SNIFF_BYTES = 64
+
+
+def sniff_format(header: bytes) -> tuple[Optional[str], Optional[str]]:
+    """(contenedor, MIME) a partir de los primeros bytes; (None, None) si no se reconoce."""
+    if header.startswith(b"\x1a\x45\xdf\xa3"):
+        # EBML: WebM es un subconjunto de Matroska con DocType "webm"
+        if b"webm" in header:
+            return "webm", "video/webm"
+        return "matroska", "video/x-matroska"
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand == b"qt  ":
+            return "mov", "video/quicktime"
+        if brand in (b"M4A ", b"M4B "):
+            return "mp4", "audio/mp4"
+        return "mp4", "video/mp4"
+    if header.startswith(b"RIFF"):
+        if header[8:12] == b"AVI ":
+            return "avi", "video/x-msvideo"
+        if header[8:12] == b"WAVE":
+            return "wav", "audio/wav"
+    if header.startswith(b"OggS"):
+        return "ogg", "audio/ogg"
+    if header.startswith(b"fLaC"):
+        return "flac", "audio/flac"
+    if header.startswith(b"ID3"):
+        return "mp3", "audio/mpeg"
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xF0 == 0xF0:
+        # Sincronía de frame MPEG: layer 0 es ADTS (AAC), el resto MP3
+        if header[1] & 0x06 == 0:
+            return "aac", "audio/aac"
+        return "mp3", "audio/mpeg"
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        return "mp3", "audio/mpeg"
+    return None, None
+
+
+def _rate(value: Optional[str]) -> Optional[float]:
+    """"30000/1001" -> 29.97"""
+    if not value or value == "0/0":
+        return None
+    num, _, den = value.partition("/")
+    try:
+        return round(float(num) / float(den or 1), 3)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _number(value, kind=float):
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_ffprobe(output: dict) -> dict:
+    fmt = output.get("format", {})
+    result = {
+        "format_name": fmt.get("format_name"),
+        "duration": _number(fmt.get("duration")),
+        "bit_rate": _number(fmt.get("bit_rate"), int),
+        "video": None,
+        "audio": None,
+    }
+    for stream in output.get("streams", []):
+        codec_type = stream.get("codec_type")
+        if codec_type == "video" and result["video"] is None:
+            if (stream.get("disposition") or {}).get("attached_pic"):
+                continue  # carátula embebida de un audio
+            result["video"] = {
+                "codec": stream.get("codec_name"),
+                "width": stream.get("width"),
+                "height": stream.get("height"),
+                "fps": _rate(stream.get("avg_frame_rate")) or _rate(stream.get("r_frame_rate")),
+            }
+        elif codec_type == "audio" and result["audio"] is None:
+            result["audio"] = {
+                "codec": stream.get("codec_name"),
+                "sample_rate": _number(stream.get("sample_rate"), int),
+                "channels": stream.get("channels"),
+            }
+    return result
+
+
+async def _run(args: list[str], timeout: float) -> tuple[int, bytes, bytes]:
+    proc = await asyncio.create_subprocess_exec(
+        *args, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException:
+        # Timeout o cancelación (apagado): no dejar procesos huérfanos
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    return proc.returncode, stdout, stderr
+
+
+class MediaCatalog:
+    def __init__(self, streaming_dir: str, workers: int = 2, timeout: float = 30.0,
+                 ffprobe: str = "ffprobe", ffmpeg: str = "ffmpeg", poster_width: int = 320):
+        self.streaming_dir = streaming_dir
+        self.catalog_dir = os.path.join(streaming_dir, CATALOG_SUBDIR)
+        self.catalog_path = os.path.join(self.catalog_dir, "catalog.json")
+        self.poster_dir = os.path.join(self.catalog_dir, "posters")
+        self.workers = workers
+        self.timeout = timeout
+        self.ffprobe = shutil.which(ffprobe)
+        self.ffmpeg = shutil.which(ffmpeg)
+        self.poster_width = poster_width
+        self.entries: dict[str, dict] = {}
+        self._pending: set[str] = set()        # encolados o en análisis en este proceso
+        self._changes: dict[str, Optional[dict]] = {}  # por guardar (None = borrar)
+        self._mtime: Optional[int] = None
+        self.probed = 0
+        self.failed = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+        self._save_lock = asyncio.Lock()
+
+    # --- Ciclo de vida ---
+    async def start(self, reconcile: bool = True) -> None:
+        os.makedirs(self.poster_dir, exist_ok=True)
+        self.entries = await asyncio.to_thread(self._load)
+        if reconcile:
+            # Archivos copiados a mano, borrados o modificados mientras el servidor estaba apagado
+            for name in await asyncio.to_thread(self._reconcile):
+                self.submit(name)
+            if self._changes:
+                await self.save()
+        self._tasks = [
+            asyncio.get_running_loop().create_task(self._worker(), name=f"media-probe-{i}")
+            for i in range(self.workers)
+        ]
+        if not self.ffprobe:
+            logger.warning("ffprobe_not_found", extra={"detail": "solo se detectará el formato por magic bytes"})
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _load(self) -> dict:
+        try:
+            with open(self.catalog_path, "r", encoding="utf-8") as f:
+                self._mtime = os.fstat(f.fileno()).st_mtime_ns
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.warning("media_catalog_corrupt", extra={"path": self.catalog_path})
+            return {}
+
+    def _reconcile(self) -> list[str]:
+        pending = []
+        present = set()
+        for name in os.listdir(self.streaming_dir):
+            path = os.path.join(self.streaming_dir, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            present.add(name)
+            st = os.stat(path)
+            entry = self.entries.get(name)
+            if entry is None or entry.get("size") != st.st_size or entry.get("mtime") != st.st_mtime \
+                    or entry.get("status") == "pending":
+                pending.append(name)
+        for name in set(self.entries) - present:
+            self._remove_poster(name)
+            del self.entries[name]
+            self._changes[name] = None
+        return pending
+
+    def _merge_write(self, changes: dict) -> dict:
+        """Aplica changes sobre el catálogo en disco (puede haberlo escrito otro worker)."""
+        with open(self.catalog_path + ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self._load()
+            for name, entry in changes.items():
+                if entry is None:
+                    entries.pop(name, None)
+                else:
+                    entries[name] = entry
+            tmp_path = self.catalog_path + f".{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, self.catalog_path)
+            self._mtime = os.stat(self.catalog_path).st_mtime_ns
+        return entries
+
+    def _adopt(self, entries: dict) -> None:
+        # Lo que este proceso todavía está analizando manda sobre lo guardado
+        for name in self._pending:
+            if name in self.entries:
+                entries[name] = self.entries[name]
+        self.entries = entries
+
+    async def save(self) -> None:
+        async with self._save_lock:
+            changes, self._changes = self._changes, {}
+            self._adopt(await asyncio.to_thread(self._merge_write, changes))
+
+    async def refresh(self) -> None:
+        """Recarga el catálogo si otro proceso lo modificó (un stat, no toca la media)."""
+        try:
+            mtime = os.stat(self.catalog_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._mtime:
+            async with self._save_lock:
+                self._adopt(await asyncio.to_thread(self._load))
+
+    # --- Cola de análisis ---
+    def submit(self, name: str) -> None:
+        """Marca el archivo como pendiente y lo encola (no bloquea)."""
+        name = os.path.basename(name)
+        previous = self.entries.get(name, {})
+        self.entries[name] = {**previous, "name": name, "status": "pending"}
+        self._pending.add(name)
+        if name not in self._queued:
+            self._queued.add(name)
+            self._queue.put_nowait(name)
+
+    async def _worker(self) -> None:
+        while True:
+            name = await self._queue.get()
+            self._queued.discard(name)
+            try:
+                entry = await self.probe(name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("media_probe_failed", extra={"file": name})
+                entry = {"name": name, "status": "error", "error": str(e), "probed_at": time.time()}
+            finally:
+                self._queue.task_done()
+            if name not in self._queued:
+                self._pending.discard(name)
+            self._changes[name] = entry
+            if entry is None:
+                self.entries.pop(name, None)
+                self._remove_poster(name)
+            else:
+                self.entries[name] = entry
+                if entry["status"] == "error":
+                    self.failed += 1
+                else:
+                    self.probed += 1
+            await self.save()
+
+    async def probe(self, name: str) -> Optional[dict]:
+        path = os.path.join(self.streaming_dir, name)
+        if not os.path.isfile(path):
+            return None
+        st = os.stat(path)
+        async with aiofiles.open(path, "rb") as f:
+            header = await f.read(SNIFF_BYTES)
+        container, mime = sniff_format(header)
+        entry = {
+            "name": name,
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "container": container,
+            "mime": mime,
+            "kind": mime.split("/")[0] if mime else None,
+            "duration": None,
+            "bit_rate": None,
+            "video": None,
+            "audio": None,
+            "poster": None,
+            "status": "ok" if container else "unrecognized",
+            "probed_at": time.time(),
+        }
+        if self.ffprobe:
+            code, stdout, stderr = await _run(
+                [self.ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+                self.timeout,
+            )
+            if code == 0:
+                entry.update(parse_ffprobe(json.loads(stdout or b"{}")))
+                entry["kind"] = "video" if entry["video"] else "audio" if entry["audio"] else entry["kind"]
+                if entry["video"] and entry["mime"] and entry["mime"].startswith("audio/"):
+                    entry["mime"] = "video/" + entry["mime"].split("/", 1)[1]  # p. ej. Ogg con Theora
+                entry["status"] = "ok"
+            else:
+                entry["status"] = "error"
+                entry["error"] = stderr.decode("utf-8", errors="replace").strip()[-500:]
+        if entry["video"] and self.ffmpeg:
+            entry["poster"] = await self._make_poster(name, path, entry["duration"])
+        return entry
+
+    def poster_path(self, name: str) -> str:
+        return os.path.join(self.poster_dir, os.path.basename(name) + ".jpg")
+
+    def _remove_poster(self, name: str) -> None:
+        path = self.poster_path(name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    async def _make_poster(self, name: str, path: str, duration: Optional[float]) -> Optional[str]:
+        # Un frame al 10% (máx. 5 s) evita los negros del inicio
+        position = min(duration * 0.1, 5.0) if duration else 0.0
+        target = self.poster_path(name)
+        code, _, stderr = await _run(
+            [self.ffmpeg, "-v", "error", "-y", "-ss", f"{position:.3f}", "-i", path, "-frames:v", "1",
+             "-vf", f"scale={self.poster_width}:-2", target],
+            self.timeout,
+        )
+        if code != 0 or not os.path.exists(target):
+            logger.info("media_poster_failed", extra={"file": name, "error": stderr.decode("utf-8", errors="replace")[-200:]})
+            return None
+        return os.path.basename(target)
+
+    # --- Consulta ---
+    def get(self, name: str) -> Optional[dict]:
+        return self.entries.get(name)
+
+    def files(self) -> list[dict]:
+        return [self.entries[name] for name in sorted(self.entries)]
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def status(self) -> dict:
+        return {
+            "files": len(self.entries),
+            "queued": self._queue.qsize(),
+            "workers": len(self._tasks),
+            "probed": self.probed,
+            "failed": self.failed,
+            "ffprobe": self.ffprobe,
+            "ffmpeg": self.ffmpeg,
+        }
@@ -0,0 +1,42 @@
+"""Migración única de las carpetas users/<email>/password.txt a la tabla users.
+
+Uso (desde backend/):
+    python -m app.migrate_users [ruta/a/users]
+
+Es idempotente: los usuarios que ya existen en la base de datos se omiten.
+"""
+import asyncio
+import os
+import sys
+
+from app.database import SessionLocal, init_models
+from app.repository import user_repository
+
+USERS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.dirname(__file__)), "users"))
+
+
+async def migrate(users_dir: str = USERS_DIR) -> int:
+    # También agrega mail_password a tablas creadas antes de esa columna
+    await init_models()
+    if not os.path.isdir(users_dir):
+        return 0
+
+    migrated = 0
+    async with SessionLocal() as db:
+        for email in sorted(os.listdir(users_dir)):
+            password_file = os.path.join(users_dir, email, "password.txt")
+            if not os.path.isfile(password_file):
+                continue
+            if await user_repository.get_by_username(db, email) is not None:
+                continue
+            with open(password_file, "r") as f:
+                password = f.read().strip()
+            await user_repository.create(db, email, password)
+            migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    users_dir = sys.argv[1] if len(sys.argv) >= 2 else USERS_DIR
+    count = asyncio.run(migrate(users_dir))
+    print(f"Usuarios migrados: {count}")
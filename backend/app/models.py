@@ -9,3 +9,6 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
+    # Contraseña de aplicación para IMAP/SMTP; se necesita en claro para
+    # iniciar sesión en el servidor de correo en nombre del usuario.
+    mail_password = Column(String, nullable=True)
@@ -1,13 +1,22 @@
-from fastapi import APIRouter
+import os
+import sys
+from functools import lru_cache
+from typing import List
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from joblib import load
+import numpy as np
 import pandas as pd
 
-router = APIRouter()
+# Funciones vectorizadas compartidas con los scripts de entrenamiento
+TRAINING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "training"))
+if TRAINING_DIR not in sys.path:
+    sys.path.append(TRAINING_DIR)
+from evaluation import round_goals
+from features import FEATURE_NAMES, FEATURE_STORE_PATH, TeamFormStore
+from app.metrics import registry, predictions
 
-def round_school(x):
-    i, f = divmod(x, 1)
-    return int(i + ((f >= 0.5) if (x > 0) else (f > 0.5)))
+router = APIRouter()
 
 
 class PredictRequest(BaseModel):
@@ -20,8 +29,141 @@ class PredictResponse(BaseModel):
     home_goals: int
     away_goals: int
 
+class ScorelineProbability(BaseModel):
+    home_goals: int
+    away_goals: int
+    probability: float
+
+class DistributionResponse(BaseModel):
+    home_win: float
+    draw: float
+    away_win: float
+    expected_home_goals: float
+    expected_away_goals: float
+    scorelines: List[ScorelineProbability]
+
 model = load("../training/models/best_model_MultiOutputRegressor.joblib")
 
+# Features de forma reciente / head-to-head: solo si el modelo se entrenó con ellas
+MODEL_FEATURES = list(getattr(model, "feature_names_in_", []))
+USES_FORM_FEATURES = any(name in MODEL_FEATURES for name in FEATURE_NAMES)
+feature_store = TeamFormStore.load(FEATURE_STORE_PATH) if USES_FORM_FEATURES else None
+
+class ForestDistribution:
+    """Distribución de goles finales a partir de todos los árboles del bosque.
+
+    Al cargar se copian los valores de las hojas de cada árbol a una matriz
+    (árboles x nodos). Por petición basta con forest.apply (hoja de cada árbol)
+    y una indexación vectorizada: el costo es el mismo que un predict normal.
+    """
+
+    MAX_GOALS = 15
+
+    def __init__(self, pipeline):
+        self.preprocess = pipeline[:-1]
+        self.forests = pipeline[-1].estimators_
+        self.leaf_values = []
+        for forest in self.forests:
+            trees = [est.tree_ for est in forest.estimators_]
+            values = np.zeros((len(trees), max(t.node_count for t in trees)))
+            for i, tree in enumerate(trees):
+                values[i, :tree.node_count] = tree.value[:, 0, 0]
+            self.leaf_values.append(values)
+
+    @classmethod
+    def supports(cls, model) -> bool:
+        final = model[-1] if hasattr(model, "steps") else None
+        forests = getattr(final, "estimators_", None)
+        return (
+            forests is not None and len(forests) == 2
+            and all(hasattr(f, "estimators_") and hasattr(f, "apply") for f in forests)
+        )
+
+    def per_tree(self, input_data: pd.DataFrame) -> List[np.ndarray]:
+        Xt = self.preprocess.transform(input_data)
+        out = []
+        for forest, values in zip(self.forests, self.leaf_values):
+            leaves = forest.apply(Xt)[0]  # (n_trees,)
+            out.append(values[np.arange(len(leaves)), leaves])
+        return out
+
+    def distribution(self, input_data: pd.DataFrame, top_k: int) -> DistributionResponse:
+        home_trees, away_trees = self.per_tree(input_data)
+        bins = self.MAX_GOALS + 1
+        # Marginales por salida; los bosques de local y visitante son independientes
+        p_home = np.bincount(np.clip(round_goals(home_trees), 0, self.MAX_GOALS), minlength=bins) / len(home_trees)
+        p_away = np.bincount(np.clip(round_goals(away_trees), 0, self.MAX_GOALS), minlength=bins) / len(away_trees)
+        joint = np.outer(p_home, p_away)
+
+        top = np.argsort(joint, axis=None)[::-1][:top_k]
+        scorelines = [
+            ScorelineProbability(home_goals=int(h), away_goals=int(a), probability=float(joint[h, a]))
+            for h, a in zip(*np.unravel_index(top, joint.shape))
+            if joint[h, a] > 0
+        ]
+        return DistributionResponse(
+            home_win=float(np.tril(joint, -1).sum()),
+            draw=float(np.trace(joint)),
+            away_win=float(np.triu(joint, 1).sum()),
+            expected_home_goals=float(np.mean(home_trees)),
+            expected_away_goals=float(np.mean(away_trees)),
+            scorelines=scorelines,
+        )
+
+
+forest_distribution = ForestDistribution(model) if ForestDistribution.supports(model) else None
+
+
+def build_input(home_team: str, away_team: str, home_ht: int, away_ht: int) -> pd.DataFrame:
+    row = {
+        'home_team': home_team,
+        'away_team': away_team,
+        'home_goals_half_time': home_ht,
+        'away_goals_half_time': away_ht
+    }
+    if feature_store is not None:
+        # Búsqueda O(1) en los arrays del feature store
+        row.update(zip(FEATURE_NAMES, feature_store.features(home_team, away_team)))
+    return pd.DataFrame([row])
+
+
+@lru_cache(maxsize=4096)
+def cached_distribution(home_team: str, away_team: str, home_ht: int, away_ht: int, top_k: int) -> DistributionResponse:
+    return forest_distribution.distribution(build_input(home_team, away_team, home_ht, away_ht), top_k)
+
+
+# hits y misses son acumulados (counters, para rate()); el tamaño actual es un gauge
+registry.counter(
+    "predict_distribution_cache_hits_total", "Aciertos del cache de /predict/distribution.",
+    collect=lambda: cached_distribution.cache_info().hits,
+)
+registry.counter(
+    "predict_distribution_cache_misses_total", "Fallos del cache de /predict/distribution.",
+    collect=lambda: cached_distribution.cache_info().misses,
+)
+registry.gauge(
+    "predict_distribution_cache_size", "Entradas en el cache de /predict/distribution.",
+    collect=lambda: cached_distribution.cache_info().currsize,
+)
+
+
+@router.post("/predict/distribution", response_model=DistributionResponse)
+async def predict_distribution(request: PredictRequest, top_k: int = Query(5, ge=1, le=50)):
+    """
+    Probabilidades H/D/A y marcadores más probables según todos los árboles del modelo
+    """
+    if forest_distribution is None:
+        raise HTTPException(status_code=501, detail="El modelo cargado no es un bosque multi-salida")
+    predictions.inc(endpoint="distribution")
+    return cached_distribution(
+        request.home_team,
+        request.away_team,
+        request.home_goals_half_time,
+        request.away_goals_half_time,
+        top_k,
+    )
+
+
 @router.post("/predict", response_model=PredictResponse)
 async def predict(request: PredictRequest):
     """
@@ -29,17 +171,20 @@ async def predict(request: PredictRequest):
     """
     
     # Preparar los datos de entrada para la predicción
-    input_data = pd.DataFrame([{
-        'home_team': request.home_team,
-        'away_team': request.away_team,
-        'home_goals_half_time': request.home_goals_half_time,
-        'away_goals_half_time': request.away_goals_half_time
-    }])
+    input_data = build_input(
+        request.home_team,
+        request.away_team,
+        request.home_goals_half_time,
+        request.away_goals_half_time,
+    )
     
     # Realizar la predicción usando el modelo cargado
     prediction = model.predict(input_data)
+    predictions.inc(endpoint="predict")
+    
+    home_goals, away_goals = round_goals(prediction[0])
     
     return PredictResponse(
-        home_goals=round_school(prediction[0][0]),
-        away_goals=round_school(prediction[0][1])
+        home_goals=int(home_goals),
+        away_goals=int(away_goals)
     )
@@ -0,0 +1,303 @@
+"""Grabación (DVR) de los streams en vivo de /ws/stream/{stream_id}.
+
+Los frames que llegan por el WebSocket son chunks de MediaRecorder (WebM), así
+que concatenarlos produce un archivo reproducible. StreamRecorder.append solo
+copia el chunk a un buffer en memoria: una tarea aparte junta los chunks y los
+escribe en bloques grandes y secuenciales (write-behind), de modo que el
+relay a los espectadores nunca espera al disco.
+
+Mientras graba, el archivo vive en STREAMING_DIR/.recordings/; al detenerse
+se mueve a STREAMING_DIR (y aparece en /streaming/list). El índice
+tiempo -> offset (uno por segundo, en límites de chunk) se guarda junto al
+archivo en .recordings/<archivo>.index.json.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import AsyncIterator, Callable, Optional
+
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+RECORDINGS_SUBDIR = ".recordings"
+INDEX_SUFFIX = ".index.json"
+
+
+def _safe_stream_id(stream_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "_", stream_id)[:64] or "stream"
+
+
+class TimeIndex:
+    """Pares (segundos desde el inicio, offset en bytes) ordenados por tiempo."""
+
+    def __init__(self, times: Optional[list] = None, offsets: Optional[list] = None):
+        self.times: list[float] = times or []
+        self.offsets: list[int] = offsets or []
+
+    def add(self, seconds: float, offset: int) -> None:
+        self.times.append(seconds)
+        self.offsets.append(offset)
+
+    def lookup(self, seconds: float) -> tuple[float, int]:
+        """Última entrada con tiempo <= seconds (el inicio del chunk que contiene ese instante)."""
+        i = bisect.bisect_right(self.times, seconds) - 1
+        if i < 0:
+            return 0.0, 0
+        return self.times[i], self.offsets[i]
+
+    def to_dict(self) -> dict:
+        return {"times": self.times, "offsets": self.offsets}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TimeIndex":
+        return cls(list(data["times"]), list(data["offsets"]))
+
+
+class StreamRecorder:
+    def __init__(self, stream_id: str, streaming_dir: str, flush_bytes: int = 1024 * 1024,
+                 flush_interval: float = 1.0, index_interval: float = 1.0, max_buffer_bytes: int = 64 * 1024 * 1024):
+        self.stream_id = stream_id
+        self.streaming_dir = streaming_dir
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.index_interval = index_interval
+        self.max_buffer_bytes = max_buffer_bytes
+
+        # El sufijo aleatorio evita que dos grabaciones del mismo stream en el mismo
+        # segundo (parar y volver a empezar, o dos workers) compartan archivo
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.filename = f"live-{_safe_stream_id(stream_id)}-{stamp}-{uuid.uuid4().hex[:8]}.webm"
+        self.work_dir = os.path.join(streaming_dir, RECORDINGS_SUBDIR)
+        self.part_path = os.path.join(self.work_dir, self.filename + ".part")
+        self.final_path = os.path.join(streaming_dir, self.filename)
+        self.index_path = os.path.join(self.work_dir, self.filename + INDEX_SUFFIX)
+
+        self.index = TimeIndex()
+        self.header_bytes = 0  # tamaño del primer chunk (cabecera WebM + pistas)
+        self.bytes_received = 0
+        self.bytes_flushed = 0
+        self.flushes = 0
+        self.dropped_bytes = 0
+        self.started = time.monotonic()
+        self._last_index = -self.index_interval
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._done = False
+        self._flushed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        os.makedirs(self.work_dir, exist_ok=True)
+        self._task = asyncio.get_running_loop().create_task(self._writer(), name=f"recorder-{self.stream_id}")
+
+    def append(self, data: bytes) -> None:
+        """Encola un chunk; no hace I/O (se llama desde el camino del relay)."""
+        if self._closing:
+            return
+        if self._buffered + len(data) > self.max_buffer_bytes:
+            # El disco no da abasto: se descarta antes que frenar el relay
+            if not self.dropped_bytes:
+                logger.warning("recording_buffer_full", extra={"stream_id": self.stream_id})
+            self.dropped_bytes += len(data)
+            return
+        elapsed = time.monotonic() - self.started
+        if not self.bytes_received:
+            self.header_bytes = len(data)
+        if elapsed - self._last_index >= self.index_interval:
+            self.index.add(round(elapsed, 3), self.bytes_received)
+            self._last_index = elapsed
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self.bytes_received += len(data)
+        if self._buffered >= self.flush_bytes:
+            self._wakeup.set()
+
+    async def _writer(self) -> None:
+        try:
+            async with aiofiles.open(self.part_path, "wb") as f:
+                while True:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    if self._buffer:
+                        block = b"".join(self._buffer)
+                        self._buffer = []
+                        self._buffered = 0
+                        await f.write(block)
+                        await f.flush()
+                        self.flushes += 1
+                        async with self._flushed:
+                            self.bytes_flushed += len(block)
+                            self._flushed.notify_all()
+                    if self._closing and not self._buffer:
+                        return
+        except Exception:
+            # Sin escritor no tiene sentido seguir acumulando chunks en memoria
+            self._closing = True
+            raise
+        finally:
+            async with self._flushed:
+                self._done = True
+                self._flushed.notify_all()
+
+    async def _wait_flushed(self, offset: int) -> bool:
+        """Espera a que haya más de offset bytes en disco; False si la grabación terminó antes."""
+        async with self._flushed:
+            await self._flushed.wait_for(lambda: self.bytes_flushed > offset or self._done)
+        return self.bytes_flushed > offset
+
+    @property
+    def path(self) -> str:
+        return self.part_path if os.path.exists(self.part_path) else self.final_path
+
+    async def follow(self, offset: int, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+        """Sirve la grabación desde offset y sigue el directo hasta que se detenga (timeshift).
+
+        Si offset > 0 se antepone la cabecera del primer chunk para que el
+        reproductor pueda inicializar el decodificador.
+        """
+        if offset < self.header_bytes:
+            offset = 0
+        if not await self._wait_flushed(max(offset, self.header_bytes, 1) - 1):
+            return
+        async with aiofiles.open(self.path, "rb") as f:
+            if offset and self.header_bytes:
+                yield await f.read(self.header_bytes)
+            position = offset
+            while True:
+                if position >= self.bytes_flushed and not await self._wait_flushed(position):
+                    return
+                await f.seek(position)
+                chunk = await f.read(min(chunk_size, self.bytes_flushed - position))
+                if not chunk:
+                    return
+                position += len(chunk)
+                yield chunk
+
+    def _remove_part(self) -> None:
+        try:
+            os.remove(self.part_path)
+        except FileNotFoundError:
+            pass
+
+    async def close(self) -> str:
+        """Vacía el buffer, mueve la grabación a STREAMING_DIR y escribe el índice."""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                logger.exception("recording_failed", extra={
+                    "stream_id": self.stream_id, "file": self.filename, "bytes": self.bytes_flushed,
+                })
+                self._remove_part()
+                return ""
+        if self.bytes_flushed == 0:
+            self._remove_part()
+            return ""
+        os.replace(self.part_path, self.final_path)
+        async with aiofiles.open(self.index_path, "w") as f:
+            await f.write(json.dumps({
+                "stream_id": self.stream_id,
+                "duration_seconds": round(time.monotonic() - self.started, 3),
+                "header_bytes": self.header_bytes,
+                "size": self.bytes_flushed,
+                **self.index.to_dict(),
+            }))
+        logger.info("recording_saved", extra={"stream_id": self.stream_id, "file": self.filename, "bytes": self.bytes_flushed})
+        return self.filename
+
+    def status(self) -> dict:
+        return {
+            "stream_id": self.stream_id,
+            "file": self.filename,
+            "duration_seconds": round(time.monotonic() - self.started, 3),
+            "bytes_received": self.bytes_received,
+            "bytes_flushed": self.bytes_flushed,
+            "bytes_buffered": self._buffered,
+            "bytes_dropped": self.dropped_bytes,
+            "flushes": self.flushes,
+            "index_entries": len(self.index.times),
+        }
+
+
+class RecordingManager:
+    def __init__(self, streaming_dir: str, on_saved: Optional[Callable[[str], None]] = None, **recorder_options):
+        self.streaming_dir = streaming_dir
+        self.on_saved = on_saved
+        self.recorder_options = recorder_options
+        self.recorders: dict[str, StreamRecorder] = {}
+        self._closing: set[asyncio.Task] = set()
+
+    def start(self, stream_id: str) -> StreamRecorder:
+        recorder = self.recorders.get(stream_id)
+        if recorder is None:
+            recorder = StreamRecorder(stream_id, self.streaming_dir, **self.recorder_options)
+            recorder.start()
+            self.recorders[stream_id] = recorder
+            logger.info("recording_started", extra={"stream_id": stream_id, "file": recorder.filename})
+        return recorder
+
+    async def stop(self, stream_id: str) -> Optional[str]:
+        recorder = self.recorders.pop(stream_id, None)
+        if recorder is None:
+            return None
+        filename = await recorder.close()
+        if filename and self.on_saved is not None:
+            self.on_saved(filename)
+        return filename
+
+    def stop_later(self, stream_id: str) -> None:
+        """Para llamar desde código síncrono (p. ej. al desconectarse el broadcaster)."""
+        if stream_id not in self.recorders:
+            return
+        task = asyncio.get_running_loop().create_task(self.stop(stream_id))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def stop_all(self) -> None:
+        for stream_id in list(self.recorders):
+            await self.stop(stream_id)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def append(self, stream_id: str, data: bytes) -> None:
+        recorder = self.recorders.get(stream_id)
+        if recorder is not None:
+            recorder.append(data)
+
+    def load_index(self, filename: str) -> Optional[dict]:
+        path = os.path.join(self.streaming_dir, RECORDINGS_SUBDIR, os.path.basename(filename) + INDEX_SUFFIX)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def seek_file(self, filename: str, seconds: float) -> Optional[dict]:
+        """Offset de una grabación terminada para usar como Range en /streaming/play."""
+        data = self.load_index(filename)
+        if data is None:
+            return None
+        time_found, offset = TimeIndex.from_dict(data).lookup(seconds)
+        return {
+            "file": os.path.basename(filename),
+            "time": time_found,
+            "offset": offset,
+            "header_bytes": data["header_bytes"],
+            "size": data["size"],
+            "duration_seconds": data["duration_seconds"],
+        }
+
+    def status(self) -> dict:
+        return {"recording": [r.status() for r in list(self.recorders.values())]}
@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import hash_password_async
+from app.cache import TTLCache
+from app.config import settings
+from app.models import User
+
+
+@dataclass(frozen=True)
+class UserRecord:
+    """Copia inmutable de una fila de users, segura para compartir entre sesiones."""
+    id: int
+    username: str
+    hashed_password: str
+    mail_password: Optional[str]
+
+    @classmethod
+    def from_model(cls, user: User) -> "UserRecord":
+        return cls(
+            id=user.id,
+            username=user.username,
+            hashed_password=user.hashed_password,
+            mail_password=user.mail_password,
+        )
+
+
+# Sentencia construida una sola vez: SQLAlchemy reutiliza su forma compilada
+# y asyncpg la mantiene como prepared statement en cada conexión.
+_SELECT_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+
+
+class UserRepository:
+    def __init__(self):
+        self.cache = TTLCache(
+            max_entries=settings.USER_CACHE_MAX_ENTRIES,
+            ttl=settings.USER_CACHE_TTL_SECONDS,
+        )
+
+    async def get_by_username(self, db: AsyncSession, username: str) -> Optional[UserRecord]:
+        record = self.cache.get(username)
+        if record is not None:
+            return record
+
+        result = await db.execute(_SELECT_BY_USERNAME, {"username": username})
+        user = result.scalar_one_or_none()
+        if user is None:
+            return None
+
+        record = UserRecord.from_model(user)
+        self.cache.set(username, record)
+        return record
+
+    async def create(self, db: AsyncSession, username: str, password: str) -> UserRecord:
+        user = User(
+            username=username,
+            hashed_password=await hash_password_async(password),
+            mail_password=password,
+        )
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+
+        record = UserRecord.from_model(user)
+        self.cache.set(username, record)
+        return record
+
+    def invalidate(self, username: str) -> None:
+        self.cache.pop(username)
+
+
+user_repository = UserRepository()
@@ -3,28 +3,43 @@ import shutil
 import asyncio
 import smtplib
 from email.mime.text import MIMEText
-from typing import List
+from typing import List, Optional
 import json
-import imaplib
-import email
-from email.header import decode_header
-from datetime import datetime
+import tarfile
+import zipfile
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, WebSocket, WebSocketDisconnect, Request
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, WebSocket, WebSocketDisconnect, Request, Query
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models import User
+from app.repository import user_repository
 from app.schemas import UserCreate, UserResponse
-from app.auth import hash_password, verify_password, create_access_token
+from app.auth import verify_password_async, create_access_token
 from app.dependencies import get_current_user
+from app.config import settings
+from app.web import WebContentCache, SiteReleases, BundleError, IMMUTABLE_CACHE, choose_encoding, etag_matches
+from app.metrics import registry, websocket_messages, bytes_streamed
+from app.bandwidth import BandwidthScheduler
+from app.recording import RecordingManager
+from app.media import MediaCatalog
+from app.downloads import ZipStream, RangeNotSatisfiable, file_validators, parse_range, if_range_matches
+from app import inbox
+from app.jsonio import CleanupStreamingResponse, FastJSONResponse, NDJSONResponse, iterate_in_thread
+from app.sessions import drainer, resume_tokens, CLOSE_SERVICE_RESTART
 
 from fastapi.responses import FileResponse, StreamingResponse, Response
+from starlette.background import BackgroundTask
 import time
 import aiofiles
 import os.path
+import logging
+import mimetypes
+from urllib.parse import quote
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 
 # Routes imports
 #from app.routes.chat import router as chat_router
@@ -35,41 +50,38 @@ router = APIRouter()
 # Include sub-routers
 router.include_router(predict_router)
 
+def client_host(connection) -> str:
+    """IP del cliente de un Request o WebSocket; el servidor ASGI puede no informarla (p. ej. sockets UNIX)."""
+    return connection.client.host if connection.client else "unknown"
+
 # ============================
 # User Management Endpoints
 # ============================
 
 @router.post("/register")
-async def register_user(request: Request):
+async def register_user(request: Request, db: AsyncSession = Depends(get_db)):
     data = await request.json()
     email = data.get("email")
     password = data.get("password")
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password are required")
-    
-    # Base folder for users
-    users_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "users")
-    users_dir = os.path.abspath(users_dir)
-    os.makedirs(users_dir, exist_ok=True)
-
-    # User folder
-    user_folder = os.path.join(users_dir, email)
-    if os.path.exists(user_folder):
+
+    if await user_repository.get_by_username(db, email) is not None:
         #raise HTTPException(status_code=409, detail="User already exists")
         return {"message": "Logged in"}
-    os.makedirs(user_folder)
 
-    # Save password in a txt file
-    password_file = os.path.join(user_folder, "password.txt")
-    with open(password_file, "w") as f:
-        f.write(password)
+    try:
+        await user_repository.create(db, email, password)
+    except IntegrityError:
+        # Otro /register con el mismo correo ganó la carrera entre la consulta y el INSERT
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="User already registered")
     return {"message": "User registered successfully"}
 
 @router.post("/login")
 async def login(user: UserCreate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute("SELECT * FROM users WHERE username = :username", {"username": user.username})
-    user_record = result.fetchone()
-    if not user_record or not verify_password(user.password, user_record.hashed_password):
+    user_record = await user_repository.get_by_username(db, user.username)
+    if not user_record or not await verify_password_async(user.password, user_record.hashed_password):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -85,22 +97,98 @@ async def get_me(current_user: UserResponse = Depends(get_current_user)):
 
 # --- Web Service ---
 WEB_CONTENT_FILE = "web/index.html"
+web_content = WebContentCache(WEB_CONTENT_FILE)
 
 @router.get("/web/content")
 async def get_web_content():
-    if not os.path.exists(WEB_CONTENT_FILE):
-        return {"content": ""}
-    with open(WEB_CONTENT_FILE, "r", encoding="utf-8") as f:
-        content = f.read()
-    return {"content": content}
+    web_content.ensure_loaded()
+    # Cuerpo JSON ya serializado al desplegar
+    return Response(content=web_content.json_body, media_type="application/json")
+
+site_releases = SiteReleases("web", max_bundle_bytes=settings.WEB_BUNDLE_MAX_BYTES)
+
+def serve_release_file(request: Request, path: str) -> Response:
+    found = site_releases.lookup(path)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    file_path, entry = found
+
+    headers = {
+        "ETag": entry["etag"],
+        "Vary": "Accept-Encoding",
+        # Los assets con hash en el nombre nunca cambian; el resto se revalida
+        "Cache-Control": IMMUTABLE_CACHE if entry["hashed"] else "no-cache",
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""), entry["encodings"])
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        file_path += ".gz" if encoding == "gzip" else ".br"
+    return FileResponse(file_path, media_type=entry["media_type"], headers=headers)
+
+def web_site_source() -> str:
+    """Qué sirve /web/site: el bundle activo tiene prioridad sobre la página de /web/deploy."""
+    return "bundle" if site_releases.current is not None else "page"
+
+@router.get("/web/site")
+async def serve_web_site(request: Request):
+    if web_site_source() == "bundle":
+        response = serve_release_file(request, "index.html")
+        response.headers["X-Site-Source"] = "bundle"
+        return response
+
+    web_content.ensure_loaded()
+    page = web_content.page
+    if page is None:
+        raise HTTPException(status_code=404, detail="No hay contenido desplegado")
+
+    headers = {"ETag": page.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding", "X-Site-Source": "page"}
+    if etag_matches(request.headers.get("if-none-match"), page.etag):
+        return Response(status_code=304, headers=headers)
+
+    encoding, body = page.select(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=page.media_type, headers=headers)
+
+@router.get("/web/site/{path:path}")
+async def serve_web_site_file(path: str, request: Request):
+    return serve_release_file(request, path)
+
+@router.post("/web/bundle")
+async def deploy_web_bundle(file: UploadFile = File(...)):
+    try:
+        version = await asyncio.to_thread(site_releases.deploy, file.file, file.filename)
+    except (BundleError, tarfile.TarError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=f"Bundle inválido: {str(e)}")
+    return {"message": "Bundle deployed", "version": version, "files": len(site_releases.manifest)}
+
+@router.get("/web/releases")
+async def list_web_releases():
+    return {"current": site_releases.current, "versions": site_releases.versions(), "serving": web_site_source()}
+
+@router.post("/web/rollback")
+async def rollback_web(data: dict = None):
+    version = (data or {}).get("version")
+    try:
+        version = await asyncio.to_thread(site_releases.rollback, version)
+    except BundleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Rolled back", "version": version}
 
 @router.post("/web/deploy")
 async def deploy_web(content: dict):
     if "html" not in content:
         raise HTTPException(status_code=400, detail="Missing HTML content")
-    with open(WEB_CONTENT_FILE, "w", encoding="utf-8") as f:
-        f.write(content["html"])
-    return {"message": "Web content deployed"}
+    # Escritura atómica y compresión fuera del event loop
+    await asyncio.to_thread(web_content.deploy, content["html"])
+    result = {"message": "Web content deployed", "etag": web_content.page.etag, "serving": web_site_source()}
+    if result["serving"] == "bundle":
+        # La página queda guardada (y en /web/content) pero /web/site sigue sirviendo el bundle
+        result["warning"] = f"/web/site sirve el bundle {site_releases.current}; esta página no se muestra ahí"
+    return result
 
 # --- Mail Service ---
 @router.post("/mail/send")
@@ -109,16 +197,20 @@ async def send_mail(mail_data: dict):
     if not required_keys.issubset(mail_data.keys()):
         raise HTTPException(status_code=400, detail="Missing required mail fields")
     try:
-        # For testing, run a debug SMTP server:
-        # python -m smtpd -c DebuggingServer -n localhost:1025
-        smtp_server = "localhost"
-        smtp_port = 1025
+        # El relay por defecto (localhost:1025) es el servidor SMTP de app/servers,
+        # que corre en este mismo loop: smtplib debe ir en un hilo o se bloquearía.
+        smtp_server = settings.MAIL_RELAY_HOST
+        smtp_port = settings.MAIL_RELAY_PORT
         msg = MIMEText(mail_data["body"])
         msg["Subject"] = mail_data["subject"]
         msg["From"] = "no-reply@example.com"
         msg["To"] = mail_data["to"]
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.send_message(msg)
+
+        def relay():
+            with smtplib.SMTP(smtp_server, smtp_port) as server:
+                server.send_message(msg)
+
+        await asyncio.to_thread(relay)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Mail sending failed: {e}")
     return {"message": "Mail sent", "details": mail_data}
@@ -135,10 +227,18 @@ async def upload_ftp(file: UploadFile = File(...)):
         shutil.copyfileobj(file.file, f)
     return {"message": "File uploaded", "filename": file.filename}
 
+def _iter_upload_names():
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            yield entry.name
+
+# ?format=ndjson: un nombre por línea, sin armar la lista completa
 @router.get("/ftp/list")
-async def list_ftp_files():
-    files = os.listdir(UPLOAD_DIR)
-    return {"files": files}
+async def list_ftp_files(format: str = "json"):
+    if format == "ndjson":
+        return NDJSONResponse(_iter_upload_names())
+    files = await asyncio.to_thread(os.listdir, UPLOAD_DIR)
+    return FastJSONResponse({"files": files})
 
 # --- Chat ---
 class ConnectionManager:
@@ -159,7 +259,7 @@ class ConnectionManager:
         except WebSocketDisconnect:
             self.disconnect(websocket)
         except Exception as e:
-            print(f"Error sending personal message: {str(e)}")
+            logger.warning("chat_send_failed", extra={"error": str(e)})
             self.disconnect(websocket)
     
     async def broadcast(self, message: str, websocket):
@@ -171,7 +271,7 @@ class ConnectionManager:
                 except WebSocketDisconnect:
                     disconnected.append(connection)
                 except Exception as e:
-                    print(f"Error broadcasting message: {str(e)}")
+                    logger.warning("chat_broadcast_failed", extra={"error": str(e)})
                     disconnected.append(connection)
         
         # Remove disconnected connections
@@ -179,25 +279,43 @@ class ConnectionManager:
             self.disconnect(connection)
 
 connection_manager = ConnectionManager()
+registry.gauge(
+    "chat_connections", "Conexiones abiertas en /ws.",
+    collect=lambda: len(connection_manager.active_connections),
+)
 
+# ?session=1: el cliente entiende mensajes de control JSON ("session", "reconnect");
+# los clientes anteriores solo ven el cierre 1012 al apagar
 @router.websocket("/ws")
-async def websocket_chat(websocket: WebSocket):
+async def websocket_chat(websocket: WebSocket, session: bool = False, resume: Optional[str] = None):
+    if drainer.draining:
+        await websocket.close(code=CLOSE_SERVICE_RESTART)
+        return
+    resumed = resume is not None and resume_tokens.verify(resume, "chat") is not None
     await connection_manager.connect(websocket)
-    client = websocket.client.host
-    print(f"{client} connected.")
+    drainer.attach(websocket, lambda: {"kind": "chat"}, session=session or resumed)
+    client = client_host(websocket)
+    logger.info("chat_connected", extra={"client": client, "resumed": resumed})
     try:
+        if session or resumed:
+            await websocket.send_json({"type": "session", "resume_token": drainer.session_token(websocket)})
         while(True):
             data = await websocket.receive_text()
+            websocket_messages.inc(channel="chat")
             await connection_manager.broadcast(data, websocket)
     except WebSocketDisconnect:
-        print(f"{client} disconnected.")
+        logger.info("chat_disconnected", extra={"client": client})
         connection_manager.disconnect(websocket)
+    finally:
+        drainer.detach(websocket)
 
 # --- DNS Service (registro de IPs) ---
 DNS_LOG_FILE = "dns_log.txt"
 
 @router.post("/dns/register")
 async def register_dns(request: Request):
+    if request.client is None:
+        raise HTTPException(status_code=400, detail="No se pudo determinar la IP del cliente")
     client_ip = request.client.host
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
     
@@ -218,13 +336,39 @@ async def register_dns(request: Request):
         f.write(f"{timestamp} - {client_ip}\n")
     return {"message": "IP registrada", "ip": client_ip, "timestamp": timestamp}
 
-@router.get("/dns/records")
-async def list_dns_records():
+def _iter_dns_records():
     if not os.path.exists(DNS_LOG_FILE):
-        return {"records": []}
+        return
     with open(DNS_LOG_FILE, "r") as f:
-        lines = f.readlines()
-    return {"records": [line.strip() for line in lines]}
+        for line in f:
+            yield line.strip()
+
+@router.get("/dns/records")
+async def list_dns_records(format: str = "json"):
+    if format == "ndjson":
+        return NDJSONResponse(_iter_dns_records())
+    records = await asyncio.to_thread(list, _iter_dns_records())
+    return FastJSONResponse({"records": records})
+
+# --- Ancho de banda compartido por /streaming/play y /ftp/download ---
+bandwidth_scheduler = BandwidthScheduler(
+    global_rate=settings.BANDWIDTH_GLOBAL_BYTES_PER_SEC,
+    client_rate=settings.BANDWIDTH_CLIENT_BYTES_PER_SEC,
+    burst_seconds=settings.BANDWIDTH_BURST_SECONDS,
+    chunk_size=settings.BANDWIDTH_CHUNK_BYTES,
+    client_ttl=settings.BANDWIDTH_CLIENT_TTL,
+    sweep_interval=settings.BANDWIDTH_SWEEP_SECONDS,
+)
+registry.gauge(
+    "bandwidth_active_transfers", "Transferencias de media en curso.", ("kind",),
+    collect=bandwidth_scheduler.active_by_kind,
+)
+# Al apagar se espera a que terminen (ver app/sessions.py)
+drainer.track_transfers(lambda: len(bandwidth_scheduler.transfers))
+
+@router.get("/bandwidth/status")
+async def bandwidth_status():
+    return bandwidth_scheduler.status()
 
 # --- Streaming Service (audio/video) ---
 STREAMING_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streaming")
@@ -232,6 +376,38 @@ STREAMING_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__f
 # Asegúrate de que el directorio de streaming exista
 os.makedirs(STREAMING_DIR, exist_ok=True)
 
+# Metadatos de cada archivo de STREAMING_DIR, analizados en segundo plano
+media_catalog = MediaCatalog(
+    STREAMING_DIR,
+    workers=settings.MEDIA_PROBE_WORKERS,
+    timeout=settings.MEDIA_PROBE_TIMEOUT,
+    ffprobe=settings.FFPROBE_PATH,
+    ffmpeg=settings.FFMPEG_PATH,
+    poster_width=settings.MEDIA_POSTER_WIDTH,
+)
+registry.gauge(
+    "media_probe_queue_depth", "Archivos de media esperando análisis.",
+    collect=media_catalog.queue_depth,
+)
+
+# Grabaciones de los streams en vivo: al terminar quedan en STREAMING_DIR
+recording_manager = RecordingManager(
+    STREAMING_DIR,
+    on_saved=media_catalog.submit,
+    flush_bytes=settings.RECORDING_FLUSH_BYTES,
+    flush_interval=settings.RECORDING_FLUSH_INTERVAL,
+    index_interval=settings.RECORDING_INDEX_INTERVAL,
+    max_buffer_bytes=settings.RECORDING_MAX_BUFFER_BYTES,
+)
+registry.gauge(
+    "recordings_active", "Streams en vivo que se están grabando.",
+    collect=lambda: len(recording_manager.recorders),
+)
+registry.gauge(
+    "recording_buffered_bytes", "Bytes de grabación en memoria pendientes de escribir a disco.",
+    collect=lambda: sum(r.status()["bytes_buffered"] for r in list(recording_manager.recorders.values())),
+)
+
 # Función para obtener el tipo MIME según la extensión del archivo
 def get_content_type(filename: str) -> str:
     extension = filename.split('.')[-1].lower()
@@ -251,12 +427,35 @@ def get_content_type(filename: str) -> str:
     }
     return content_types.get(extension, 'application/octet-stream')
 
+def _media_entry(entry: dict) -> dict:
+    return {**entry, "poster": f"/streaming/poster/{quote(entry['name'])}" if entry.get("poster") else None}
+
 @router.get("/streaming/list")
-async def list_streaming_files():
-    if not os.path.exists(STREAMING_DIR):
-        return {"files": []}
-    files = [f for f in os.listdir(STREAMING_DIR) if os.path.isfile(os.path.join(STREAMING_DIR, f))]
-    return {"files": files}
+async def list_streaming_files(format: str = "json"):
+    # Sale del catálogo: no se toca el disco ni los archivos de media
+    await media_catalog.refresh()
+    media = media_catalog.files()
+    if format == "ndjson":
+        # Ya está en memoria: se recorre en el loop, sin pasar por un hilo
+        async def records():
+            for entry in media:
+                yield _media_entry(entry)
+        return NDJSONResponse(records())
+    return FastJSONResponse({
+        "files": [entry["name"] for entry in media],
+        "media": [_media_entry(entry) for entry in media],
+    })
+
+@router.get("/streaming/catalog")
+async def media_catalog_status():
+    return media_catalog.status()
+
+@router.get("/streaming/poster/{filename}")
+async def get_poster(filename: str):
+    entry = media_catalog.get(filename)
+    if entry is None or not entry.get("poster"):
+        raise HTTPException(status_code=404, detail="Póster no disponible")
+    return FileResponse(media_catalog.poster_path(filename), media_type="image/jpeg", headers={"Cache-Control": "public, max-age=3600"})
 
 @router.post("/streaming/upload")
 async def upload_streaming_file(file: UploadFile = File(...)):
@@ -277,7 +476,9 @@ async def upload_streaming_file(file: UploadFile = File(...)):
             # Leer y escribir el archivo en chunks para evitar cargar todo en memoria
             while content := await file.read(1024 * 1024):  # Leer en chunks de 1MB
                 await out_file.write(content)
-        
+
+        # Duración, códecs y póster se calculan en segundo plano
+        media_catalog.submit(file.filename)
         return {"message": "Archivo subido correctamente", "filename": file.filename}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al subir el archivo: {str(e)}")
@@ -291,7 +492,9 @@ async def stream_media(filename: str, request: Request):
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
     
     file_size = os.path.getsize(file_path)
-    content_type = get_content_type(filename)
+    # El MIME detectado por contenido manda sobre la extensión
+    entry = media_catalog.get(filename)
+    content_type = entry.get("mime") if entry and entry.get("mime") else get_content_type(filename)
     
     # Obtener el encabezado de rango del cliente (si está presente)
     range_header = request.headers.get("Range", "").strip()
@@ -333,32 +536,11 @@ async def stream_media(filename: str, request: Request):
         start_byte = 0
         end_byte = file_size - 1
     
-    # Función generadora para streaming
-    async def file_streamer():
-        async with aiofiles.open(file_path, 'rb') as f:
-            # Mover al inicio del rango solicitado
-            await f.seek(start_byte)
-            
-            # Definir el tamaño de los chunks de lectura (1MB)
-            chunk_size = 1024 * 1024
-            bytes_to_read = end_byte - start_byte + 1
-            
-            # Leer y transmitir en chunks
-            while bytes_to_read > 0:
-                current_chunk_size = min(chunk_size, bytes_to_read)
-                chunk = await f.read(current_chunk_size)
-                if not chunk:
-                    break
-                    
-                bytes_to_read -= len(chunk)
-                yield chunk
-                
-                # Pequeña pausa para simular una transmisión más real
-                # (puede eliminarse en producción)
-                await asyncio.sleep(0.01)
-    
+    # El ritmo de envío lo decide el planificador de ancho de banda
+    file_streamer = bandwidth_scheduler.stream_file(file_path, start_byte, end_byte, "play", client_host(request))
+
     return StreamingResponse(
-        content=file_streamer(),
+        content=file_streamer,
         status_code=status_code,
         headers=headers
     )
@@ -387,23 +569,54 @@ class VideoStreamManager:
             # Si este era el broadcaster, eliminarlo
             if stream_id in self.broadcasters and self.broadcasters[stream_id] == websocket:
                 del self.broadcasters[stream_id]
+                recording_manager.stop_later(stream_id)
+
+            # Sin conexiones no llegan más frames: cerrar la grabación
+            if stream_id not in self.active_streams:
+                recording_manager.stop_later(stream_id)
     
     async def broadcast_frame(self, stream_id: str, data: bytes, sender_ws: WebSocket):
         """Transmitir un frame a todos los espectadores del stream"""
         if stream_id in self.active_streams:
+            # Grabar solo lo que envía el broadcaster (append no toca el disco)
+            broadcaster = self.broadcasters.get(stream_id)
+            if broadcaster is None or broadcaster == sender_ws:
+                recording_manager.append(stream_id, data)
+
             disconnected = []
             
             for ws in self.active_streams[stream_id]:
                 if ws != sender_ws:  # No enviar al emisor
                     try:
                         await ws.send_bytes(data)
-                    except WebSocketDisconnect:
+                        bytes_streamed.inc(len(data), source="live")
+                    except Exception:
+                        # Espectador caído (cerrado o a medio cerrar): no debe cortar al broadcaster
                         disconnected.append(ws)
             
             # Eliminar conexiones desconectadas
             for ws in disconnected:
                 self.remove_connection(stream_id, ws)
     
+    def session_state(self, stream_id: str, websocket: WebSocket) -> dict:
+        """Lo que guarda el resume token: stream, rol y si se estaba grabando."""
+        broadcaster = self.broadcasters.get(stream_id) is websocket
+        return {
+            "kind": "stream",
+            "stream_id": stream_id,
+            "role": "broadcaster" if broadcaster else "viewer",
+            "recording": broadcaster and stream_id in recording_manager.recorders,
+        }
+
+    async def resume(self, stream_id: str, websocket: WebSocket, state: dict):
+        """Repite del lado del servidor el handshake de la sesión anterior."""
+        if state.get("role") == "broadcaster":
+            # El broadcaster debe reiniciar su MediaRecorder: la grabación nueva necesita la cabecera WebM
+            message = {"type": "broadcaster_connected", "record": state.get("recording", False)}
+        else:
+            message = {"type": "viewer_connected"}
+        await self.handle_json_message(stream_id, message, websocket)
+
     async def handle_json_message(self, stream_id: str, message: dict, sender_ws: WebSocket):
         """Manejar mensajes JSON entre participantes del stream"""
         message_type = message.get("type", "")
@@ -411,7 +624,14 @@ class VideoStreamManager:
         if message_type == "broadcaster_connected":
             # Registrar este websocket como el broadcaster principal
             self.broadcasters[stream_id] = sender_ws
-            print(f"Nuevo broadcaster registrado para stream {stream_id}")
+            logger.info("stream_broadcaster_registered", extra={"stream_id": stream_id})
+            # El rol cambió: token nuevo para reanudar como broadcaster
+            token = drainer.session_token(sender_ws)
+            if token is not None:
+                await sender_ws.send_json({"type": "session", "resume_token": token})
+            if settings.RECORDING_ENABLED and (settings.RECORDING_AUTO or message.get("record")):
+                recorder = recording_manager.start(stream_id)
+                await sender_ws.send_json({"type": "recording_started", "file": recorder.filename})
             
             # Notificar al broadcaster cuántos espectadores hay conectados
             if stream_id in self.active_streams:
@@ -429,77 +649,216 @@ class VideoStreamManager:
                     await self.broadcasters[stream_id].send_json({
                         "type": "viewer_connected"
                     })
-                    print(f"Notificación enviada al broadcaster de stream {stream_id}")
+                    logger.debug("stream_viewer_notified", extra={"stream_id": stream_id})
                 except Exception as e:
-                    print(f"Error al notificar al broadcaster: {str(e)}")
+                    logger.warning("stream_notify_failed", extra={"stream_id": stream_id, "error": str(e)})
+
+        elif message_type in ("start_recording", "stop_recording"):
+            # Solo el broadcaster controla la grabación de su stream
+            if self.broadcasters.get(stream_id) != sender_ws:
+                return
+            if message_type == "start_recording" and settings.RECORDING_ENABLED:
+                recorder = recording_manager.start(stream_id)
+                await sender_ws.send_json({"type": "recording_started", "file": recorder.filename})
+            elif message_type == "stop_recording":
+                filename = await recording_manager.stop(stream_id)
+                await sender_ws.send_json({"type": "recording_stopped", "file": filename})
 
 video_stream_manager = VideoStreamManager()
-
+registry.gauge(
+    "stream_viewers", "Conexiones abiertas por stream en vivo (incluye al broadcaster).", ("stream_id",),
+    collect=lambda: {(sid,): len(conns) for sid, conns in list(video_stream_manager.active_streams.items())},
+)
+registry.gauge(
+    "stream_broadcasters", "Streams en vivo con un broadcaster registrado.",
+    collect=lambda: len(video_stream_manager.broadcasters),
+)
+
+# ?resume=<token>: vuelve al stream con el mismo rol sin repetir el handshake
 @router.websocket("/ws/stream/{stream_id}")
-async def websocket_stream(websocket: WebSocket, stream_id: str):
+async def websocket_stream(websocket: WebSocket, stream_id: str, resume: Optional[str] = None):
+    if drainer.draining:
+        await websocket.close(code=CLOSE_SERVICE_RESTART)
+        return
+    state = resume_tokens.verify(resume, "stream") if resume else None
+    if state is not None and state.get("stream_id") != stream_id:
+        state = None
     # Registrar la conexión en el gestor de streams
     try:
-        print(f"Nueva conexión WebSocket para stream {stream_id}")
+        logger.info("stream_connected", extra={"stream_id": stream_id, "resumed": state is not None})
         await video_stream_manager.register_stream(stream_id, websocket)
+        drainer.attach(websocket, lambda: video_stream_manager.session_state(stream_id, websocket))
         
         # Enviar mensaje de confirmación de conexión
         await websocket.send_json({
             "type": "connection_established",
             "stream_id": stream_id,
-            "status": "connected"
+            "status": "resumed" if state is not None else "connected",
+            "resume_token": drainer.session_token(websocket),
         })
+        if state is not None:
+            await video_stream_manager.resume(stream_id, websocket, state)
         
         while True:
-            try:
-                # Primero intentar recibir datos binarios (frames)
-                data = await websocket.receive_bytes()
-                data_size = len(data)
-                # print(f"Datos binarios recibidos para stream {stream_id}: {data_size} bytes")
-                
+            # Un solo receive por mensaje: frames binarios o mensajes JSON de control
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            data = message.get("bytes")
+            if data is not None:
+                websocket_messages.inc(channel="stream")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("stream_frame", extra={"stream_id": stream_id, "bytes": len(data)})
+
                 # Transmitir a todos los conectados a este stream
                 await video_stream_manager.broadcast_frame(stream_id, data, websocket)
-            except Exception as bin_err:
-                if not isinstance(bin_err, WebSocketDisconnect):
-                    try:
-                        # Si no son datos binarios, intentar recibir texto
-                        message = await websocket.receive_text()
-                        try:
-                            json_message = json.loads(message)
-                            await video_stream_manager.handle_json_message(stream_id, json_message, websocket)
-                        except json.JSONDecodeError:
-                            # Ignorar silenciosamente mensajes de texto no-JSON
-                            pass
-                    except WebSocketDisconnect as e:
-                        print(f"WebSocket desconectado para stream {stream_id}, código: {e.code}")
-                        video_stream_manager.remove_connection(stream_id, websocket)
-                        return
-                    except Exception:
-                        # Ignorar otros errores en la recepción de mensajes
-                        pass
-                else:
-                    # Es un WebSocketDisconnect, salir del bucle
-                    print(f"WebSocket desconectado (binario) para stream {stream_id}, código: {bin_err.code}")
-                    video_stream_manager.remove_connection(stream_id, websocket)
-                    return
-            
+            elif message.get("text") is not None:
+                try:
+                    json_message = json.loads(message["text"])
+                except json.JSONDecodeError:
+                    # Ignorar silenciosamente mensajes de texto no-JSON
+                    continue
+                if isinstance(json_message, dict):
+                    await video_stream_manager.handle_json_message(stream_id, json_message, websocket)
+
     except WebSocketDisconnect as e:
         # Eliminar la conexión cuando se desconecte
-        print(f"WebSocket desconectado para stream {stream_id}, código: {e.code}")
+        logger.info("stream_disconnected", extra={"stream_id": stream_id, "code": e.code})
         video_stream_manager.remove_connection(stream_id, websocket)
     except Exception as e:
-        print(f"Error no esperado en WebSocket para stream {stream_id}: {str(e)}")
+        logger.exception("stream_error", extra={"stream_id": stream_id})
         try:
             video_stream_manager.remove_connection(stream_id, websocket)
         except:
             pass
+    finally:
+        drainer.detach(websocket)
+
+# --- Grabación (DVR) de streams en vivo ---
+@router.get("/streaming/recordings")
+async def list_recordings():
+    return recording_manager.status()
+
+@router.post("/streaming/record/{stream_id}")
+async def start_recording(stream_id: str):
+    if not settings.RECORDING_ENABLED:
+        raise HTTPException(status_code=503, detail="La grabación está deshabilitada")
+    if stream_id not in video_stream_manager.active_streams:
+        raise HTTPException(status_code=404, detail="Stream no encontrado")
+    return recording_manager.start(stream_id).status()
+
+@router.delete("/streaming/record/{stream_id}")
+async def stop_recording(stream_id: str):
+    filename = await recording_manager.stop(stream_id)
+    if filename is None:
+        raise HTTPException(status_code=404, detail="El stream no se está grabando")
+    return {"message": "Grabación guardada", "filename": filename}
+
+def _get_recorder(stream_id: str):
+    recorder = recording_manager.recorders.get(stream_id)
+    if recorder is None:
+        raise HTTPException(status_code=404, detail="El stream no se está grabando")
+    return recorder
+
+@router.get("/streaming/record/{stream_id}/seek")
+async def seek_live_recording(stream_id: str, t: float = 0.0):
+    recorder = _get_recorder(stream_id)
+    time_found, offset = recorder.index.lookup(t)
+    return {
+        "file": recorder.filename,
+        "time": time_found,
+        "offset": offset,
+        "header_bytes": recorder.header_bytes,
+        "bytes_flushed": recorder.bytes_flushed,
+    }
+
+# Reproducción en diferido de un stream que se sigue grabando: desde t hasta el directo
+@router.get("/streaming/record/{stream_id}/live")
+async def play_live_recording(stream_id: str, t: float = 0.0):
+    recorder = _get_recorder(stream_id)
+    _, offset = recorder.index.lookup(t)
+    return StreamingResponse(
+        recorder.follow(offset, settings.BANDWIDTH_CHUNK_BYTES),
+        media_type=get_content_type(recorder.filename),
+    )
+
+@router.get("/streaming/recordings/{filename}/seek")
+async def seek_recording(filename: str, t: float = 0.0):
+    result = recording_manager.seek_file(filename, t)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Grabación no encontrada")
+    return result
 
 # --- FTP Download ---
-@router.get("/ftp/download/{filename}")
-async def download_ftp_file(filename: str):
+# Range/If-Range: permite reanudar descargas y los gestores que bajan por segmentos en paralelo
+@router.api_route("/ftp/download/{filename}", methods=["GET", "HEAD"])
+async def download_ftp_file(filename: str, request: Request):
     file_path = os.path.join(UPLOAD_DIR, filename)
-    if not os.path.exists(file_path):
+    if not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
-    return FileResponse(file_path, filename=filename)
+    st = os.stat(file_path)
+    file_size = st.st_size
+    etag, last_modified = file_validators(st)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}",
+    }
+
+    status_code = 200
+    start_byte, end_byte = 0, file_size - 1
+    range_header = request.headers.get("range")
+    # Si el archivo cambió desde la descarga anterior (If-Range no coincide) se envía completo
+    if range_header and if_range_matches(request.headers.get("if-range"), etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, file_size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{file_size}"})
+        if byte_range is not None:
+            start_byte, end_byte = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start_byte}-{end_byte}/{file_size}"
+    headers["Content-Length"] = str(end_byte - start_byte + 1)
+
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        bandwidth_scheduler.stream_file(file_path, start_byte, end_byte, "ftp", client_host(request)),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
+
+# Varios archivos en un ZIP armado mientras se envía (sin temporales ni buffers del tamaño del ZIP)
+@router.get("/ftp/archive")
+async def download_ftp_archive(request: Request, files: List[str] = Query(default=[]), name: str = "archivos.zip"):
+    if not files:
+        files = sorted(f for f in os.listdir(UPLOAD_DIR)
+                       if not f.startswith(".") and os.path.isfile(os.path.join(UPLOAD_DIR, f)))
+    selected = list(dict.fromkeys(os.path.basename(f) for f in files))
+    missing = [f for f in selected if not os.path.isfile(os.path.join(UPLOAD_DIR, f))]
+    if missing or not selected:
+        raise HTTPException(status_code=404, detail=f"Archivos no encontrados: {', '.join(missing)}" if missing
+                            else "No hay archivos para comprimir")
+
+    archive = ZipStream(
+        [(os.path.join(UPLOAD_DIR, f), f) for f in selected],
+        chunk_size=settings.BANDWIDTH_CHUNK_BYTES,
+        compress_level=settings.ZIP_COMPRESS_LEVEL,
+    )
+    if not name.lower().endswith(".zip"):
+        name += ".zip"
+    headers = {"Content-Disposition": f"attachment; filename*=utf-8''{quote(name)}"}
+    content_length = archive.content_length()
+    if content_length is not None:
+        headers["Content-Length"] = str(content_length)
+    return StreamingResponse(
+        bandwidth_scheduler.throttle(archive, "archive", client_host(request), name, content_length or 0),
+        media_type="application/zip",
+        headers=headers,
+    )
 
 # --- Mail Inbox (recepción desde archivos planos simulando bandeja local) ---
 from email.message import EmailMessage
@@ -509,98 +868,114 @@ import smtplib
 MAILBOX_DIR = "mailbox"
 os.makedirs(MAILBOX_DIR, exist_ok=True)
 
-@router.get("/mail")
-async def list_mail(user_email: str):
+async def _mail_password(db: AsyncSession, user_email: str) -> str:
     if not user_email:
         raise HTTPException(status_code=400, detail="Email is required")
-    
-    # Buscar la carpeta del usuario en la carpeta users
-    users_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "users")
-    user_folder = os.path.join(users_dir, user_email)
-    if not os.path.exists(user_folder):
+    user = await user_repository.get_by_username(db, user_email)
+    if user is None or not user.mail_password:
         raise HTTPException(status_code=404, detail="User not found")
-    # Leer la contraseña del archivo password.txt
-    password_file = os.path.join(user_folder, "password.txt")
-    with open(password_file, "r") as f:
-        password = f.read().strip()
+    return user.mail_password
+
+# La bandeja se lee con cabeceras + BODYSTRUCTURE: los adjuntos no se descargan para listar
+@router.get("/mail")
+async def list_mail(user_email: str, limit: int = Query(10, ge=1, le=1000), format: str = "json",
+                    db: AsyncSession = Depends(get_db)):
+    password = await _mail_password(db, user_email)
+
+    if format == "ndjson":
+        # Cada mensaje sale en cuanto se baja su vista previa
+        try:
+            mail = await asyncio.to_thread(inbox.connect, user_email, password)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error fetching emails: {str(e)}")
+
+        messages = inbox.iter_messages(mail, limit=limit, preview_bytes=settings.MAIL_PREVIEW_BYTES)
+        # El logout va en el background: corre aunque el cliente se vaya antes del primer registro
+        return NDJSONResponse(
+            iterate_in_thread(messages, batch_size=1),
+            background=BackgroundTask(asyncio.to_thread, inbox.logout, mail),
+        )
+
+    def fetch():
+        mail = inbox.connect(user_email, password)
+        try:
+            return inbox.list_messages(mail, limit=limit, preview_bytes=settings.MAIL_PREVIEW_BYTES)
+        finally:
+            inbox.logout(mail)
 
     try:
-        # Connect to Gmail IMAP server
-        mail = imaplib.IMAP4_SSL("imap.gmail.com")
-        mail.login(user_email, password)
-        mail.select("inbox")
-
-        # Search for all emails
-        _, messages = mail.search(None, "ALL")
-        email_ids = messages[0].split()
-
-        # Get the last 10 emails
-        last_10_emails = email_ids[-10:] if len(email_ids) > 10 else email_ids
-        emails = []
-
-        for email_id in reversed(last_10_emails):
-            _, msg_data = mail.fetch(email_id, "(RFC822)")
-            raw_email = msg_data[0][1]
-            email_message = email.message_from_bytes(raw_email)
-
-            # Get subject
-            subject = decode_header(email_message["subject"])[0]
-            subject = subject[0].decode(subject[1] or "utf-8") if isinstance(subject[0], bytes) else subject[0]
-
-            # Get sender
-            from_ = decode_header(email_message["from"])[0]
-            from_ = from_[0].decode(from_[1] or "utf-8") if isinstance(from_[0], bytes) else from_[0]
-
-            # Get date
-            date = email_message["date"]
-            try:
-                # Try different date formats
-                date_formats = [
-                    "%a, %d %b %Y %H:%M:%S %z",  # Fri, 23 May 2025 23:19:21 +0000
-                    "%a, %d %b %Y %H:%M:%S %Z",  # Fri, 23 May 2025 23:19:21 GMT
-                    "%a, %d %b %Y %H:%M:%S",     # Fri, 23 May 2025 23:19:21
-                ]
-                
-                parsed_date = None
-                for date_format in date_formats:
-                    try:
-                        parsed_date = datetime.strptime(date, date_format)
-                        break
-                    except ValueError:
-                        continue
-                
-                if parsed_date:
-                    date = parsed_date.strftime("%Y-%m-%d %H:%M:%S")
-                else:
-                    date = "Unknown date"
-            except Exception:
-                date = "Unknown date"
-
-            # Get body
-            body = ""
-            if email_message.is_multipart():
-                for part in email_message.walk():
-                    if part.get_content_type() == "text/plain":
-                        body = part.get_payload(decode=True).decode()
-                        break
-            else:
-                body = email_message.get_payload(decode=True).decode()
-
-            emails.append({
-                "subject": subject,
-                "from": from_,
-                "date": date,
-                "body": body
-            })
-
-        mail.logout()
-        return {"emails": emails}
+        emails = await asyncio.to_thread(fetch)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching emails: {str(e)}")
+    return FastJSONResponse({"emails": emails})
+
+@router.get("/mail/{uid}/attachments")
+async def list_mail_attachments(uid: int, user_email: str, db: AsyncSession = Depends(get_db)):
+    password = await _mail_password(db, user_email)
+
+    def fetch():
+        mail = inbox.connect(user_email, password)
+        try:
+            return inbox.get_structure(mail, str(uid))
+        finally:
+            inbox.logout(mail)
 
+    try:
+        parts = await asyncio.to_thread(fetch)
+    except inbox.MailError:
+        raise HTTPException(status_code=404, detail="Mensaje no encontrado")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching emails: {str(e)}")
+    return {"uid": uid, "attachments": [inbox.attachment_info(p) for p in parts if inbox.is_attachment(p)]}
+
+# Cada adjunto se baja de IMAP por trozos (BODY.PEEK[n]<offset.N>) mientras se envía
+@router.get("/mail/{uid}/attachments/{part}")
+async def download_mail_attachment(uid: int, part: str, user_email: str, request: Request,
+                                   db: AsyncSession = Depends(get_db)):
+    password = await _mail_password(db, user_email)
+    if not all(n.isdigit() for n in part.split(".")):
+        raise HTTPException(status_code=400, detail="Parte inválida")
+
+    def open_part():
+        mail = inbox.connect(user_email, password)
+        try:
+            found = next((p for p in inbox.get_structure(mail, str(uid)) if p["part"] == part), None)
+        except Exception:
+            inbox.logout(mail)
+            raise
+        if found is None:
+            inbox.logout(mail)
+        return mail, found
+
+    try:
+        mail, found = await asyncio.to_thread(open_part)
+    except inbox.MailError:
+        raise HTTPException(status_code=404, detail="Mensaje no encontrado")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching emails: {str(e)}")
+    if found is None:
+        raise HTTPException(status_code=404, detail="Adjunto no encontrado")
+
+    info = inbox.attachment_info(found)
+
+    async def stream():
+        chunks = inbox.iter_part(mail, str(uid), found, settings.MAIL_FETCH_CHUNK_BYTES)
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+
+    # El logout va en el background: corre aunque el cliente se vaya antes de empezar el cuerpo
+    return CleanupStreamingResponse(
+        bandwidth_scheduler.throttle(stream(), "mail", client_host(request), info["filename"], info["size"]),
+        media_type=info["content_type"],
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(info['filename'])}"},
+        background=BackgroundTask(asyncio.to_thread, inbox.logout, mail),
+    )
 
 @router.post("/mail")
-async def receive_mail(mail_data: dict):
+async def receive_mail(mail_data: dict, db: AsyncSession = Depends(get_db)):
     required_keys = {"subject", "body", "to", "from"}
 
     if not required_keys.issubset(mail_data.keys()):
@@ -612,15 +987,10 @@ async def receive_mail(mail_data: dict):
     subject = mail_data["subject"]
     body = mail_data["body"]
     
-    # Buscar la carpeta del usuario en la carpeta users
-    users_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "users")
-    user_folder = os.path.join(users_dir, sender)
-    if not os.path.exists(user_folder):
+    user = await user_repository.get_by_username(db, sender)
+    if user is None or not user.mail_password:
         raise HTTPException(status_code=404, detail="User not found")
-    # Leer la contraseña del archivo password.txt
-    password_file = os.path.join(user_folder, "password.txt")
-    with open(password_file, "r") as f:
-        password = f.read().strip()
+    password = user.mail_password
     
     # Crear un archivo de texto con el contenido del correo
     filename = f"{time.time()}.txt"
@@ -633,10 +1003,16 @@ async def receive_mail(mail_data: dict):
     email["Subject"] = subject
     email.set_content(body)
 
-    context = ssl.create_default_context()
-
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as smtp:
-        smtp.login(sender, password)
-        smtp.send_message(email)
+    def deliver():
+        if settings.MAIL_SMTP_SSL:
+            context = ssl.create_default_context()
+            smtp_client = smtplib.SMTP_SSL(settings.MAIL_SMTP_HOST, settings.MAIL_SMTP_PORT, context=context)
+        else:
+            smtp_client = smtplib.SMTP(settings.MAIL_SMTP_HOST, settings.MAIL_SMTP_PORT)
+        with smtp_client as smtp:
+            smtp.login(sender, password)
+            smtp.send_message(email)
+
+    await asyncio.to_thread(deliver)
 
     return {"message": "Mail received", "filename": filename}
@@ -0,0 +1,193 @@
+"""Lanzador de producción: python -m app.serve [--workers N] [--host H] [--port P]
+
+Importa la app (y con ella el modelo de app/predict.py) una sola vez en el
+proceso padre y después hace fork de los workers, así las páginas del modelo
+se comparten copy-on-write en lugar de cargarse N veces. gc.freeze() saca esos
+objetos del recolector para que los workers no ensucien las páginas al
+recorrerlos.
+
+Cada worker abre su propio socket con SO_REUSEPORT y el kernel reparte las
+conexiones entre ellos; donde no existe SO_REUSEPORT los workers comparten un
+único socket abierto por el padre. El padre reinicia los workers que terminan
+(p. ej. por SERVER_MAX_REQUESTS) y reenvía SIGTERM/SIGINT para un apagado
+ordenado.
+
+Los WebSockets (chat, streams en vivo), el catálogo en memoria y /metrics son
+por proceso; solo el worker 0 levanta FTP/DNS/SMTP. Al apagar, cada worker
+drena sus WebSockets y transferencias antes de que uvicorn cierre las
+conexiones (ver app/sessions.py).
+"""
+import argparse
+import gc
+import importlib.util
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Optional
+
+import uvicorn
+
+from app.config import settings
+from app.sessions import drainer
+
+logger = logging.getLogger("app.serve")
+
+# Más de este número de caídas en CRASH_WINDOW segundos detiene el servidor
+CRASH_WINDOW = 10.0
+
+
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def build_config(app) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        loop="uvloop" if _has_module("uvloop") else "asyncio",
+        http="httptools" if _has_module("httptools") else "h11",
+        ws="websockets",
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_SECONDS,
+        limit_concurrency=settings.SERVER_LIMIT_CONCURRENCY,
+        limit_max_requests=settings.SERVER_MAX_REQUESTS,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+        ws_max_size=settings.WS_MAX_MESSAGE_BYTES,
+        ws_max_queue=settings.WS_MAX_QUEUE,
+        ws_ping_interval=settings.WS_PING_INTERVAL,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+        access_log=settings.SERVER_ACCESS_LOG,
+        server_header=False,
+        log_config=None,  # los logs ya los configura app.logs
+    )
+
+
+def bind_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(settings.SERVER_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+class DrainingServer(uvicorn.Server):
+    async def shutdown(self, sockets=None) -> None:
+        # Primero dejar de aceptar conexiones y drenar; uvicorn cerraría los WebSockets de golpe
+        for server in self.servers:
+            server.close()
+        await drainer.drain()
+        await super().shutdown(sockets=sockets)
+
+
+def run_worker(app, worker_id: int, sock: socket.socket) -> None:
+    app.state.primary_worker = worker_id == 0
+    config = build_config(app)
+    logger.info("worker_started", extra={"worker": worker_id, "pid": os.getpid(), "loop": config.loop})
+    DrainingServer(config).run(sockets=[sock])
+
+
+class WorkerSupervisor:
+    def __init__(self, app, workers: int, host: str, port: int):
+        self.app = app
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.reuse_port = hasattr(socket, "SO_REUSEPORT")
+        # Sin SO_REUSEPORT: un socket del padre que heredan todos los workers
+        self.shared_socket: Optional[socket.socket] = None if self.reuse_port else bind_socket(host, port, False)
+        self.children: dict[int, int] = {}  # pid -> worker_id
+        self.crashes: list[float] = []
+        self.stopping = False
+
+    def spawn(self, worker_id: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+                    signal.signal(sig, signal.SIG_DFL)
+                sock = self.shared_socket or bind_socket(self.host, self.port, True)
+                run_worker(self.app, worker_id, sock)
+                code = 0
+            except BaseException:
+                logger.exception("worker_failed", extra={"worker": worker_id})
+            finally:
+                os._exit(code)
+        self.children[pid] = worker_id
+
+    def _signal(self, signum, frame) -> None:
+        # El primer SIGTERM/SIGINT apaga ordenadamente; el segundo mata a los workers
+        sig = signal.SIGKILL if self.stopping else signal.SIGTERM
+        self.stopping = True
+        logger.info("server_stopping", extra={"signal": signal.Signals(signum).name})
+        for pid in list(self.children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        if self.reuse_port:
+            # Falla aquí (y no N veces en los workers) si el puerto está ocupado
+            bind_socket(self.host, self.port, True).close()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self._signal)
+        logger.info("server_starting", extra={
+            "host": self.host, "port": self.port, "workers": self.workers,
+            "mode": "reuseport" if self.reuse_port else "shared-socket",
+        })
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker_id = self.children.pop(pid, None)
+            if worker_id is None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            logger.warning("worker_exited", extra={"worker": worker_id, "pid": pid, "code": code})
+            if code != 0:
+                now = time.monotonic()
+                self.crashes = [t for t in self.crashes if now - t < CRASH_WINDOW] + [now]
+                if len(self.crashes) > self.workers:
+                    logger.error("workers_crash_loop", extra={"crashes": len(self.crashes)})
+                    self._signal(signal.SIGTERM, None)
+                    continue
+            self.spawn(worker_id)
+
+        if self.shared_socket is not None:
+            self.shared_socket.close()
+        logger.info("server_stopped")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.serve", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS,
+                        help="procesos worker (0 = uno por CPU)")
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+
+    # Importar la app carga el modelo y las tablas de predicción antes del fork
+    from app.main import app
+    gc.collect()
+    gc.freeze()
+
+    if workers == 1 or not hasattr(os, "fork"):
+        run_worker(app, 0, bind_socket(args.host, args.port, False))
+        return
+    WorkerSupervisor(app, workers, args.host, args.port).run()
+
+
+if __name__ == "__main__":
+    main()
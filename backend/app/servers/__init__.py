@@ -0,0 +1,36 @@
+"""Servidores de protocolo (FTP, DNS, SMTP) que comparten el event loop de FastAPI.
+
+El supervisor se crea en app/main.py y se arranca en el lifespan; cada
+servicio expone su estado real en /<servicio>/status.
+"""
+import asyncio
+import logging
+
+from app.servers.base import Service
+from app.servers.dns import DNSService
+from app.servers.ftp import FTPService
+from app.servers.smtp import SMTPService
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceSupervisor:
+    """Arranca y detiene los servicios; uno que no puede abrir su puerto no impide a los demás."""
+
+    def __init__(self, services: list[Service]):
+        self.services = {service.name: service for service in services}
+
+    def get(self, name: str) -> Service | None:
+        return self.services.get(name)
+
+    async def start(self) -> None:
+        await asyncio.gather(*(service.start() for service in self.services.values()))
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(service.stop() for service in self.services.values()), return_exceptions=True)
+
+    def status(self) -> dict:
+        return {name: service.status() for name, service in self.services.items()}
+
+
+__all__ = ["Service", "ServiceSupervisor", "FTPService", "DNSService", "SMTPService"]
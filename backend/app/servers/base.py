@@ -0,0 +1,157 @@
+"""Base común de los servidores de protocolo que corren en el event loop de la app."""
+import abc
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.admission import admission
+
+logger = logging.getLogger(__name__)
+
+
+class LineTooLong(Exception):
+    """Línea más larga que el límite del StreamReader; ya se descartó hasta el fin de línea."""
+
+    def __init__(self, size: int):
+        super().__init__(f"Línea de {size} bytes")
+        self.size = size
+
+
+async def read_line(reader: asyncio.StreamReader) -> bytes:
+    """Como reader.readline(), pero una línea que excede el límite se descarta y lanza LineTooLong.
+
+    readline() lanza ValueError en ese caso y deja la línea a medio leer en el
+    buffer, así que la sesión no podría seguir.
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial  # EOF: lo que quedaba (b"" si se cerró la conexión)
+    except asyncio.LimitOverrunError as e:
+        consumed = e.consumed
+    size = 0
+    while True:
+        size += len(await reader.read(consumed))
+        try:
+            size += len(await reader.readuntil(b"\n"))
+            break
+        except asyncio.IncompleteReadError as e:
+            size += len(e.partial)
+            break
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+    raise LineTooLong(size)
+
+
+class Service(abc.ABC):
+    """Un listener asyncio con contadores de sesiones y bytes para /<servicio>/status."""
+
+    name = ""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.state = "stopped"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.active_sessions = 0
+        self.sessions_total = 0
+        self.requests_total = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.rejected_total = 0
+        self._servers: list = []
+        self._clients: set = set()
+        self._admitted: dict = {}  # writer -> IP admitida en la clase "session"
+
+    @abc.abstractmethod
+    async def _listen(self) -> list:
+        """Abre los sockets del servicio; devuelve objetos con .close() (Server o transports)."""
+
+    async def start(self) -> None:
+        try:
+            self._servers = await self._listen()
+        except OSError as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error("service_bind_failed", extra={"service": self.name, "port": self.port, "error": str(e)})
+            return
+        self.state = "running"
+        self.error = None
+        self.started_at = time.monotonic()
+        logger.info("service_started", extra={"service": self.name, "listening": self.addresses()})
+
+    async def stop(self) -> None:
+        for server in self._servers:
+            server.close()
+        # Cerrar las sesiones abiertas para que sus handlers terminen antes que el loop
+        for writer in list(self._clients):
+            writer.close()
+        for server in self._servers:
+            if hasattr(server, "sockets"):
+                await server.wait_closed()
+        for _ in range(200):
+            if not self._clients:
+                break
+            await asyncio.sleep(0.01)
+        self._servers = []
+        if self.state == "running":
+            self.state = "stopped"
+
+    def addresses(self) -> list[str]:
+        addresses = []
+        for server in self._servers:
+            # uvloop.Server no hereda de asyncio.AbstractServer: se distingue por .sockets
+            if hasattr(server, "sockets"):
+                sockets = server.sockets
+                proto = "tcp"
+            else:
+                sock = server.get_extra_info("socket")
+                sockets = [sock] if sock is not None else []
+                proto = "udp"
+            for sock in sockets:
+                host, port = sock.getsockname()[:2]
+                addresses.append(f"{proto}://{host}:{port}")
+        return addresses
+
+    def admit(self, writer: asyncio.StreamWriter) -> bool:
+        """Control de admisión por IP de una conexión nueva; si se rechaza responde 421 y cierra."""
+        peer = writer.get_extra_info("peername")
+        client = peer[0] if peer else "unknown"
+        if admission.admit(client, "session") is not None:
+            self.rejected_total += 1
+            writer.write("421 Demasiadas conexiones, intente más tarde\r\n".encode("utf-8"))
+            writer.close()
+            return False
+        self._admitted[writer] = client
+        return True
+
+    def session_opened(self, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        self.active_sessions += 1
+        self.sessions_total += 1
+
+    def session_closed(self, writer: asyncio.StreamWriter) -> None:
+        self._clients.discard(writer)
+        self.active_sessions -= 1
+        client = self._admitted.pop(writer, None)
+        if client is not None:
+            admission.release(client, "session")
+
+    def status(self) -> dict:
+        uptime = time.monotonic() - self.started_at if self.started_at and self.state == "running" else 0.0
+        return {
+            "service": self.name,
+            "status": self.state,
+            "error": self.error,
+            "listening": self.addresses(),
+            "uptime_seconds": round(uptime, 1),
+            "active_sessions": self.active_sessions,
+            "sessions_total": self.sessions_total,
+            "requests_total": self.requests_total,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "rejected_total": self.rejected_total,
+            "throughput_bytes_per_second": round((self.bytes_in + self.bytes_out) / uptime, 1) if uptime else 0.0,
+        }
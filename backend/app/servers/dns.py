@@ -0,0 +1,151 @@
+"""Servidor DNS autoritativo mínimo (UDP) para los registros A/AAAA de la app.
+
+Los registros se guardan en un JSON ({"nombre": "ip"}) y se administran con
+POST /dns/configure. Solo responde consultas estándar de clase IN; cualquier
+otro nombre recibe NXDOMAIN y cualquier otro opcode NOTIMP.
+"""
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import struct
+from typing import Optional
+
+from app.admission import admission
+from app.servers.base import Service
+
+logger = logging.getLogger(__name__)
+
+TYPE_A = 1
+TYPE_AAAA = 28
+TYPE_ANY = 255
+CLASS_IN = 1
+
+RCODE_OK = 0
+RCODE_FORMERR = 1
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP = 4
+
+
+def _parse_question(packet: bytes) -> tuple[str, int, int, int]:
+    """Devuelve (nombre, tipo, clase, offset del fin de la pregunta)."""
+    labels = []
+    offset = 12
+    while True:
+        length = packet[offset]
+        offset += 1
+        if length == 0:
+            break
+        if length & 0xC0:
+            raise ValueError("compresión no soportada en la pregunta")
+        labels.append(packet[offset:offset + length].decode("ascii").lower())
+        offset += length
+    qtype, qclass = struct.unpack_from("!HH", packet, offset)
+    return ".".join(labels), qtype, qclass, offset + 4
+
+
+def _header(query_id: int, flags: int, rcode: int, qdcount: int, ancount: int) -> bytes:
+    # QR=1, AA=1, conserva RD de la consulta
+    flags = 0x8400 | (flags & 0x0100) | rcode
+    return struct.pack("!HHHHHH", query_id, flags, qdcount, ancount, 0, 0)
+
+
+class DNSResolver:
+    def __init__(self, records_path: str, ttl: int = 60):
+        self.records_path = records_path
+        self.ttl = ttl
+        self.records: dict[str, str] = {}
+
+    def load(self) -> None:
+        if os.path.exists(self.records_path):
+            with open(self.records_path, "r", encoding="utf-8") as f:
+                self.records = {k.lower().rstrip("."): v for k, v in json.load(f).items()}
+
+    def update(self, records: dict[str, str], replace: bool = False) -> dict[str, str]:
+        """Valida y guarda los registros (un valor vacío elimina el nombre)."""
+        current = {} if replace else dict(self.records)
+        for name, address in records.items():
+            name = name.lower().rstrip(".")
+            if not address:
+                current.pop(name, None)
+                continue
+            current[name] = str(ipaddress.ip_address(address))
+        tmp_path = self.records_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        os.replace(tmp_path, self.records_path)
+        self.records = current
+        return current
+
+    def answer(self, packet: bytes) -> Optional[bytes]:
+        if len(packet) < 12:
+            return None
+        query_id, flags, qdcount = struct.unpack_from("!HHH", packet)
+        if flags & 0x8000:
+            return None  # es una respuesta, no una consulta
+        opcode = (flags >> 11) & 0xF
+        if opcode != 0 or qdcount != 1:
+            return _header(query_id, flags, RCODE_NOTIMP if opcode else RCODE_FORMERR, 0, 0)
+        try:
+            name, qtype, qclass, end = _parse_question(packet)
+        except (ValueError, IndexError, struct.error, UnicodeDecodeError):
+            return _header(query_id, flags, RCODE_FORMERR, 0, 0)
+        question = packet[12:end]
+
+        address = self.records.get(name)
+        if address is None or qclass != CLASS_IN:
+            return _header(query_id, flags, RCODE_NXDOMAIN, 1, 0) + question
+
+        ip = ipaddress.ip_address(address)
+        rtype = TYPE_A if ip.version == 4 else TYPE_AAAA
+        if qtype not in (rtype, TYPE_ANY):
+            # El nombre existe pero no tiene registros de ese tipo (NODATA)
+            return _header(query_id, flags, RCODE_OK, 1, 0) + question
+        rdata = ip.packed
+        answer = struct.pack("!HHHIH", 0xC00C, rtype, CLASS_IN, self.ttl, len(rdata)) + rdata
+        return _header(query_id, flags, RCODE_OK, 1, 1) + question + answer
+
+
+class _DNSProtocol(asyncio.DatagramProtocol):
+    def __init__(self, service: "DNSService"):
+        self.service = service
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        service = self.service
+        service.requests_total += 1
+        service.bytes_in += len(data)
+        # UDP: ante un exceso se descarta en silencio (responder amplificaría el tráfico)
+        if admission.admit(addr[0], "dns") is not None:
+            service.rejected_total += 1
+            return
+        admission.release(addr[0], "dns")
+        response = service.resolver.answer(data)
+        if response is not None:
+            service.bytes_out += len(response)
+            self.transport.sendto(response, addr)
+
+
+class DNSService(Service):
+    name = "DNS"
+
+    def __init__(self, host: str, port: int, records_path: str, ttl: int = 60):
+        super().__init__(host, port)
+        self.resolver = DNSResolver(records_path, ttl)
+
+    async def _listen(self) -> list:
+        self.resolver.load()
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DNSProtocol(self), local_addr=(self.host, self.port)
+        )
+        return [transport]
+
+    def status(self) -> dict:
+        status = super().status()
+        status["records"] = len(self.resolver.records)
+        return status
@@ -0,0 +1,406 @@
+"""Servidor FTP (RFC 959) en modo pasivo sobre el mismo directorio que /ftp/upload.
+
+El directorio es plano: no hay subcarpetas, CWD solo acepta "/". Las
+descargas usan loop.sendfile (os.sendfile cuando el loop lo soporta) y las
+subidas se escriben a un temporal que se renombra al terminar.
+
+El usuario anonymous (FTP_ALLOW_ANONYMOUS, desactivado por defecto) es de solo
+lectura. La conexión de datos solo se acepta desde la misma IP que la de
+control, para que nadie más pueda robar el puerto pasivo (port stealing).
+"""
+import asyncio
+import ipaddress
+import logging
+import os
+import tempfile
+import time
+from typing import Optional
+
+from app.auth import verify_password_async
+from app.database import SessionLocal
+from app.repository import user_repository
+from app.servers.base import LineTooLong, Service, read_line
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+DATA_TIMEOUT = 30.0
+
+
+def _safe_name(arg: str) -> Optional[str]:
+    name = os.path.basename(arg.strip().replace("\\", "/").rstrip("/"))
+    if name in ("", ".", ".."):
+        return None
+    return name
+
+
+def _same_host(a: str, b: str) -> bool:
+    # Con sockets dual-stack una IPv4 puede llegar como ::ffff:a.b.c.d
+    try:
+        x, y = ipaddress.ip_address(a), ipaddress.ip_address(b)
+    except ValueError:
+        return a == b
+    x = getattr(x, "ipv4_mapped", None) or x
+    y = getattr(y, "ipv4_mapped", None) or y
+    return x == y
+
+
+def _stat_file(path: Optional[str]) -> Optional[os.stat_result]:
+    """stat de un archivo regular, o None si no existe o no es un archivo."""
+    if path is None or not os.path.isfile(path):
+        return None
+    return os.stat(path)
+
+
+def _remove_file(path: Optional[str]) -> bool:
+    if path is None or not os.path.isfile(path):
+        return False
+    os.remove(path)
+    return True
+
+
+def _list_line(path: str, name: str) -> str:
+    st = os.stat(path)
+    stamp = time.strftime("%b %d %H:%M", time.localtime(st.st_mtime))
+    return f"-rw-r--r-- 1 ftp ftp {st.st_size:>12} {stamp} {name}\r\n"
+
+
+class PassiveListener:
+    """Socket de datos de un solo uso abierto por PASV/EPSV; solo acepta a peer_host."""
+
+    def __init__(self, peer_host: str):
+        self.peer_host = peer_host
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.connection: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    async def open(self, host: str) -> int:
+        self.server = await asyncio.start_server(self._accept, host, 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.connection.done():
+            writer.close()
+            return
+        peer = writer.get_extra_info("peername")
+        if not peer or not _same_host(peer[0], self.peer_host):
+            # Se sigue esperando al cliente legítimo hasta DATA_TIMEOUT
+            logger.warning("ftp_data_peer_rejected", extra={
+                "peer": peer[0] if peer else None, "expected": self.peer_host,
+            })
+            writer.close()
+            return
+        self.connection.set_result((reader, writer))
+        self.server.close()
+
+    async def accept(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        return await asyncio.wait_for(asyncio.shield(self.connection), DATA_TIMEOUT)
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        if self.connection.done() and not self.connection.cancelled():
+            self.connection.result()[1].close()
+        else:
+            self.connection.cancel()
+
+
+class FTPSession:
+    # Comandos permitidos antes de autenticarse
+    PUBLIC = {"USER", "PASS", "QUIT", "SYST", "FEAT", "NOOP", "OPTS", "AUTH"}
+
+    def __init__(self, service: "FTPService", reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.service = service
+        self.reader = reader
+        self.writer = writer
+        self.username: Optional[str] = None
+        self.authenticated = False
+        self.anonymous = False
+        self.passive: Optional[PassiveListener] = None
+        self.rest_offset = 0
+
+    async def reply(self, text: str) -> None:
+        data = (text + "\r\n").encode("utf-8")
+        self.service.bytes_out += len(data)
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def _path(self, arg: str) -> Optional[str]:
+        name = _safe_name(arg)
+        return os.path.join(self.service.root, name) if name else None
+
+    async def run(self) -> None:
+        await self.reply("220 NetApp FTP listo")
+        while True:
+            try:
+                line = await read_line(self.reader)
+            except LineTooLong as e:
+                self.service.bytes_in += e.size
+                await self.reply("500 Línea demasiado larga")
+                continue
+            if not line:
+                return
+            self.service.bytes_in += len(line)
+            self.service.requests_total += 1
+            command, _, arg = line.decode("utf-8", errors="replace").strip().partition(" ")
+            command = command.upper()
+            if not self.authenticated and command not in self.PUBLIC:
+                await self.reply("530 Inicie sesión con USER y PASS")
+                continue
+            handler = getattr(self, f"cmd_{command}", None)
+            if handler is None:
+                await self.reply(f"502 Comando {command} no implementado")
+                continue
+            if await handler(arg) is False:
+                return
+
+    def close(self) -> None:
+        if self.passive is not None:
+            self.passive.close()
+            self.passive = None
+
+    # --- Sesión ---
+    async def cmd_USER(self, arg):
+        self.username = arg.strip()
+        self.authenticated = False
+        self.anonymous = False
+        await self.reply(f"331 Contraseña requerida para {self.username}")
+
+    async def cmd_PASS(self, arg):
+        if self.username is None:
+            await self.reply("503 Envíe USER primero")
+            return
+        if await self.service.authenticate(self.username, arg):
+            self.authenticated = True
+            self.anonymous = self.service.is_anonymous(self.username)
+            await self.reply("230 Sesión iniciada (solo lectura)" if self.anonymous else "230 Sesión iniciada")
+        else:
+            await self.reply("530 Credenciales inválidas")
+
+    async def cmd_AUTH(self, arg):
+        await self.reply("502 TLS no disponible")
+
+    async def cmd_QUIT(self, arg):
+        await self.reply("221 Adiós")
+        return False
+
+    async def cmd_NOOP(self, arg):
+        await self.reply("200 OK")
+
+    async def cmd_SYST(self, arg):
+        await self.reply("215 UNIX Type: L8")
+
+    async def cmd_FEAT(self, arg):
+        await self.reply("211-Extensiones:\r\n EPSV\r\n PASV\r\n SIZE\r\n MDTM\r\n REST STREAM\r\n UTF8\r\n211 Fin")
+
+    async def cmd_OPTS(self, arg):
+        await self.reply("200 OK")
+
+    async def cmd_TYPE(self, arg):
+        await self.reply(f"200 Tipo {arg.strip().upper() or 'I'}")
+
+    async def cmd_MODE(self, arg):
+        await self.reply("200 Modo S" if arg.strip().upper() == "S" else "504 Solo modo S")
+
+    async def cmd_STRU(self, arg):
+        await self.reply("200 Estructura F" if arg.strip().upper() == "F" else "504 Solo estructura F")
+
+    async def cmd_PWD(self, arg):
+        await self.reply('257 "/" es el directorio actual')
+
+    async def cmd_CWD(self, arg):
+        await self.reply("250 OK" if arg.strip() in ("/", ".", "") else "550 Directorio no encontrado")
+
+    async def cmd_CDUP(self, arg):
+        await self.reply("250 OK")
+
+    async def _writable(self) -> bool:
+        if self.anonymous:
+            await self.reply("550 Permiso denegado: el acceso anónimo es de solo lectura")
+            return False
+        return True
+
+    # --- Canal de datos ---
+    async def _open_passive(self) -> int:
+        self.close()
+        self.passive = PassiveListener(self.writer.get_extra_info("peername")[0])
+        host = self.writer.get_extra_info("sockname")[0]
+        return await self.passive.open(host)
+
+    async def cmd_PASV(self, arg):
+        port = await self._open_passive()
+        address = self.service.passive_address or self.writer.get_extra_info("sockname")[0]
+        h = address.split(".")
+        if len(h) != 4:
+            await self.reply("522 Use EPSV")
+            return
+        await self.reply(f"227 Modo pasivo ({','.join(h)},{port >> 8},{port & 0xFF})")
+
+    async def cmd_EPSV(self, arg):
+        port = await self._open_passive()
+        await self.reply(f"229 Modo pasivo extendido (|||{port}|)")
+
+    async def _data_connection(self):
+        if self.passive is None:
+            await self.reply("425 Use PASV o EPSV primero")
+            return None
+        await self.reply("150 Abriendo conexión de datos")
+        try:
+            return await self.passive.accept()
+        except asyncio.TimeoutError:
+            self.close()
+            await self.reply("425 No se recibió la conexión de datos")
+            return None
+
+    async def _finish_data(self, writer: asyncio.StreamWriter, ok: bool = True) -> None:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+        self.passive = None
+        await self.reply("226 Transferencia completa" if ok else "426 Transferencia interrumpida")
+
+    async def _send_listing(self, arg: str, names_only: bool) -> None:
+        entries = await asyncio.to_thread(self.service.listing, names_only)
+        connection = await self._data_connection()
+        if connection is None:
+            return
+        _, writer = connection
+        data = "".join(entries).encode("utf-8")
+        writer.write(data)
+        self.service.bytes_out += len(data)
+        await writer.drain()
+        await self._finish_data(writer)
+
+    async def cmd_LIST(self, arg):
+        await self._send_listing(arg, names_only=False)
+
+    async def cmd_NLST(self, arg):
+        await self._send_listing(arg, names_only=True)
+
+    async def cmd_REST(self, arg):
+        try:
+            self.rest_offset = max(0, int(arg.strip()))
+        except ValueError:
+            await self.reply("501 Desplazamiento inválido")
+            return
+        await self.reply(f"350 Reanudando en {self.rest_offset}")
+
+    async def cmd_RETR(self, arg):
+        path = self._path(arg)
+        offset, self.rest_offset = self.rest_offset, 0
+        if path is None or not os.path.isfile(path):
+            await self.reply("550 Archivo no encontrado")
+            return
+        connection = await self._data_connection()
+        if connection is None:
+            return
+        _, writer = connection
+        ok = True
+        loop = asyncio.get_running_loop()
+        try:
+            with open(path, "rb") as f:
+                sent = await loop.sendfile(writer.transport, f, offset)
+            self.service.bytes_out += sent
+        except (ConnectionError, OSError) as e:
+            logger.info("ftp_retr_aborted", extra={"file": os.path.basename(path), "error": str(e)})
+            ok = False
+        await self._finish_data(writer, ok)
+
+    async def cmd_STOR(self, arg):
+        if not await self._writable():
+            return
+        path = self._path(arg)
+        if path is None:
+            await self.reply("553 Nombre de archivo inválido")
+            return
+        connection = await self._data_connection()
+        if connection is None:
+            return
+        reader, writer = connection
+        fd, tmp_path = tempfile.mkstemp(dir=self.service.root, prefix=".upload-")
+        ok = True
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while chunk := await reader.read(CHUNK_SIZE):
+                    self.service.bytes_in += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            os.replace(tmp_path, path)
+        except (ConnectionError, OSError) as e:
+            logger.info("ftp_stor_aborted", extra={"file": os.path.basename(path), "error": str(e)})
+            ok = False
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        await self._finish_data(writer, ok)
+
+    async def cmd_SIZE(self, arg):
+        st = await asyncio.to_thread(_stat_file, self._path(arg))
+        if st is None:
+            await self.reply("550 Archivo no encontrado")
+            return
+        await self.reply(f"213 {st.st_size}")
+
+    async def cmd_MDTM(self, arg):
+        st = await asyncio.to_thread(_stat_file, self._path(arg))
+        if st is None:
+            await self.reply("550 Archivo no encontrado")
+            return
+        await self.reply("213 " + time.strftime("%Y%m%d%H%M%S", time.gmtime(st.st_mtime)))
+
+    async def cmd_DELE(self, arg):
+        if not await self._writable():
+            return
+        if not await asyncio.to_thread(_remove_file, self._path(arg)):
+            await self.reply("550 Archivo no encontrado")
+            return
+        await self.reply("250 Archivo eliminado")
+
+
+class FTPService(Service):
+    name = "FTP"
+
+    def __init__(self, host: str, port: int, root: str, allow_anonymous: bool = False,
+                 passive_address: Optional[str] = None):
+        super().__init__(host, port)
+        self.root = os.path.abspath(root)
+        self.allow_anonymous = allow_anonymous
+        self.passive_address = passive_address
+
+    async def _listen(self) -> list:
+        os.makedirs(self.root, exist_ok=True)
+        return [await asyncio.start_server(self._handle, self.host, self.port)]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if not self.admit(writer):
+            return
+        session = FTPSession(self, reader, writer)
+        self.session_opened(writer)
+        try:
+            await session.run()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            session.close()
+            self.session_closed(writer)
+            writer.close()
+
+    @staticmethod
+    def is_anonymous(username: str) -> bool:
+        return username.lower() in ("anonymous", "ftp")
+
+    async def authenticate(self, username: str, password: str) -> bool:
+        """Usuarios de la app (mismas credenciales que /login); anonymous si está habilitado."""
+        if self.is_anonymous(username):
+            return self.allow_anonymous
+        async with SessionLocal() as db:
+            user = await user_repository.get_by_username(db, username)
+        return user is not None and await verify_password_async(password, user.hashed_password)
+
+    def listing(self, names_only: bool) -> list[str]:
+        entries = []
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            entries.append(name + "\r\n" if names_only else _list_line(path, name))
+        return entries
@@ -0,0 +1,160 @@
+"""Servidor SMTP de recepción: guarda cada mensaje como .eml en la carpeta mailbox/.
+
+Sirve de relay local para /mail/send (MAIL_RELAY_HOST/PORT) y acepta correo
+de cualquier cliente. No hace relay hacia afuera ni exige autenticación.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Optional
+
+from app.servers.base import LineTooLong, Service, read_line
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPSession:
+    def __init__(self, service: "SMTPService", reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.service = service
+        self.reader = reader
+        self.writer = writer
+        self.reset()
+
+    def reset(self) -> None:
+        self.sender: Optional[str] = None
+        self.recipients: list[str] = []
+
+    async def reply(self, text: str) -> None:
+        data = (text + "\r\n").encode("utf-8")
+        self.service.bytes_out += len(data)
+        self.writer.write(data)
+        await self.writer.drain()
+
+    async def run(self) -> None:
+        await self.reply("220 NetApp ESMTP listo")
+        while True:
+            try:
+                line = await read_line(self.reader)
+            except LineTooLong as e:
+                self.service.bytes_in += e.size
+                await self.reply("500 Línea demasiado larga")
+                continue
+            if not line:
+                return
+            self.service.bytes_in += len(line)
+            self.service.requests_total += 1
+            command, _, arg = line.decode("utf-8", errors="replace").strip().partition(" ")
+            command = command.upper()
+            if command in ("EHLO", "HELO"):
+                self.reset()
+                if command == "EHLO":
+                    await self.reply(f"250-localhost\r\n250-SIZE {self.service.max_message_bytes}\r\n250 8BITMIME")
+                else:
+                    await self.reply("250 localhost")
+            elif command == "MAIL":
+                self.reset()
+                self.sender = arg.partition(":")[2].split(" ")[0].strip("<>")
+                await self.reply("250 OK")
+            elif command == "RCPT":
+                if self.sender is None:
+                    await self.reply("503 Envíe MAIL primero")
+                    continue
+                self.recipients.append(arg.partition(":")[2].strip().strip("<>"))
+                await self.reply("250 OK")
+            elif command == "DATA":
+                if not self.recipients:
+                    await self.reply("503 Envíe RCPT primero")
+                    continue
+                await self.reply("354 Termine con <CRLF>.<CRLF>")
+                await self.receive_data()
+            elif command == "RSET":
+                self.reset()
+                await self.reply("250 OK")
+            elif command == "NOOP":
+                await self.reply("250 OK")
+            elif command == "VRFY":
+                await self.reply("252 No se verifica, pero se intentará la entrega")
+            elif command == "QUIT":
+                await self.reply("221 Adiós")
+                return
+            else:
+                await self.reply("502 Comando no implementado")
+
+    async def receive_data(self) -> None:
+        lines = []
+        size = 0
+        too_big = False
+        while True:
+            try:
+                line = await read_line(self.reader)
+            except LineTooLong as e:
+                # Solo pasa con líneas mayores que el mensaje máximo (ver _listen)
+                self.service.bytes_in += e.size
+                size += e.size
+                too_big = True
+                continue
+            if not line:
+                raise ConnectionError("conexión cerrada durante DATA")
+            self.service.bytes_in += len(line)
+            if line in (b".\r\n", b".\n"):
+                break
+            if line.startswith(b".."):
+                line = line[1:]  # dot-stuffing (RFC 5321 4.5.2)
+            size += len(line)
+            if size > self.service.max_message_bytes:
+                too_big = True
+                continue
+            lines.append(line)
+        if too_big:
+            await self.reply("552 Mensaje demasiado grande")
+        else:
+            filename = await asyncio.to_thread(self.service.store, b"".join(lines))
+            await self.reply(f"250 OK en cola como {filename}")
+        self.reset()
+
+
+class SMTPService(Service):
+    name = "SMTP"
+
+    def __init__(self, host: str, port: int, mailbox_dir: str, max_message_bytes: int = 25 * 1024 * 1024):
+        super().__init__(host, port)
+        self.mailbox_dir = os.path.abspath(mailbox_dir)
+        self.max_message_bytes = max_message_bytes
+        self.messages_received = 0
+
+    async def _listen(self) -> list:
+        os.makedirs(self.mailbox_dir, exist_ok=True)
+        # El límite de línea del StreamReader (64 KiB por defecto) se sube al tamaño
+        # máximo de mensaje: HTML generado sin cortes de línea es habitual en DATA
+        limit = self.max_message_bytes + 2
+        return [await asyncio.start_server(self._handle, self.host, self.port, limit=limit)]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if not self.admit(writer):
+            return
+        self.session_opened(writer)
+        try:
+            await SMTPSession(self, reader, writer).run()
+        except ConnectionError:
+            pass
+        finally:
+            self.session_closed(writer)
+            writer.close()
+
+    def store(self, message: bytes) -> str:
+        filename = f"{time.time():.6f}-{uuid.uuid4().hex[:8]}.eml"
+        path = os.path.join(self.mailbox_dir, filename)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(message)
+        os.replace(tmp_path, path)
+        self.messages_received += 1
+        logger.debug("smtp_message_stored", extra={"file": filename, "bytes": len(message)})
+        return filename
+
+    def status(self) -> dict:
+        status = super().status()
+        status["messages_received"] = self.messages_received
+        return status
@@ -0,0 +1,161 @@
+"""Drenado ordenado de conexiones al apagar y tokens para reanudar WebSockets.
+
+Con python -m app.serve, al recibir SIGTERM y antes de que uvicorn cierre las
+conexiones (ver DrainingServer en app/serve.py):
+
+1. se cierran los sockets de escucha y los WebSockets que lleguen después se
+   rechazan con 1012 (service restart);
+2. cada WebSocket abierto recibe un retraso aleatorio en
+   [0, WS_DRAIN_JITTER_SECONDS]. Los clientes con sesión reciben enseguida
+   {"type": "reconnect", "delay_ms": ..., "resume_token": ...}, y todas las
+   conexiones se cierran con 1012 al vencer su retraso. Así la audiencia no
+   reconecta toda en el mismo instante;
+3. a la vez se espera a que terminen las transferencias HTTP en curso
+   (descargas, play, ZIP), hasta SERVER_GRACEFUL_SHUTDOWN_SECONDS.
+
+El resume token es un JWT firmado con SECRET_KEY, con audiencia propia, así
+que no sirve como token de acceso ni al revés. Guarda el estado de la sesión:
+el stream y el rol, o el canal de chat. Como es autocontenido, sirve en
+cualquier worker y después de un reinicio.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Callable, Optional
+
+import jwt
+from fastapi import WebSocket
+
+from app.config import settings
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RESUME_AUDIENCE = "ws-resume"
+# Código de cierre de WebSocket "service restart" (RFC 6455, registro IANA)
+CLOSE_SERVICE_RESTART = 1012
+
+websocket_resumes = registry.counter(
+    "websocket_resumes_total", "Reconexiones de WebSocket con resume token.", ("channel", "result")
+)
+
+
+class ResumeTokens:
+    def __init__(self, secret: str, algorithm: str = "HS256", ttl: float = 300.0):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.ttl = ttl
+
+    def issue(self, state: dict) -> str:
+        payload = {**state, "aud": RESUME_AUDIENCE, "exp": int(time.time() + self.ttl)}
+        return jwt.encode(payload, self.secret, algorithm=self.algorithm)
+
+    def verify(self, token: str, kind: str) -> Optional[dict]:
+        """Estado guardado en el token, o None si es inválido, expiró o es de otro canal."""
+        try:
+            payload = jwt.decode(token, self.secret, algorithms=[self.algorithm], audience=RESUME_AUDIENCE)
+        except jwt.PyJWTError:
+            websocket_resumes.inc(channel=kind, result="invalid")
+            return None
+        if payload.get("kind") != kind:
+            websocket_resumes.inc(channel=kind, result="invalid")
+            return None
+        websocket_resumes.inc(channel=kind, result="resumed")
+        return {k: v for k, v in payload.items() if k not in ("aud", "exp")}
+
+
+class _Session:
+    __slots__ = ("state", "session")
+
+    def __init__(self, state: Callable[[], dict], session: bool):
+        self.state = state      # estado actual para el token (cambia, p. ej. al pasar a broadcaster)
+        self.session = session  # el cliente entiende los mensajes de control
+
+
+class ConnectionDrainer:
+    def __init__(self, tokens: ResumeTokens, jitter: float = 10.0, transfer_timeout: float = 30.0):
+        self.tokens = tokens
+        self.jitter = jitter
+        self.transfer_timeout = transfer_timeout
+        self.sockets: dict[WebSocket, _Session] = {}
+        self.transfer_sources: list[Callable[[], int]] = []
+        self.draining = False
+        self._drained: Optional[asyncio.Task] = None
+
+    def attach(self, websocket: WebSocket, state: Callable[[], dict], session: bool = True) -> None:
+        self.sockets[websocket] = _Session(state, session)
+
+    def detach(self, websocket: WebSocket) -> None:
+        self.sockets.pop(websocket, None)
+
+    def track_transfers(self, count: Callable[[], int]) -> None:
+        self.transfer_sources.append(count)
+
+    def in_flight_transfers(self) -> int:
+        return sum(count() for count in self.transfer_sources)
+
+    def session_token(self, websocket: WebSocket) -> Optional[str]:
+        entry = self.sockets.get(websocket)
+        return self.tokens.issue(entry.state()) if entry is not None else None
+
+    async def _release(self, websocket: WebSocket, entry: _Session, delay: float) -> None:
+        if entry.session:
+            try:
+                await websocket.send_json({
+                    "type": "reconnect",
+                    "delay_ms": int(delay * 1000),
+                    "resume_token": self.tokens.issue(entry.state()),
+                })
+            except Exception:
+                return
+        await asyncio.sleep(delay)
+        try:
+            await websocket.close(code=CLOSE_SERVICE_RESTART)
+        except Exception:
+            pass  # ya estaba cerrado
+
+    async def _wait_transfers(self) -> int:
+        deadline = time.monotonic() + self.transfer_timeout
+        while self.in_flight_transfers() and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+        return self.in_flight_transfers()
+
+    async def _drain(self) -> None:
+        entries = list(self.sockets.items())
+        logger.info("drain_started", extra={
+            "websockets": len(entries), "transfers": self.in_flight_transfers(), "jitter_seconds": self.jitter,
+        })
+        start = time.monotonic()
+        releases = [self._release(ws, entry, random.uniform(0, self.jitter)) for ws, entry in entries]
+        *_, remaining = await asyncio.gather(*releases, self._wait_transfers(), return_exceptions=True)
+        logger.info("drain_finished", extra={
+            "seconds": round(time.monotonic() - start, 3), "transfers_remaining": remaining,
+        })
+
+    async def drain(self) -> None:
+        """Deja de aceptar WebSockets, los libera escalonados y espera las transferencias (idempotente)."""
+        self.draining = True
+        if self._drained is None:
+            self._drained = asyncio.get_running_loop().create_task(self._drain())
+        await self._drained
+
+    def status(self) -> dict:
+        return {
+            "draining": self.draining,
+            "websockets": len(self.sockets),
+            "session_clients": sum(1 for entry in self.sockets.values() if entry.session),
+            "transfers": self.in_flight_transfers(),
+        }
+
+
+resume_tokens = ResumeTokens(settings.SECRET_KEY, settings.ALGORITHM, settings.WS_RESUME_TTL_SECONDS)
+drainer = ConnectionDrainer(
+    resume_tokens,
+    jitter=settings.WS_DRAIN_JITTER_SECONDS,
+    transfer_timeout=settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+)
+registry.gauge(
+    "websocket_drain_tracked", "WebSockets registrados para el drenado al apagar.",
+    collect=lambda: len(drainer.sockets),
+)
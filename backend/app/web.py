@@ -0,0 +1,325 @@
+import os
+import re
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import tarfile
+import zipfile
+import tempfile
+import mimetypes
+import threading
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Escribe en un temporal del mismo directorio y lo renombra sobre el destino."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True si If-None-Match pide etag: lista separada por comas, "*", comparación débil (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def choose_encoding(accept_encoding: str, available) -> Optional[str]:
+    """Elige la mejor codificación disponible según Accept-Encoding (br > gzip)."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+
+    for coding in ("br", "gzip"):
+        if coding in available and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+class CompressedAsset:
+    """Contenido en memoria con variantes comprimidas y ETag precalculados."""
+
+    def __init__(self, data: bytes, media_type: str):
+        self.media_type = media_type
+        self.etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+        self.variants = {None: data}
+        self.variants["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(data, quality=11)
+
+    def select(self, accept_encoding: str) -> tuple:
+        encoding = choose_encoding(accept_encoding, self.variants)
+        return encoding, self.variants[encoding]
+
+
+class WebContentCache:
+    """Contenido web desplegado, mantenido en memoria.
+
+    Todo el trabajo (lectura, compresión, ETag, cuerpo JSON) se hace al
+    desplegar; las lecturas solo devuelven bytes ya preparados.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.html = ""
+        self.page: Optional[CompressedAsset] = None
+        self.json_body = b'{"content":""}'
+
+    def _build(self, html: str) -> None:
+        page = CompressedAsset(html.encode("utf-8"), "text/html; charset=utf-8")
+        json_body = json.dumps({"content": html}, ensure_ascii=False).encode("utf-8")
+        # Reemplazo de referencias: los lectores ven la versión vieja o la nueva
+        self.html, self.page, self.json_body = html, page, json_body
+
+    def load(self) -> None:
+        with self._lock:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._build(f.read())
+            self._loaded = True
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def deploy(self, html: str) -> None:
+        with self._lock:
+            atomic_write(self.path, html.encode("utf-8"))
+            self._build(html)
+            self._loaded = True
+
+
+# --- Despliegues versionados (bundles tar/zip) ---
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/javascript", "application/json", "application/xml",
+    "image/svg+xml", "application/wasm",
+)
+# Nombres con hash de contenido al estilo de los bundlers: justo antes de la
+# extensión, tras un "." o "-", un token hexadecimal de 8 a 64 caracteres
+# (webpack, Parcel: app.3f9a1c2b.js) o uno base64url de exactamente 8 (Rollup,
+# Vite, esbuild: index-DiwrgTda.css, vendor-abcdefgh.js). Los tokens de solo
+# dígitos son fechas o versiones (informe-20231015.pdf). Es una heurística: una
+# palabra de 8 letras (app.settings.js) también pasa por hash.
+HASHED_ASSET_RE = re.compile(
+    r"^.+[.-](?!\d+\.[A-Za-z0-9]+$)(?:[A-Za-z0-9_-]{8}|[0-9a-f]{8,64}|[0-9A-F]{8,64})\.[A-Za-z0-9]+$"
+)
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+MANIFEST_NAME = ".manifest.json"
+
+
+class BundleError(ValueError):
+    pass
+
+
+def _safe_member_path(root: str, name: str) -> str:
+    """Ruta destino dentro de root; rechaza rutas absolutas y '..'."""
+    name = name.replace("\\", "/").lstrip("/")
+    root = os.path.abspath(root)
+    target = os.path.normpath(os.path.join(root, name))
+    if not target.startswith(root + os.sep):
+        raise BundleError(f"Ruta no permitida en el bundle: {name}")
+    return target
+
+
+def _extract_bundle(fileobj, filename: str, dest: str, max_bytes: int) -> None:
+    total = 0
+    lower = filename.lower()
+    if lower.endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                total += info.file_size
+                if total > max_bytes:
+                    raise BundleError("El bundle excede el tamaño máximo permitido")
+                target = _safe_member_path(dest, info.filename)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with zf.open(info) as src, open(target, "wb") as out:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+    elif lower.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")):
+        with tarfile.open(fileobj=fileobj, mode="r:*") as tf:
+            for member in tf:
+                if member.isdir():
+                    continue
+                if not member.isfile():
+                    raise BundleError(f"Tipo de entrada no permitido en el bundle: {member.name}")
+                total += member.size
+                if total > max_bytes:
+                    raise BundleError("El bundle excede el tamaño máximo permitido")
+                target = _safe_member_path(dest, member.name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with tf.extractfile(member) as src, open(target, "wb") as out:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+    else:
+        raise BundleError("Formato no soportado. Usa .zip, .tar, .tar.gz o .tgz")
+
+
+def _build_manifest(root: str) -> dict:
+    """Genera variantes .gz/.br junto a cada archivo comprimible y devuelve el manifiesto."""
+    manifest = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            rel = os.path.relpath(full, root).replace(os.sep, "/")
+            with open(full, "rb") as f:
+                data = f.read()
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            encodings = []
+            if media_type.startswith(COMPRESSIBLE_TYPES) and len(data) > 256:
+                gz = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(gz) < len(data):
+                    with open(full + ".gz", "wb") as f:
+                        f.write(gz)
+                    encodings.append("gzip")
+                if brotli is not None:
+                    br = brotli.compress(data, quality=11)
+                    if len(br) < len(data):
+                        with open(full + ".br", "wb") as f:
+                            f.write(br)
+                        encodings.append("br")
+            if media_type.startswith("text/"):
+                media_type += "; charset=utf-8"
+            manifest[rel] = {
+                "etag": '"' + hashlib.sha256(data).hexdigest()[:32] + '"',
+                "media_type": media_type,
+                "size": len(data),
+                "encodings": encodings,
+                "hashed": bool(HASHED_ASSET_RE.search(name)),
+            }
+    return manifest
+
+
+class SiteReleases:
+    """Versiones inmutables en releases/<versión> con un puntero CURRENT.
+
+    Cambiar de versión (desplegar o hacer rollback) solo reescribe el archivo
+    CURRENT de forma atómica; las versiones anteriores quedan intactas.
+    """
+
+    def __init__(self, base_dir: str, max_bundle_bytes: int = 200 * 1024 * 1024):
+        self.base_dir = base_dir
+        self.releases_dir = os.path.join(base_dir, "releases")
+        self.pointer_file = os.path.join(base_dir, "CURRENT")
+        self.max_bundle_bytes = max_bundle_bytes
+        self._lock = threading.Lock()
+        self.current: Optional[str] = None
+        self.manifest: dict = {}
+
+    def versions(self) -> list:
+        if not os.path.isdir(self.releases_dir):
+            return []
+        return sorted(
+            v for v in os.listdir(self.releases_dir)
+            if not v.startswith(".") and os.path.isdir(os.path.join(self.releases_dir, v))
+        )
+
+    def load(self) -> None:
+        with self._lock:
+            version = None
+            if os.path.exists(self.pointer_file):
+                with open(self.pointer_file, "r", encoding="utf-8") as f:
+                    version = f.read().strip() or None
+            self._activate(version)
+
+    def _activate(self, version: Optional[str]) -> None:
+        manifest = {}
+        if version is not None:
+            with open(os.path.join(self.releases_dir, version, MANIFEST_NAME), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        self.current, self.manifest = version, manifest
+
+    def _switch(self, version: str) -> None:
+        atomic_write(self.pointer_file, version.encode("utf-8"))
+        self._activate(version)
+
+    def deploy(self, fileobj, filename: str) -> str:
+        os.makedirs(self.releases_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.releases_dir, prefix=".tmp-")
+        try:
+            _extract_bundle(fileobj, filename, staging, self.max_bundle_bytes)
+            # Bundles empaquetados como dist/... se sirven desde dentro de dist/
+            root = staging
+            entries = os.listdir(root)
+            if len(entries) == 1 and os.path.isdir(os.path.join(root, entries[0])):
+                root = os.path.join(root, entries[0])
+            manifest = _build_manifest(root)
+            if not manifest:
+                raise BundleError("El bundle está vacío")
+            digest = hashlib.sha256(
+                json.dumps({k: v["etag"] for k, v in sorted(manifest.items())}).encode()
+            ).hexdigest()[:10]
+            version = time.strftime("%Y%m%d%H%M%S") + "-" + digest
+            with open(os.path.join(root, MANIFEST_NAME), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            final = os.path.join(self.releases_dir, version)
+            if not os.path.exists(final):
+                os.rename(root, final)
+        finally:
+            if os.path.exists(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+
+        with self._lock:
+            self._switch(version)
+        return version
+
+    def rollback(self, version: Optional[str] = None) -> str:
+        with self._lock:
+            versions = self.versions()
+            if version is None:
+                if self.current not in versions or versions.index(self.current) == 0:
+                    raise BundleError("No hay una versión anterior a la actual")
+                version = versions[versions.index(self.current) - 1]
+            elif version not in versions:
+                raise BundleError(f"Versión desconocida: {version}")
+            self._switch(version)
+            return version
+
+    def lookup(self, path: str) -> Optional[tuple]:
+        """Devuelve (ruta en disco, entrada del manifiesto) para un path del sitio."""
+        if self.current is None:
+            return None
+        path = path.strip("/") or "index.html"
+        entry = self.manifest.get(path)
+        if entry is None and "." not in path.rsplit("/", 1)[-1]:
+            path = path + "/index.html"
+            entry = self.manifest.get(path)
+        if entry is None:
+            return None
+        return os.path.join(self.releases_dir, self.current, path), entry
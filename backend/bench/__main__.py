@@ -0,0 +1,257 @@
+"""Benchmark de carga reproducible para los endpoints de cada protocolo.
+
+Levanta el backend en localhost (uvicorn, base SQLite temporal) junto con
+servidores SMTP/IMAP locales, ejecuta cada escenario con la concurrencia
+indicada y escribe un reporte JSON con throughput y latencias p50/p95/p99.
+
+Uso (desde backend/):
+    python -m bench                                  # todos los escenarios
+    python -m bench -s predict,ws_chat -c 32 -n 2000
+    python -m bench --url http://127.0.0.1:8000 -s predict -d 30
+    python -m bench --output bench/results/antes.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from bench.scenarios import SCENARIOS
+from bench.standins import IMAPStandIn, SMTPStandIn, build_message
+
+BACKEND_DIR: str = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MAIL_SCENARIOS = {"mail_send", "mail_inbox", "mail_receive"}
+
+
+class Context:
+    def __init__(self, args, base_url: str, client: httpx.AsyncClient):
+        self.args = args
+        self.base_url = base_url
+        self.ws_url = "ws" + base_url[len("http"):]
+        self.client = client
+        self.backend_dir = BACKEND_DIR
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def summarize(latencies: list[float], errors: int, seconds: float, nbytes: int) -> dict:
+    ms = np.array(latencies) * 1000
+    report = {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "mb_per_second": round(nbytes / seconds / 1e6, 3) if seconds else 0.0,
+    }
+    if len(ms):
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        report.update({
+            "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3),
+            "mean_ms": round(float(ms.mean()), 3),
+            "max_ms": round(float(ms.max()), 3),
+        })
+    return report
+
+
+async def run_scenario(scenario, args) -> dict:
+    await scenario.setup()
+    latencies: list[float] = []
+    errors = 0
+    remaining = args.requests
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    last_error = None
+
+    async def worker(index: int):
+        nonlocal remaining, errors, last_error
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            elif remaining <= 0:
+                return
+            else:
+                remaining -= 1
+            start = time.perf_counter()
+            try:
+                await scenario.op(index)
+            except Exception as e:
+                errors += 1
+                last_error = str(e) or type(e).__name__
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    # Calentamiento: una operación fuera de la medición
+    try:
+        await scenario.op(0)
+    except Exception as e:
+        last_error = str(e) or type(e).__name__
+    scenario.bytes = 0
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    seconds = time.perf_counter() - start
+    await scenario.teardown()
+
+    report = summarize(latencies, errors, seconds, scenario.bytes)
+    if errors and last_error:
+        report["last_error"] = last_error
+    return report
+
+
+async def wait_ready(base_url: str, process: subprocess.Popen | None, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"El servidor terminó con código {process.returncode}")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en {timeout:.0f}s")
+
+
+def start_server(port: int, smtp_port: int, imap_port: int, workdir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}")
+    env.setdefault("SECRET_KEY", "bench-secret")
+    env.setdefault("EMAIL_PASSWORD", "bench")
+    env.update({
+        "MAIL_IMAP_HOST": "127.0.0.1", "MAIL_IMAP_PORT": str(imap_port), "MAIL_IMAP_SSL": "false",
+        "MAIL_SMTP_HOST": "127.0.0.1", "MAIL_SMTP_PORT": str(smtp_port), "MAIL_SMTP_SSL": "false",
+        "MAIL_RELAY_HOST": "127.0.0.1", "MAIL_RELAY_PORT": str(smtp_port),
+        # Todo el tráfico sale de 127.0.0.1: los límites por IP falsearían el throughput
+        "ADMISSION_ENABLED": "false",
+    })
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+async def main(args) -> dict:
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Escenarios desconocidos: {', '.join(unknown)} (disponibles: {', '.join(SCENARIOS)})")
+
+    smtp = SMTPStandIn()
+    imap = IMAPStandIn([build_message(i, args.mail_attachment_kb * 1024) for i in range(args.mail_messages)])
+    smtp_port = await smtp.start()
+    imap_port = await imap.start()
+
+    # El registro DNS escribe en dns_log.txt del backend: se restaura al final
+    dns_log = os.path.join(BACKEND_DIR, "dns_log.txt")
+    dns_backup = open(dns_log, "rb").read() if os.path.exists(dns_log) else None
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    process = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+        names = [n for n in names if n not in MAIL_SCENARIOS] if not args.mail_with_url else names
+    else:
+        base_url = f"http://127.0.0.1:{free_port()}"
+        process = start_server(int(base_url.rsplit(":", 1)[1]), smtp_port, imap_port, workdir)
+
+    results: dict = {}
+    try:
+        await wait_ready(base_url, process)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+            ctx = Context(args, base_url, client)
+            for name in names:
+                print(f"[bench] {name} ...", file=sys.stderr, flush=True)
+                try:
+                    results[name] = await run_scenario(SCENARIOS[name](ctx), args)
+                except Exception as e:
+                    results[name] = {"error": str(e) or type(e).__name__}
+                print(f"[bench] {name}: {json.dumps(results[name])}", file=sys.stderr, flush=True)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        await smtp.stop()
+        await imap.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+        if dns_backup is None:
+            if os.path.exists(dns_log) and process is not None:
+                os.remove(dns_log)
+        else:
+            with open(dns_log, "wb") as f:
+                f.write(dns_backup)
+
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "base_url": base_url,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": None if args.duration else args.requests,
+            "duration": args.duration,
+            "ws_clients": args.ws_clients,
+            "media_mb": args.media_mb,
+            "range_kb": args.range_kb,
+            "file_kb": args.file_kb,
+            "frame_kb": args.frame_kb,
+            "mail_messages": args.mail_messages,
+            "mail_attachment_kb": args.mail_attachment_kb,
+        },
+        "scenarios": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__.split("\n\n")[0])
+    parser.add_argument("-s", "--scenarios", default="all", help=f"Lista separada por comas: {', '.join(SCENARIOS)}")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-n", "--requests", type=int, default=500, help="Operaciones por escenario")
+    parser.add_argument("-d", "--duration", type=float, default=None, help="Segundos por escenario (en lugar de -n)")
+    parser.add_argument("--url", default=None, help="Usar un servidor ya levantado en lugar de iniciar uno")
+    parser.add_argument("--mail-with-url", action="store_true",
+                        help="Con --url, ejecutar también los escenarios de correo (el servidor debe apuntar a los stand-ins)")
+    parser.add_argument("--ws-clients", type=int, default=20, help="Receptores conectados en ws_chat / ws_stream")
+    parser.add_argument("--media-mb", type=int, default=32, help="Tamaño del archivo de streaming_range")
+    parser.add_argument("--range-kb", type=int, default=256, help="Tamaño de cada petición Range")
+    parser.add_argument("--file-kb", type=int, default=512, help="Tamaño de los archivos FTP")
+    parser.add_argument("--frame-kb", type=int, default=64, help="Tamaño de cada frame de ws_stream")
+    parser.add_argument("--mail-messages", type=int, default=10, help="Mensajes en el buzón IMAP simulado")
+    parser.add_argument("--mail-attachment-kb", type=int, default=0, help="Adjunto por mensaje IMAP")
+    parser.add_argument("-o", "--output", default=None, help="Archivo JSON de salida (por defecto stdout)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Reporte escrito en {args.output}", file=sys.stderr)
+    else:
+        print(text)
@@ -0,0 +1,275 @@
+"""Escenarios de carga: cada uno prepara su estado en setup() y ejecuta una operación en op()."""
+import abc
+import asyncio
+import itertools
+import os
+import random
+import struct
+
+import httpx
+import websockets
+
+TEAMS = [
+    "Club America", "Tigres UANL", "Monterrey", "Cruz Azul", "Guadalajara Chivas",
+    "Toluca", "Pachuca", "Santos Laguna", "Leon", "Atlas", "U.N.A.M. - Pumas",
+]
+
+
+class Scenario(abc.ABC):
+    name = ""
+    # Códigos HTTP que cuentan como respuesta correcta
+    ok_status = (200,)
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.client: httpx.AsyncClient = ctx.client
+        self.bytes = 0
+
+    async def setup(self):
+        pass
+
+    @abc.abstractmethod
+    async def op(self, worker: int):
+        """Una operación medida; lanza una excepción si falla."""
+
+    async def teardown(self):
+        pass
+
+    def check(self, response: httpx.Response):
+        if response.status_code not in self.ok_status:
+            raise RuntimeError(f"{self.name}: HTTP {response.status_code}")
+        self.bytes += len(response.content)
+
+
+class Predict(Scenario):
+    name = "predict"
+
+    async def op(self, worker):
+        home, away = random.sample(TEAMS, 2)
+        self.check(await self.client.post("/predict", json={
+            "home_team": home,
+            "away_team": away,
+            "home_goals_half_time": random.randint(0, 2),
+            "away_goals_half_time": random.randint(0, 2),
+        }))
+
+
+class StreamingRange(Scenario):
+    name = "streaming_range"
+    ok_status = (206,)
+    filename = "bench_media.mp4"
+
+    async def setup(self):
+        self.size = self.ctx.args.media_mb * 1024 * 1024
+        self.range_bytes = self.ctx.args.range_kb * 1024
+        files = {"file": (self.filename, os.urandom(self.size), "video/mp4")}
+        self.check_setup(await self.client.post("/streaming/upload", files=files))
+
+    def check_setup(self, response):
+        if response.status_code != 200:
+            raise RuntimeError(f"setup {self.name}: HTTP {response.status_code} {response.text}")
+
+    async def op(self, worker):
+        start = random.randrange(0, self.size - self.range_bytes)
+        headers = {"Range": f"bytes={start}-{start + self.range_bytes - 1}"}
+        self.check(await self.client.get(f"/streaming/play/{self.filename}", headers=headers))
+
+    async def teardown(self):
+        path = os.path.join(self.ctx.backend_dir, "streaming", self.filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class FTPUpload(Scenario):
+    name = "ftp_upload"
+
+    async def setup(self):
+        self.payload = os.urandom(self.ctx.args.file_kb * 1024)
+
+    async def op(self, worker):
+        files = {"file": (f"bench_upload_{worker}.bin", self.payload, "application/octet-stream")}
+        self.check(await self.client.post("/ftp/upload", files=files))
+
+    async def teardown(self):
+        for worker in range(self.ctx.args.concurrency):
+            path = os.path.join(self.ctx.backend_dir, "uploads", f"bench_upload_{worker}.bin")
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class FTPDownload(Scenario):
+    name = "ftp_download"
+    filename = "bench_download.bin"
+
+    async def setup(self):
+        files = {"file": (self.filename, os.urandom(self.ctx.args.file_kb * 1024), "application/octet-stream")}
+        await self.client.post("/ftp/upload", files=files)
+
+    async def op(self, worker):
+        self.check(await self.client.get(f"/ftp/download/{self.filename}"))
+
+    async def teardown(self):
+        path = os.path.join(self.ctx.backend_dir, "uploads", self.filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class DNSRegister(Scenario):
+    name = "dns_register"
+    # La IP del benchmark ya queda registrada tras la primera petición
+    ok_status = (200, 409)
+
+    async def op(self, worker):
+        self.check(await self.client.post("/dns/register"))
+
+
+class MailSend(Scenario):
+    name = "mail_send"
+
+    async def op(self, worker):
+        self.check(await self.client.post("/mail/send", json={
+            "to": "user@example.com", "subject": "bench", "body": "benchmark body",
+        }))
+
+
+class MailInbox(Scenario):
+    name = "mail_inbox"
+    user = "bench@example.com"
+
+    async def setup(self):
+        await self.client.post("/register", json={"email": self.user, "password": "bench-password"})
+
+    async def op(self, worker):
+        self.check(await self.client.get("/mail", params={"user_email": self.user}))
+
+
+class MailReceive(Scenario):
+    name = "mail_receive"
+    user = "bench@example.com"
+
+    async def setup(self):
+        await self.client.post("/register", json={"email": self.user, "password": "bench-password"})
+        self.written = []
+
+    async def op(self, worker):
+        response = await self.client.post("/mail", json={
+            "from": self.user, "to": "user@example.com", "subject": "bench", "body": "benchmark body",
+        })
+        self.check(response)
+        self.written.append(response.json().get("filename"))
+
+    async def teardown(self):
+        for filename in self.written:
+            path = os.path.join(self.ctx.backend_dir, "mailbox", filename or "")
+            if filename and os.path.exists(path):
+                os.remove(path)
+
+
+class _FanOut(Scenario):
+    """Base para escenarios WebSocket: mide el tiempo hasta que todos los receptores reciben un mensaje."""
+
+    def __init__(self, ctx):
+        super().__init__(ctx)
+        self.receivers = []
+        self.senders = {}
+        self.tasks = []
+        self.pending: dict[int, list] = {}
+        self.ids = itertools.count()
+
+    @abc.abstractmethod
+    def url(self) -> str:
+        """URL del WebSocket."""
+
+    @abc.abstractmethod
+    def encode(self, key: int):
+        """Mensaje a enviar con el identificador key."""
+
+    @abc.abstractmethod
+    def message_id(self, message):
+        """Identificador de un mensaje recibido, o None si no es de este escenario."""
+
+    async def _receive(self, ws, counted: bool):
+        async for message in ws:
+            if not counted:
+                continue
+            key = self.message_id(message)
+            entry = self.pending.get(key)
+            if entry is None:
+                continue
+            entry[0] += 1
+            if entry[0] >= len(self.receivers):
+                entry[1].set()
+
+    async def connect(self):
+        return await websockets.connect(self.url(), max_size=None)
+
+    async def setup(self):
+        for _ in range(self.ctx.args.ws_clients):
+            ws = await self.connect()
+            self.receivers.append(ws)
+            self.tasks.append(asyncio.create_task(self._receive(ws, counted=True)))
+        for worker in range(self.ctx.args.concurrency):
+            ws = await self.connect()
+            self.senders[worker] = ws
+            # Los emisores también reciben los mensajes de otros emisores: se drenan
+            self.tasks.append(asyncio.create_task(self._receive(ws, counted=False)))
+
+    async def op(self, worker):
+        key = next(self.ids)
+        done = asyncio.Event()
+        self.pending[key] = [0, done]
+        message = self.encode(key)
+        await self.senders[worker].send(message)
+        self.bytes += len(message) * len(self.receivers)
+        try:
+            await asyncio.wait_for(done.wait(), timeout=10)
+        finally:
+            del self.pending[key]
+
+    async def teardown(self):
+        for task in self.tasks:
+            task.cancel()
+        for ws in self.receivers + list(self.senders.values()):
+            await ws.close()
+
+
+class WSChat(_FanOut):
+    name = "ws_chat"
+
+    def url(self):
+        return f"{self.ctx.ws_url}/ws"
+
+    def encode(self, key):
+        return f"{key}:bench chat message"
+
+    def message_id(self, message):
+        try:
+            return int(str(message).split(":", 1)[0])
+        except ValueError:
+            return None
+
+
+class WSStream(_FanOut):
+    name = "ws_stream"
+
+    def url(self):
+        return f"{self.ctx.ws_url}/ws/stream/bench"
+
+    async def connect(self):
+        ws = await super().connect()
+        await ws.recv()  # connection_established
+        return ws
+
+    def encode(self, key):
+        return struct.pack("!Q", key) + b"\0" * (self.ctx.args.frame_kb * 1024)
+
+    def message_id(self, message):
+        if isinstance(message, bytes) and len(message) >= 8:
+            return struct.unpack("!Q", message[:8])[0]
+        return None
+
+
+SCENARIOS = {cls.name: cls for cls in (
+    Predict, StreamingRange, FTPUpload, FTPDownload, DNSRegister,
+    MailSend, MailInbox, MailReceive, WSChat, WSStream,
+)}
@@ -0,0 +1,114 @@
+"""Servidores SMTP e IMAP mínimos en localhost para los benchmarks de correo.
+
+No implementan los protocolos completos: solo lo que usan smtplib/imaplib
+desde app/routes.py (EHLO/AUTH/MAIL/RCPT/DATA y LOGIN/SELECT/SEARCH/FETCH).
+"""
+import asyncio
+import re
+from email.message import EmailMessage
+
+
+def build_message(index: int, attachment_bytes: int = 0) -> bytes:
+    msg = EmailMessage()
+    msg["Subject"] = f"Benchmark message {index}"
+    msg["From"] = "bench@example.com"
+    msg["To"] = "user@example.com"
+    msg["Date"] = "Fri, 23 May 2025 23:19:21 +0000"
+    msg.set_content(f"Cuerpo del mensaje {index}.\n" * 20)
+    if attachment_bytes:
+        msg.add_attachment(
+            b"\0" * attachment_bytes, maintype="application", subtype="octet-stream", filename=f"adjunto{index}.bin"
+        )
+    return msg.as_bytes()
+
+
+class SMTPStandIn:
+    def __init__(self):
+        self.messages = 0
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(b"220 localhost ESMTP bench\r\n")
+        try:
+            while line := await reader.readline():
+                command = line.decode(errors="replace").strip().upper()
+                if command.startswith(("EHLO", "HELO")):
+                    writer.write(b"250-localhost\r\n250-AUTH PLAIN\r\n250 OK\r\n")
+                elif command.startswith("AUTH"):
+                    writer.write(b"235 2.7.0 Authentication successful\r\n")
+                elif command.startswith("DATA"):
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while (data := await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    self.messages += 1
+                    writer.write(b"250 OK queued\r\n")
+                elif command.startswith("QUIT"):
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class IMAPStandIn:
+    FETCH_RE = re.compile(r"FETCH\s+(\S+)\s+\(?(.+?)\)?$", re.IGNORECASE)
+
+    def __init__(self, messages: list[bytes]):
+        self.messages = messages
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(b"* OK [CAPABILITY IMAP4rev1] bench ready\r\n")
+        try:
+            while line := await reader.readline():
+                tag, _, rest = line.decode(errors="replace").strip().partition(" ")
+                command = rest.split(" ", 1)[0].upper()
+                if command == "CAPABILITY":
+                    writer.write(b"* CAPABILITY IMAP4rev1\r\n")
+                elif command == "SELECT":
+                    writer.write(f"* {len(self.messages)} EXISTS\r\n* FLAGS ()\r\n".encode())
+                elif command == "SEARCH":
+                    ids = " ".join(str(i + 1) for i in range(len(self.messages)))
+                    writer.write(f"* SEARCH {ids}\r\n".encode())
+                elif command == "FETCH":
+                    self._fetch(rest, writer)
+                elif command == "LOGOUT":
+                    writer.write(f"* BYE\r\n{tag} OK LOGOUT completed\r\n".encode())
+                    await writer.drain()
+                    break
+                writer.write(f"{tag} OK {command} completed\r\n".encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def _fetch(self, rest: str, writer: asyncio.StreamWriter) -> None:
+        match = self.FETCH_RE.search(rest)
+        if not match:
+            return
+        msg_id, item = match.group(1), match.group(2).strip()
+        payload = self.messages[int(msg_id) - 1]
+        # El nombre del item de respuesta no lleva .PEEK
+        name = item.upper().replace(".PEEK", "")
+        writer.write(f"* {msg_id} FETCH ({name} {{{len(payload)}}}\r\n".encode())
+        writer.write(payload)
+        writer.write(b")\r\n")
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# app.config exige estas variables; los tests no tocan la base ni el correo
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("EMAIL_PASSWORD", "test")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
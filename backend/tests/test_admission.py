@@ -0,0 +1,108 @@
+import types
+
+import pytest
+
+from app import admission as admission_module
+from app.admission import AdmissionController
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission_module, "time", types.SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def make(spec: str, **kwargs) -> AdmissionController:
+    return AdmissionController({"api": spec}, **kwargs)
+
+
+def test_burst_then_429_with_retry_after(clock):
+    controller = make("0.25/2/0/0")
+    for _ in range(2):
+        assert controller.admit("1.1.1.1", "api") is None
+        controller.release("1.1.1.1", "api")
+
+    rejection = controller.admit("1.1.1.1", "api")
+    assert (rejection.status, rejection.reason) == (429, "rate")
+    assert rejection.retry_after == pytest.approx(4.0)
+    assert rejection.retry_after_header == "4"
+
+    # Un segundo después hay 0.25 tokens: faltan 0.75 a 0.25/s
+    clock.now += 1
+    assert controller.admit("1.1.1.1", "api").retry_after_header == "3"
+    clock.now += 3
+    assert controller.admit("1.1.1.1", "api") is None
+    # Otra IP tiene su propio bucket
+    assert controller.admit("2.2.2.2", "api") is None
+
+
+def test_concurrency_caps_and_release(clock):
+    controller = make("0/0/2/3")
+    assert controller.admit("a", "api") is None
+    assert controller.admit("a", "api") is None
+    rejection = controller.admit("a", "api")
+    assert (rejection.status, rejection.reason) == (429, "client_concurrency")
+
+    assert controller.admit("b", "api") is None
+    rejection = controller.admit("c", "api")
+    assert (rejection.status, rejection.reason) == (503, "global_concurrency")
+    # Los rechazos no ocupan lugar
+    assert controller.in_flight_by_class() == {("api",): 3}
+
+    controller.release("b", "api")
+    assert controller.admit("c", "api") is None
+    controller.release("a", "api")
+    assert controller.admit("a", "api") is None
+    assert controller.in_flight_by_class() == {("api",): 3}
+
+
+@pytest.mark.parametrize("kwargs, client", [
+    ({"exempt": ("10.0.0.1",)}, "10.0.0.1"),
+    ({"enabled": False}, "3.3.3.3"),
+])
+def test_exempt_and_disabled_skip_limits_but_balance_in_flight(clock, kwargs, client):
+    controller = make("1/1/1/1", **kwargs)
+    for _ in range(3):
+        assert controller.admit(client, "api") is None
+    assert controller.in_flight_by_class() == {("api",): 3}
+    for _ in range(3):
+        controller.release(client, "api")
+    assert controller.in_flight_by_class() == {("api",): 0}
+    assert client not in controller.clients
+
+
+def test_sweep_drops_only_idle_clients(clock):
+    controller = make("10/10/0/0", client_ttl=10.0, sweep_interval=5.0)
+    controller.admit("idle", "api")
+    controller.release("idle", "api")
+    controller.admit("busy", "api")  # sigue en curso
+    clock.now += 8
+    controller.admit("recent", "api")
+    controller.release("recent", "api")
+
+    clock.now += 3
+    assert controller.sweep() == 1
+    assert set(controller.clients) == {"busy", "recent"}
+    assert controller.status()["expired_clients"] == 1
+
+
+
+def test_admit_sweeps_at_most_once_per_interval(clock):
+    controller = make("10/10/0/0", client_ttl=10.0, sweep_interval=30.0)
+    controller.admit("idle", "api")
+    controller.release("idle", "api")
+    clock.now += 20
+    controller.admit("other", "api")
+    assert "idle" in controller.clients
+    clock.now += 10
+    controller.admit("other", "api")
+    assert set(controller.clients) == {"other"}
@@ -0,0 +1,97 @@
+import asyncio
+import io
+import os
+import zipfile
+
+import pytest
+
+from app.downloads import RangeNotSatisfiable, ZipStream, if_range_matches, parse_range
+
+ETAG = '"18c2f-400"'
+LAST_MODIFIED = "Tue, 14 Oct 2025 10:00:00 GMT"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-199", (100, 199)),
+    ("bytes=900-2000", (900, 999)),   # el fin se recorta al tamaño
+    ("bytes=500-", (500, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),        # sufijo mayor que el archivo: todo
+    ("BYTES = 0-0", (0, 0)),
+    # Se ignoran (respuesta completa): varios rangos, otra unidad, sintaxis inválida
+    ("bytes=0-9,20-29", None),
+    ("items=0-9", None),
+    ("bytes=abc-", None),
+    ("bytes=10", None),
+    ("bytes=50-10", None),
+    ("", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+@pytest.mark.parametrize("if_range, matches", [
+    (None, True),
+    ("", True),
+    (ETAG, True),
+    ('"otro-etag"', False),
+    ("W/" + ETAG, False),           # If-Range exige comparación fuerte
+    (LAST_MODIFIED, True),
+    ("Wed, 15 Oct 2025 10:00:00 GMT", False),
+])
+def test_if_range_matches(if_range, matches):
+    assert if_range_matches(if_range, ETAG, LAST_MODIFIED) is matches
+
+
+def _zip_bytes(stream: ZipStream) -> bytes:
+    async def collect():
+        return b"".join([chunk async for chunk in stream])
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def files(tmp_path):
+    contents = {
+        "photo.jpg": os.urandom(300_000),                       # stored
+        "notes.txt": b"linea de texto repetida\n" * 20_000,      # deflate
+        "empty.txt": b"",                                        # deflate vacío
+        "empty.mp3": b"",                                        # stored vacío
+    }
+    for name, data in contents.items():
+        (tmp_path / name).write_bytes(data)
+    return tmp_path, contents
+
+
+def test_zip_stream_round_trip(files):
+    root, contents = files
+    stream = ZipStream([(str(root / name), f"carpeta/{name}") for name in contents], chunk_size=64 * 1024)
+    data = _zip_bytes(stream)
+    assert stream.content_length() is None  # hay entradas deflate
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        infos = {info.filename: info for info in archive.infolist()}
+        assert infos["carpeta/photo.jpg"].compress_type == zipfile.ZIP_STORED
+        assert infos["carpeta/notes.txt"].compress_type == zipfile.ZIP_DEFLATED
+        assert infos["carpeta/notes.txt"].compress_size < len(contents["notes.txt"])
+        for name, expected in contents.items():
+            assert archive.read(f"carpeta/{name}") == expected
+
+
+def test_zip_stream_content_length_matches_stored_stream(files):
+    root, contents = files
+    names = ["photo.jpg", "empty.mp3"]
+    stream = ZipStream([(str(root / name), name) for name in names], chunk_size=64 * 1024)
+    expected_length = stream.content_length()
+    data = _zip_bytes(stream)
+    assert expected_length == len(data)
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == names
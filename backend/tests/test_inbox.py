@@ -0,0 +1,58 @@
+from app import inbox
+
+HEADER = b"From: Ana <ana@example.com>\r\nSubject: Informe\r\nDate: Tue, 14 Oct 2025 10:00:00 +0000\r\n\r\n"
+
+# Respuesta real de FETCH (UID BODYSTRUCTURE BODY.PEEK[HEADER]) tal como la entrega imaplib:
+# multipart/mixed con alternativa texto/html, un text/plain adjunto sin nombre,
+# un PDF adjunto y un mensaje reenviado (message/rfc822) adjunto.
+BODYSTRUCTURE = (
+    b'((("text" "plain" ("charset" "utf-8") NIL NIL "quoted-printable" 120 4 NIL ("inline" NIL) NIL NIL)'
+    b'("text" "html" ("charset" "utf-8") NIL NIL "quoted-printable" 340 9 NIL NIL NIL NIL)'
+    b' "alternative" ("boundary" "alt") NIL NIL NIL)'
+    b'("text" "plain" ("charset" "us-ascii") NIL NIL "7bit" 52 2 NIL ("attachment" NIL) NIL NIL)'
+    b'("application" "pdf" ("name" "informe.pdf") NIL NIL "base64" 7800 NIL ("attachment" ("filename" "informe.pdf")) NIL NIL)'
+    b'("message" "rfc822" NIL NIL NIL "7bit" 900'
+    b' ("Mon, 13 Oct 2025 09:00:00 +0000" "Original" NIL NIL NIL NIL NIL NIL NIL "<a@example.com>")'
+    b' ("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 40 1 NIL NIL NIL NIL) 20 NIL'
+    b' ("attachment" ("filename" "reenviado.eml")) NIL NIL)'
+    b' "mixed" ("boundary" "mix") NIL NIL NIL)'
+)
+FETCH = [
+    (b"1 (UID 42 BODYSTRUCTURE " + BODYSTRUCTURE + b" BODY[HEADER] {%d}" % len(HEADER), HEADER),
+    b")",
+]
+
+
+def _parts():
+    (message,) = inbox.parse_fetch(FETCH)
+    return message, inbox.flatten_structure(message["BODYSTRUCTURE"])
+
+
+def test_parse_fetch_keys():
+    message, _ = _parts()
+    assert message["UID"] == b"42"
+    assert message["BODY[HEADER]"] == HEADER
+
+
+def test_flatten_structure_dispositions():
+    _, parts = _parts()
+    assert [(p["part"], p["type"], p["disposition"], p["filename"]) for p in parts] == [
+        ("1.1", "text/plain", "inline", None),
+        ("1.2", "text/html", None, None),
+        ("2", "text/plain", "attachment", None),
+        ("3", "application/pdf", "attachment", "informe.pdf"),
+        ("4", "message/rfc822", "attachment", "reenviado.eml"),
+    ]
+
+
+def test_text_part_skips_attached_text():
+    _, parts = _parts()
+    assert inbox.text_part(parts)["part"] == "1.1"
+    assert [p["part"] for p in parts if inbox.is_attachment(p)] == ["2", "3", "4"]
+
+
+def test_attachment_info_decoded_size():
+    _, parts = _parts()
+    pdf = inbox.attachment_info(parts[3])
+    assert pdf == {"part": "3", "filename": "informe.pdf", "content_type": "application/pdf", "size": 5700}
+    assert inbox.attachment_info(parts[2])["filename"] == "part-2"
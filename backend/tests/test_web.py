@@ -0,0 +1,49 @@
+import pytest
+
+from app.web import HASHED_ASSET_RE, etag_matches
+
+
+@pytest.mark.parametrize("name, hashed", [
+    # Con hash de contenido
+    ("app.3f9a1c2b.js", True),
+    ("main.3f9a1c2b4d5e6f7a8b9c.js", True),
+    ("logo.5D5D9EEF.svg", True),
+    ("index-DiwrgTda.css", True),
+    ("vendor-abcdefgh.js", True),
+    ("index-Di_wr-Ta.js", True),
+    ("chunk-ABCD1234.js", True),
+    ("assets.v2-a1b2c3d4.woff2", True),
+    # Sin hash
+    ("my-photo2023.png", False),
+    ("index.html", False),
+    ("favicon.ico", False),
+    ("main.js", False),
+    ("app.bundle.js", False),
+    ("react-dom.production.min.js", False),
+    ("jquery-3.7.1.min.js", False),
+    ("informe-20231015.pdf", False),
+    ("photo-abc.png", False),
+    ("3f9a1c2b.js", False),
+    ("app.3f9a1c2b", False),
+])
+def test_hashed_asset_names(name, hashed):
+    assert bool(HASHED_ASSET_RE.search(name)) is hashed
+
+
+ETAG = '"3f9a1c2b"'
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    ('"otro"', False),
+    ('W/"3f9a1c2b"', True),
+    ('"a", "b", "3f9a1c2b"', True),
+    ('"a",W/"3f9a1c2b"', True),
+    ('"a", "b"', False),
+    ("*", True),
+    (" * ", True),
+])
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(if_none_match, ETAG) is matches
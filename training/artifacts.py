@@ -0,0 +1,151 @@
+"""Tamaño, latencia y model cards de los artefactos best_model_*.joblib.
+
+Uso:
+    python artifacts.py            # escribe la model card de cada best_model_*.joblib sin una
+"""
+import io
+import os
+import glob
+import json
+import time
+import datetime
+from typing import Any
+
+import joblib  # type: ignore[import-untyped]
+import numpy as np
+import pandas as pd
+import sklearn
+
+BASE_DIR: str = os.path.abspath(os.path.dirname(__file__))
+MODEL_DIR: str = os.path.join(BASE_DIR, "models")
+
+
+def serialized_size(model: Any, compress: int = 0) -> int:
+    """Bytes que ocupa el modelo serializado con joblib (sin escribir a disco)."""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer, compress=compress)
+    return buffer.getbuffer().nbytes
+
+
+def measure_latency(
+    model: Any,
+    X: pd.DataFrame,
+    n_single: int = 200,
+    batch_size: int = 256,
+    n_batches: int = 20,
+) -> dict[str, float]:
+    """Mide p50/p99 (ms) de model.predict para una fila y para lotes de batch_size filas."""
+    X = X.reset_index(drop=True)
+    rows = [X.iloc[[i % len(X)]] for i in range(n_single)]
+    model.predict(rows[0])  # calentamiento
+
+    single = np.empty(n_single)
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        model.predict(row)
+        single[i] = time.perf_counter() - start
+
+    batch_X = X.iloc[np.arange(batch_size) % len(X)]
+    batch = np.empty(n_batches)
+    for i in range(n_batches):
+        start = time.perf_counter()
+        model.predict(batch_X)
+        batch[i] = time.perf_counter() - start
+
+    return {
+        "single_p50_ms": float(np.percentile(single, 50) * 1000),
+        "single_p99_ms": float(np.percentile(single, 99) * 1000),
+        "batch_size": batch_size,
+        "batch_p50_ms": float(np.percentile(batch, 50) * 1000),
+        "batch_p99_ms": float(np.percentile(batch, 99) * 1000),
+        "batch_rows_per_second": float(batch_size / np.percentile(batch, 50)),
+    }
+
+
+def _iter_trees(model: Any):
+    """Recorre los arboles de un Pipeline / MultiOutputRegressor / ensemble."""
+    if hasattr(model, "steps"):
+        for _, step in model.steps:
+            yield from _iter_trees(step)
+    elif hasattr(model, "estimators_"):
+        estimators = model.estimators_
+        if isinstance(estimators, np.ndarray):
+            estimators = estimators.ravel()
+        for est in estimators:
+            yield from _iter_trees(est)
+    elif hasattr(model, "tree_"):
+        yield model.tree_
+
+
+def quantize_float32(model: Any) -> Any:
+    """Redondea los valores de las hojas a precision float32 (en el lugar).
+
+    sklearn exige float64 en Tree.value, asi que el arreglo conserva su tipo,
+    pero la mantisa truncada comprime mucho mejor con joblib compress. Los
+    umbrales de corte no se tocan para no alterar las decisiones del arbol.
+    """
+    for tree in _iter_trees(model):
+        state = tree.__getstate__()
+        state["values"] = state["values"].astype(np.float32).astype(np.float64)
+        tree.__setstate__(state)
+    return model
+
+
+def profile_model(model: Any, X_sample: pd.DataFrame, compress: int = 0) -> dict[str, Any]:
+    """Tamaño serializado (sin comprimir y con el nivel indicado) + latencias."""
+    profile: dict[str, Any] = {"size_bytes": serialized_size(model, 0)}
+    if compress:
+        profile["compressed_size_bytes"] = serialized_size(model, compress)
+    profile.update(measure_latency(model, X_sample))
+    return profile
+
+
+def model_card_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".card.json"
+
+
+def write_model_card(model_path: str, card: dict[str, Any]) -> str:
+    """Escribe la model card JSON junto al artefacto (best_model_X.joblib -> best_model_X.card.json)."""
+    card = {
+        "model_file": os.path.basename(model_path),
+        "file_size_bytes": os.path.getsize(model_path) if os.path.exists(model_path) else None,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "sklearn_version": sklearn.__version__,
+        **card,
+    }
+    path = model_card_path(model_path)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(card, f, indent=2, default=str)
+    return path
+
+
+def save_model(model: Any, model_path: str, compress: int = 0, float32: bool = False) -> int:
+    """Guarda el modelo con las opciones de exportacion y devuelve el tamaño en disco."""
+    if float32:
+        quantize_float32(model)
+    joblib.dump(model, model_path, compress=compress)
+    return os.path.getsize(model_path)
+
+
+if __name__ == "__main__":
+    from dataset import load_cache
+    from evaluation import FEATURES, backtest
+
+    matches = load_cache()
+    sample = matches[FEATURES].head(512)
+
+    for model_path in sorted(glob.glob(os.path.join(MODEL_DIR, "best_model_*.joblib"))):
+        if os.path.exists(model_card_path(model_path)):
+            continue
+        model = joblib.load(model_path)
+        try:
+            profile = profile_model(model, sample)
+        except Exception as e:  # modelos entrenados con otras columnas
+            print(f"[OMITIDO] {os.path.basename(model_path)}: {e}")
+            continue
+        report = backtest(model, matches)
+        card = write_model_card(model_path, {
+            "profile": profile,
+            "evaluation": {k: v for k, v in report.items() if k not in ("seconds", "matches_per_second")},
+        })
+        print(card)
@@ -59,4 +59,11 @@ if __name__ == "__main__":
     input_path, output_path = build_paths(year)
 
     clean_liga_mx(input_path, output_path)
-    print(output_path)
\ No newline at end of file
+    print(output_path)
+
+    # Ingesta incremental al cache columnar usado por el entrenamiento
+    sys.path.insert(0, os.path.abspath(os.path.join(BASE_DIR, "..")))
+    from dataset import CACHE_PATH, ingest
+
+    df = ingest(input_path)
+    print(f"{CACHE_PATH} ({len(df)} partidos)")
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""Cache columnar tipado de los CSV de Liga MX con ingesta incremental.
+
+Cada archivo anual ``2016-<year>_liga_mx.csv`` es un superconjunto del
+anterior, asi que solo se agregan las temporadas nuevas (y la ultima
+temporada ya cacheada, por si estaba incompleta), deduplicando por partido.
+El resultado se guarda en Parquet (o pickle si pyarrow no esta instalado),
+con los equipos como columnas categoricas, para que el entrenamiento y el
+EDA lean un archivo ya tipado en lugar de reparsear el CSV completo.
+"""
+import os
+import json
+import time
+from typing import Any
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+BASE_DIR: str = os.path.abspath(os.path.dirname(__file__))
+DB_DIR: str = os.path.join(BASE_DIR, "database")
+CLEAN_DIR: str = os.path.join(DB_DIR, "clean")
+CACHE_PATH: str = os.path.join(CLEAN_DIR, "liga_mx.parquet" if HAS_PARQUET else "liga_mx.pkl")
+MANIFEST_SUFFIX: str = ".sources.json"
+
+CATEGORICAL_COLS: list[str] = ["home_team", "away_team", "referee", "venue_name", "venue_city", "round"]
+BOOL_COLS: list[str] = ["home_win", "away_win"]
+SCORE_COLS: list[str] = [
+    "home_goals", "away_goals",
+    "home_goals_half_time", "away_goals_half_time",
+    "home_goals_fulltime", "away_goals_fulltime",
+]
+ESSENTIAL_COLS: list[str] = [
+    "home_team", "away_team",
+    "home_goals_fulltime", "away_goals_fulltime",
+    "home_goals_half_time", "away_goals_half_time",
+]
+
+
+def _fixture_ids(values: pd.Series) -> pd.Series:
+    """Ids enteros anulables: los vacios, no numericos o con decimales quedan como <NA>."""
+    ids = pd.to_numeric(values, errors="coerce")
+    return ids.where(ids % 1 == 0).astype("Int64")
+
+
+def match_key(df: pd.DataFrame) -> pd.Series:
+    """Clave de partido: el id del fixture si existe, si no (o en filas sin id) fecha + equipos."""
+    fallback = df["date"].astype(str) + "|" + df["home_team"].astype(str) + "|" + df["away_team"].astype(str)
+    if "id" not in df.columns:
+        return fallback
+    ids = _fixture_ids(df["id"])
+    return ids.astype(str).where(ids.notna(), fallback)
+
+
+def _coerce(df: pd.DataFrame) -> pd.DataFrame:
+    """Aplica los tipos del cache a un DataFrame leido del CSV."""
+    df = df.copy()
+    if "id" in df.columns:
+        df["id"] = _fixture_ids(df["id"])
+    for c in SCORE_COLS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    for c in BOOL_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("boolean")
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], utc=True, errors="coerce")
+    if "season" in df.columns:
+        df["season"] = pd.to_numeric(df["season"], errors="coerce").astype("Int16")
+    return df
+
+
+def _categorize(df: pd.DataFrame) -> pd.DataFrame:
+    for c in CATEGORICAL_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    return df
+
+
+def _read_cache(cache_path: str) -> pd.DataFrame | None:
+    if not os.path.exists(cache_path):
+        return None
+    if cache_path.endswith(".parquet"):
+        return pd.read_parquet(cache_path)
+    return pd.read_pickle(cache_path)
+
+
+def _write_cache(df: pd.DataFrame, cache_path: str) -> None:
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    if cache_path.endswith(".parquet"):
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, cache_path)
+
+
+def _read_manifest(cache_path: str) -> dict[str, Any]:
+    path = cache_path + MANIFEST_SUFFIX
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(cache_path: str, manifest: dict[str, Any]) -> None:
+    with open(cache_path + MANIFEST_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _source_signature(input_path: str) -> dict[str, float]:
+    stat = os.stat(input_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _merge_source(cached: pd.DataFrame | None, input_path: str) -> pd.DataFrame:
+    new = _coerce(pd.read_csv(input_path))
+    if cached is not None and "season" in new.columns and "season" in cached.columns and len(cached):
+        # Solo temporadas nuevas + la ultima cacheada (puede haber estado incompleta)
+        last_season = cached["season"].max()
+        new = new[new["season"] >= last_season]
+
+    frames = [f for f in (cached, new) if f is not None]
+    merged = pd.concat(
+        [f.astype({c: "object" for c in CATEGORICAL_COLS if c in f.columns}) for f in frames],
+        ignore_index=True,
+    )
+    merged = merged[~match_key(merged).duplicated(keep="last")]
+    if "date" in merged.columns:
+        merged = merged.sort_values("date", kind="stable")
+    return _categorize(merged.reset_index(drop=True))
+
+
+def ingest_many(input_paths: list[str], cache_path: str = CACHE_PATH) -> pd.DataFrame:
+    """Agrega al cache los partidos nuevos de varios CSV crudos y devuelve el cache completo.
+
+    Los archivos que no cambiaron desde la ultima ingesta (tamaño y mtime) no se
+    leen; si ninguno cambio, el costo es una sola lectura del cache.
+    """
+    manifest = _read_manifest(cache_path)
+    cached = _read_cache(cache_path)
+    changed = False
+
+    for input_path in input_paths:
+        source_key = os.path.relpath(os.path.abspath(input_path), BASE_DIR).replace(os.sep, "/")
+        signature = _source_signature(input_path)
+        if cached is not None and manifest.get(source_key, {}).get("signature") == signature:
+            continue
+        before = 0 if cached is None else len(cached)
+        cached = _merge_source(cached, input_path)
+        manifest[source_key] = {
+            "signature": signature,
+            "rows_added": int(len(cached) - before),
+            "ingested_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        changed = True
+
+    if changed:
+        _write_cache(cached, cache_path)
+        _write_manifest(cache_path, manifest)
+    return cached
+
+
+def ingest(input_path: str, cache_path: str = CACHE_PATH) -> pd.DataFrame:
+    """Agrega al cache los partidos nuevos de un CSV crudo y devuelve el cache completo."""
+    return ingest_many([input_path], cache_path)
+
+
+def build_cache(years: list[str] | None = None, cache_path: str = CACHE_PATH) -> pd.DataFrame:
+    """Ingesta en orden todos los CSV anuales disponibles (o los años indicados)."""
+    if years is None:
+        years = sorted(
+            name[len("2016-"):-len("_liga_mx.csv")]
+            for name in os.listdir(DB_DIR)
+            if name.startswith("2016-") and name.endswith("_liga_mx.csv")
+        )
+    return ingest_many([os.path.join(DB_DIR, f"2016-{year}_liga_mx.csv") for year in years], cache_path)
+
+
+def clean(df: pd.DataFrame) -> pd.DataFrame:
+    """Misma limpieza que clean_liga_mx, sobre datos ya tipados (sin reparsear)."""
+    return df.dropna(subset=[c for c in ESSENTIAL_COLS if c in df.columns]).reset_index(drop=True)
+
+
+def load_cache(cache_path: str = CACHE_PATH, cleaned: bool = True, refresh: bool = True) -> pd.DataFrame:
+    """Carga el cache columnar; si no existe (o refresh=True), ingesta los CSV pendientes.
+
+    Con refresh=True solo se leen los CSV que cambiaron desde la ultima ingesta.
+    """
+    if refresh or not os.path.exists(cache_path):
+        df = build_cache(cache_path=cache_path)
+    else:
+        df = _read_cache(cache_path)
+    return clean(df) if cleaned else df
@@ -0,0 +1,112 @@
+"""Funciones vectorizadas compartidas por el entrenamiento, el CLI y el backend.
+
+Todas operan sobre arrays completos (sin bucles de Python por fila), de modo
+que evaluar una temporada entera cuesta practicamente lo mismo que un partido.
+"""
+import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+FEATURES: list[str] = ["home_team", "away_team", "home_goals_half_time", "away_goals_half_time"]
+TARGETS: list[str] = ["home_goals_fulltime", "away_goals_fulltime"]
+
+
+def is_multioutput(raw: np.ndarray) -> bool:
+    """Determina si la salida del modelo corresponde a un regresor multi-salida.
+
+    El regresor multi-salida devuelve un array 2-D de forma (n_samples, 2)
+    con los goles predichos (home, away) como valores numericos continuos.
+    Los clasificadores devuelven un array 1-D de etiquetas ('H', 'A', 'D').
+    """
+    arr = np.asarray(raw)
+    return arr.ndim == 2 and arr.shape[1] == 2 and np.issubdtype(arr.dtype, np.number)
+
+
+def clip_goals(pred_goals: np.ndarray) -> np.ndarray:
+    """Redondea al entero mas cercano y recorta a 0 para evitar goles negativos."""
+    return np.clip(np.rint(np.asarray(pred_goals, dtype=float)), 0, None).astype(int)
+
+
+def round_goals(pred_goals: np.ndarray) -> np.ndarray:
+    """Redondeo 'escolar' (0.5 hacia arriba) vectorizado, como round_school del backend."""
+    x = np.asarray(pred_goals, dtype=float)
+    return np.where(x > 0, np.floor(x + 0.5), np.ceil(x - 0.5)).astype(int)
+
+
+def goals_to_result(pred_goals: np.ndarray) -> np.ndarray:
+    """Deriva 'H', 'A' o 'D' para cada fila de un array Nx2 de goles (home, away)."""
+    goals = clip_goals(pred_goals)
+    h, a = goals[:, 0], goals[:, 1]
+    return np.select([h > a, h < a], ["H", "A"], default="D")
+
+
+def load_match_frame(path: str, season: str | None = None) -> pd.DataFrame:
+    """Lee un CSV de partidos (crudo o limpio) con columnas numericas ya convertidas.
+
+    Si se indica 'season' filtra esa temporada; el archivo debe tener columna
+    'season' (los CSV limpios de database/clean/ no la tienen: ValueError).
+    """
+    df = pd.read_csv(path)
+    if season is not None:
+        if "season" not in df.columns:
+            raise ValueError(f"{path} no tiene columna 'season'; no se puede filtrar la temporada {season}")
+        df = df[df["season"].astype(str) == str(season)]
+    for c in FEATURES[2:] + TARGETS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df.dropna(subset=[c for c in FEATURES + TARGETS if c in df.columns]).reset_index(drop=True)
+
+
+def predict_matches(model: Any, matches: pd.DataFrame) -> pd.DataFrame:
+    """Predice todos los partidos de 'matches' en una sola llamada a model.predict.
+
+    Retorna un DataFrame alineado con 'matches' con las columnas result,
+    home_goals, away_goals (None para clasificadores) y model_type.
+    """
+    raw = model.predict(matches[FEATURES])
+    if is_multioutput(raw):
+        goals = clip_goals(raw)
+        return pd.DataFrame({
+            "result": goals_to_result(raw),
+            "home_goals": goals[:, 0],
+            "away_goals": goals[:, 1],
+            "model_type": "multioutput_regressor",
+        }, index=matches.index)
+    return pd.DataFrame({
+        "result": np.asarray(raw).astype(str),
+        "home_goals": None,
+        "away_goals": None,
+        "model_type": "classifier",
+    }, index=matches.index)
+
+
+def actual_results(matches: pd.DataFrame) -> np.ndarray:
+    h = matches[TARGETS[0]].to_numpy()
+    a = matches[TARGETS[1]].to_numpy()
+    return np.select([h > a, h < a], ["H", "A"], default="D")
+
+
+def backtest(model: Any, matches: pd.DataFrame) -> dict[str, Any]:
+    """Evalua un modelo sobre un conjunto de partidos y mide el rendimiento.
+
+    Retorna un diccionario con el numero de partidos, accuracy del resultado,
+    MAE de goles (solo regresor multi-salida), segundos y partidos por segundo.
+    """
+    start = time.perf_counter()
+    preds = predict_matches(model, matches)
+    elapsed = time.perf_counter() - start
+
+    report: dict[str, Any] = {
+        "matches": len(matches),
+        "model_type": preds["model_type"].iloc[0] if len(preds) else None,
+        "accuracy": float(np.mean(preds["result"].to_numpy() == actual_results(matches))) if len(preds) else None,
+        "seconds": elapsed,
+        "matches_per_second": len(matches) / elapsed if elapsed > 0 else float("inf"),
+    }
+    if report["model_type"] == "multioutput_regressor":
+        pred_goals = preds[["home_goals", "away_goals"]].to_numpy(dtype=float)
+        report["mae_home"] = float(np.mean(np.abs(pred_goals[:, 0] - matches[TARGETS[0]].to_numpy())))
+        report["mae_away"] = float(np.mean(np.abs(pred_goals[:, 1] - matches[TARGETS[1]].to_numpy())))
+    return report
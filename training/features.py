@@ -0,0 +1,236 @@
+"""Feature store de forma reciente por equipo (rolling) e historial head-to-head.
+
+Los agregados viven en arrays de NumPy indexados por equipo, con sumas
+corridas sobre una ventana circular, de modo que:
+    - agregar un partido nuevo es O(1) (update / update_from_frame),
+    - consultar las features de un partido es O(1) (features / features_frame).
+
+El entrenamiento (multitask_training.py --form-features) y el backend
+(app/predict.py) usan el mismo archivo serializado en MODEL_DIR.
+
+Uso:
+    python features.py            # construye o actualiza el store desde el cache
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR: str = os.path.abspath(os.path.dirname(__file__))
+MODEL_DIR: str = os.path.join(BASE_DIR, "models")
+FEATURE_STORE_PATH: str = os.path.join(MODEL_DIR, "feature_store.npz")
+
+FEATURE_NAMES: list[str] = [
+    "home_form_points", "home_goals_for_avg", "home_goals_against_avg",
+    "away_form_points", "away_goals_for_avg", "away_goals_against_avg",
+    "h2h_matches", "h2h_home_win_rate", "h2h_away_win_rate", "h2h_goal_diff_avg",
+]
+
+_NO_DATE = np.iinfo(np.int64).min
+
+
+class TeamFormStore:
+    """Agregados rolling por equipo y matriz head-to-head, todo en arrays."""
+
+    def __init__(self, window: int = 5, capacity: int = 32):
+        self.window = window
+        self.teams: list[str] = []
+        self.team_index: dict[str, int] = {}
+        self.last_date: int = _NO_DATE
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        w = self.window
+        self.goals_for = np.zeros((capacity, w), dtype=np.float32)
+        self.goals_against = np.zeros((capacity, w), dtype=np.float32)
+        self.points = np.zeros((capacity, w), dtype=np.float32)
+        self.sum_gf = np.zeros(capacity, dtype=np.float32)
+        self.sum_ga = np.zeros(capacity, dtype=np.float32)
+        self.sum_pts = np.zeros(capacity, dtype=np.float32)
+        self.played = np.zeros(capacity, dtype=np.int64)
+        # h2h[i, j] = (victorias, empates, derrotas) de i contra j
+        self.h2h = np.zeros((capacity, capacity, 3), dtype=np.int32)
+        self.h2h_gd = np.zeros((capacity, capacity), dtype=np.float32)
+
+    def _grow(self, capacity: int) -> None:
+        old = {name: getattr(self, name) for name in (
+            "goals_for", "goals_against", "points", "sum_gf", "sum_ga", "sum_pts", "played", "h2h", "h2h_gd",
+        )}
+        n = len(old["played"])
+        self._allocate(capacity)
+        for name, arr in old.items():
+            target = getattr(self, name)
+            if name in ("h2h", "h2h_gd"):
+                target[:n, :n] = arr
+            else:
+                target[:n] = arr
+
+    def index_of(self, team: str) -> int:
+        idx = self.team_index.get(team)
+        if idx is None:
+            idx = len(self.teams)
+            if idx >= len(self.played):
+                self._grow(2 * len(self.played))
+            self.teams.append(team)
+            self.team_index[team] = idx
+        return idx
+
+    def _push(self, t: int, gf: float, ga: float, pts: float) -> None:
+        pos = self.played[t] % self.window
+        if self.played[t] >= self.window:
+            self.sum_gf[t] -= self.goals_for[t, pos]
+            self.sum_ga[t] -= self.goals_against[t, pos]
+            self.sum_pts[t] -= self.points[t, pos]
+        self.goals_for[t, pos] = gf
+        self.goals_against[t, pos] = ga
+        self.points[t, pos] = pts
+        self.sum_gf[t] += gf
+        self.sum_ga[t] += ga
+        self.sum_pts[t] += pts
+        self.played[t] += 1
+
+    def update(self, home_team: str, away_team: str, home_goals: float, away_goals: float) -> None:
+        """Registra el resultado final de un partido (O(1))."""
+        h = self.index_of(home_team)
+        a = self.index_of(away_team)
+        if home_goals > away_goals:
+            home_pts, away_pts, outcome = 3.0, 0.0, 0
+        elif home_goals < away_goals:
+            home_pts, away_pts, outcome = 0.0, 3.0, 2
+        else:
+            home_pts, away_pts, outcome = 1.0, 1.0, 1
+        self._push(h, home_goals, away_goals, home_pts)
+        self._push(a, away_goals, home_goals, away_pts)
+        self.h2h[h, a, outcome] += 1
+        self.h2h[a, h, 2 - outcome] += 1
+        self.h2h_gd[h, a] += home_goals - away_goals
+        self.h2h_gd[a, h] += away_goals - home_goals
+
+    def _features_idx(self, h: np.ndarray, a: np.ndarray) -> np.ndarray:
+        """Features para arrays de indices; -1 representa un equipo desconocido."""
+        known_h = h >= 0
+        known_a = a >= 0
+        hi = np.where(known_h, h, 0)
+        ai = np.where(known_a, a, 0)
+
+        def rolling(idx, known):
+            n = np.minimum(self.played[idx], self.window).astype(np.float32)
+            n = np.where(known & (n > 0), n, np.nan)
+            return self.sum_pts[idx] / n, self.sum_gf[idx] / n, self.sum_ga[idx] / n
+
+        h_pts, h_gf, h_ga = rolling(hi, known_h)
+        a_pts, a_gf, a_ga = rolling(ai, known_a)
+
+        both = known_h & known_a
+        wdl = np.where(both[:, None], self.h2h[hi, ai], 0).astype(np.float32)
+        matches = wdl.sum(axis=1)
+        safe = np.where(matches > 0, matches, np.nan)
+        gd = np.where(both, self.h2h_gd[hi, ai], 0)
+
+        out = np.column_stack([
+            h_pts, h_gf, h_ga, a_pts, a_gf, a_ga,
+            matches, wdl[:, 0] / safe, wdl[:, 2] / safe, gd / safe,
+        ]).astype(np.float32)
+        # Sin historial: 0 (el modelo ve "sin informacion" en lugar de NaN)
+        return np.nan_to_num(out, nan=0.0)
+
+    def features(self, home_team: str, away_team: str) -> np.ndarray:
+        """Vector de FEATURE_NAMES para un partido (O(1))."""
+        h = np.array([self.team_index.get(home_team, -1)])
+        a = np.array([self.team_index.get(away_team, -1)])
+        return self._features_idx(h, a)[0]
+
+    def features_frame(self, home_teams, away_teams) -> pd.DataFrame:
+        """Features para muchos partidos a la vez, con el estado actual del store."""
+        h = np.array([self.team_index.get(t, -1) for t in home_teams], dtype=np.int64)
+        a = np.array([self.team_index.get(t, -1) for t in away_teams], dtype=np.int64)
+        return pd.DataFrame(self._features_idx(h, a), columns=FEATURE_NAMES)
+
+    def build_training_features(self, matches: pd.DataFrame) -> pd.DataFrame:
+        """Features point-in-time: cada fila ve solo los partidos anteriores a ella.
+
+        'matches' debe estar ordenado cronologicamente. El store queda con el
+        estado posterior al ultimo partido, listo para servir predicciones.
+        """
+        rows = np.zeros((len(matches), len(FEATURE_NAMES)), dtype=np.float32)
+        home = matches["home_team"].astype(str).to_numpy()
+        away = matches["away_team"].astype(str).to_numpy()
+        hg = matches["home_goals_fulltime"].to_numpy(dtype=float)
+        ag = matches["away_goals_fulltime"].to_numpy(dtype=float)
+        for i in range(len(matches)):
+            rows[i] = self.features(home[i], away[i])
+            self.update(home[i], away[i], hg[i], ag[i])
+        if "date" in matches.columns and len(matches):
+            self.last_date = max(self.last_date, int(pd.Timestamp(matches["date"].max()).value))
+        return pd.DataFrame(rows, columns=FEATURE_NAMES, index=matches.index)
+
+    def update_from_frame(self, matches: pd.DataFrame) -> int:
+        """Agrega solo los partidos posteriores a last_date. Devuelve cuantos se agregaron."""
+        if "date" in matches.columns:
+            if self.last_date != _NO_DATE:
+                dates = pd.to_datetime(matches["date"], utc=True)
+                matches = matches[dates > pd.Timestamp(self.last_date, tz="UTC")]
+            matches = matches.sort_values("date", kind="stable")
+        self.build_training_features(matches)
+        return len(matches)
+
+    def save(self, path: str = FEATURE_STORE_PATH) -> None:
+        n = len(self.teams)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            window=self.window,
+            last_date=self.last_date,
+            teams=np.array(self.teams, dtype=str),
+            goals_for=self.goals_for[:n],
+            goals_against=self.goals_against[:n],
+            points=self.points[:n],
+            sum_gf=self.sum_gf[:n],
+            sum_ga=self.sum_ga[:n],
+            sum_pts=self.sum_pts[:n],
+            played=self.played[:n],
+            h2h=self.h2h[:n, :n],
+            h2h_gd=self.h2h_gd[:n, :n],
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = FEATURE_STORE_PATH) -> "TeamFormStore":
+        data = np.load(path)
+        teams = [str(t) for t in data["teams"]]
+        store = cls(window=int(data["window"]), capacity=max(32, len(teams)))
+        n = len(teams)
+        for name in ("goals_for", "goals_against", "points", "sum_gf", "sum_ga", "sum_pts", "played"):
+            getattr(store, name)[:n] = data[name]
+        store.h2h[:n, :n] = data["h2h"]
+        store.h2h_gd[:n, :n] = data["h2h_gd"]
+        store.teams = teams
+        store.team_index = {t: i for i, t in enumerate(teams)}
+        store.last_date = int(data["last_date"])
+        return store
+
+
+def add_form_features(X: pd.DataFrame, store: TeamFormStore) -> pd.DataFrame:
+    """Anexa las columnas del store a un DataFrame con home_team/away_team."""
+    feats = store.features_frame(X["home_team"].astype(str), X["away_team"].astype(str))
+    feats.index = X.index
+    return pd.concat([X, feats], axis=1)
+
+
+def refresh_store(path: str = FEATURE_STORE_PATH, window: int = 5) -> tuple[TeamFormStore, int]:
+    """Carga el store (o lo crea) y le agrega los partidos nuevos del cache."""
+    from dataset import load_cache
+
+    store = TeamFormStore.load(path) if os.path.exists(path) else TeamFormStore(window=window)
+    added = store.update_from_frame(load_cache())
+    if added:
+        store.save(path)
+    return store, added
+
+
+if __name__ == "__main__":
+    store, added = refresh_store()
+    print(f"Feature store: {FEATURE_STORE_PATH}")
+    print(f"  Equipos          : {len(store.teams)}")
+    print(f"  Partidos nuevos  : {added}")
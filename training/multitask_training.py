@@ -1,11 +1,11 @@
 import os
-from typing import Tuple
+from typing import Optional, Tuple
 
 import numpy as np
 import pandas as pd
-import joblib
 
-from sklearn.model_selection import train_test_split, GridSearchCV, KFold
+from sklearn.model_selection import train_test_split
+from sklearn.base import clone
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
@@ -13,6 +13,12 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.multioutput import MultiOutputRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, accuracy_score, f1_score, classification_report
 
+from artifacts import profile_model, save_model, write_model_card
+from dataset import load_cache
+from evaluation import goals_to_result
+from features import FEATURE_NAMES, FEATURE_STORE_PATH, TeamFormStore
+from search import run_search
+
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DB_DIR = os.path.join(BASE_DIR, "database")
@@ -22,12 +28,16 @@ MODEL_DIR = os.path.join(BASE_DIR, "models")
 PATH_TRAIN = os.path.join(CLEAN_DIR, "2016-2024_liga_mx_clean.csv")
 
 
-def load_and_prepare(path: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
-    df = pd.read_csv(path)
+def load_and_prepare(
+    path: Optional[str] = None,
+    store: Optional[TeamFormStore] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
+    # default: typed columnar cache, refreshed incrementally from the raw CSVs
+    df = load_cache() if path is None else pd.read_csv(path)
 
     # keep relevant columns if present
     keep_cols = [
-        "home_team", "away_team",
+        "date", "home_team", "away_team",
         "home_goals_half_time", "away_goals_half_time",
         "home_goals_fulltime", "away_goals_fulltime",
     ]
@@ -50,6 +60,12 @@ def load_and_prepare(path: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
     )
 
     features = ["home_team", "away_team", "home_goals_half_time", "away_goals_half_time"]
+
+    # point-in-time team form / head-to-head features (rows must be chronological)
+    if store is not None:
+        df = pd.concat([df, store.build_training_features(df)], axis=1)
+        features = features + FEATURE_NAMES
+
     df = df.dropna(subset=features)
 
     X = df[features].copy()
@@ -59,23 +75,69 @@ def load_and_prepare(path: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
     return X, y_goals, y_result
 
 
-def goals_to_result(pred_goals: np.ndarray) -> np.ndarray:
-    # pred_goals is Nx2 array (home, away) possibly floats
-    preds_rounded = np.rint(pred_goals).astype(int)
-    preds_rounded = np.clip(preds_rounded, 0, None)
-    res = []
-    for h, a in preds_rounded:
-        if h > a:
-            res.append("H")
-        elif h < a:
-            res.append("A")
-        else:
-            res.append("D")
-    return np.array(res)
-
-
-def main():
-    X, y_goals, y_result = load_and_prepare(PATH_TRAIN)
+def select_compact_model(
+    best,
+    best_trial: dict,
+    trials: list,
+    refit,
+    X_sample: pd.DataFrame,
+    compress: int = 3,
+    mae_tolerance: float = 0.01,
+    max_size_mb: Optional[float] = None,
+    max_p99_ms: Optional[float] = None,
+    top_k: int = 4,
+):
+    # candidates trained on the full folds, within mae_tolerance (relative) of the best CV MAE
+    best_mae = -best_trial["mean_score"]
+    full = [t for t in trials if t.get("n_samples") is None]
+    close = sorted(
+        (t for t in full if -t["mean_score"] <= best_mae * (1 + mae_tolerance)),
+        key=lambda t: -t["mean_score"],
+    )[:top_k]
+    if not any(t["key"] == best_trial["key"] for t in close):
+        close.insert(0, best_trial)
+
+    sample = X_sample.head(512)
+    profiled = []
+    for trial in close:
+        model = best if trial["key"] == best_trial["key"] else refit(trial["params"])
+        profile = profile_model(model, sample, compress=compress)
+        size = profile.get("compressed_size_bytes", profile["size_bytes"])
+        print(
+            f"  MAE={-trial['mean_score']:.4f} size={size / 1e6:.2f}MB "
+            f"p50={profile['single_p50_ms']:.2f}ms p99={profile['single_p99_ms']:.2f}ms "
+            f"batch p50={profile['batch_p50_ms']:.2f}ms {trial['params']}"
+        )
+        fits = (max_size_mb is None or size <= max_size_mb * 1e6) and (
+            max_p99_ms is None or profile["single_p99_ms"] <= max_p99_ms
+        )
+        profiled.append((fits, profile["single_p99_ms"], size, trial, model, profile))
+
+    within_budget = [p for p in profiled if p[0]]
+    if not within_budget:
+        print("No candidate meets the size/latency budget; keeping the best-MAE model.")
+        _, _, _, trial, model, profile = next(p for p in profiled if p[3]["key"] == best_trial["key"])
+        return model, trial, profile
+
+    # fastest p99 first, then smallest artifact
+    _, _, _, trial, model, profile = min(within_budget, key=lambda p: (p[1], p[2]))
+    print("Selected params:", trial["params"])
+    return model, trial, profile
+
+
+def main(
+    search: str = "grid",
+    n_iter: int = 10,
+    form_features: bool = False,
+    compress: int = 3,
+    float32: bool = False,
+    mae_tolerance: float = 0.01,
+    max_size_mb: Optional[float] = None,
+    max_p99_ms: Optional[float] = None,
+    top_k: int = 4,
+):
+    store = TeamFormStore() if form_features else None
+    X, y_goals, y_result = load_and_prepare(store=store)
     print("Loaded dataset:", X.shape)
 
     X_train, X_test, y_goals_train, y_goals_test, y_result_train, y_result_test = train_test_split(
@@ -84,6 +146,8 @@ def main():
 
     cat_features = ["home_team", "away_team"]
     num_features = ["home_goals_half_time", "away_goals_half_time"]
+    if form_features:
+        num_features += FEATURE_NAMES
 
     preprocess = ColumnTransformer(
         transformers=[
@@ -97,35 +161,43 @@ def main():
     base_reg = RandomForestRegressor(random_state=42)
     multi_reg = MultiOutputRegressor(base_reg)
 
-    pipe = Pipeline([
-        ("preprocess", preprocess),
-        ("model", multi_reg),
-    ])
-
     param_grid = {
         "model__estimator__n_estimators": [100, 200],
         "model__estimator__max_depth": [None, 10],
         "model__estimator__min_samples_split": [2, 5],
     }
 
-    cv = KFold(n_splits=5, shuffle=True, random_state=42)
-
-    grid = GridSearchCV(
-        pipe,
-        param_grid=param_grid,
-        scoring="neg_mean_absolute_error",
-        cv=cv,
+    # Preprocessing is fitted once per fold and reused by every candidate;
+    # finished trials are persisted so an interrupted search resumes.
+    print(f"Fitting multi-output regressor (predicting final goals), search={search}...")
+    best, best_trial, trials = run_search(
+        preprocess,
+        multi_reg,
+        X_train,
+        y_goals_train,
+        param_grid,
+        strategy=search,
+        n_iter=n_iter,
+        n_splits=5,
         n_jobs=-1,
-        refit=True,
-        return_train_score=True,
+        run_name="multioutput",
+        random_state=42,
+    )
+    print("Best params:", best_trial["params"])
+    print("Best CV score (neg MAE):", best_trial["mean_score"])
+
+    # Size/latency-aware selection among candidates within mae_tolerance of the best
+    best, best_trial, profile = select_compact_model(
+        best, best_trial, trials,
+        lambda params: Pipeline([("preprocess", clone(preprocess)), ("model", clone(multi_reg))])
+        .set_params(**params).fit(X_train, y_goals_train),
+        X_test,
+        compress=compress,
+        mae_tolerance=mae_tolerance,
+        max_size_mb=max_size_mb,
+        max_p99_ms=max_p99_ms,
+        top_k=top_k,
     )
-
-    print("Fitting multi-output regressor (predicting final goals)...")
-    grid.fit(X_train, y_goals_train)
-    print("Best params:", grid.best_params_)
-    print("Best CV score (neg MAE):", grid.best_score_)
-
-    best = grid.best_estimator_
 
     # Predict goals on test
     y_pred_goals = best.predict(X_test)
@@ -149,9 +221,66 @@ def main():
     # Save model
     os.makedirs(MODEL_DIR, exist_ok=True)
     model_path = os.path.join(MODEL_DIR, "best_model_multioutput_regressor.joblib")
-    joblib.dump(best, model_path)
-    print("Saved multi-output model to:", model_path)
+    file_size = save_model(best, model_path, compress=compress, float32=float32)
+    print(f"Saved multi-output model to: {model_path} ({file_size / 1e6:.2f} MB)")
+
+    card_path = write_model_card(model_path, {
+        "params": best_trial["params"],
+        "cv_mae": -best_trial["mean_score"],
+        "test": {"mae_home": mae_home, "mae_away": mae_away, "accuracy": acc, "f1_macro": f1m},
+        "export": {"compress": compress, "float32": float32},
+        "selection": {
+            "mae_tolerance": mae_tolerance,
+            "max_size_mb": max_size_mb,
+            "max_p99_ms": max_p99_ms,
+        },
+        "profile": profile,
+        "features": list(X.columns),
+    })
+    print("Saved model card to:", card_path)
+
+    if store is not None:
+        store.save(FEATURE_STORE_PATH)
+        print("Saved feature store to:", FEATURE_STORE_PATH)
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the multi-output final-goals regressor.")
+    parser.add_argument(
+        "--search",
+        choices=["grid", "random", "halving"],
+        default="grid",
+        help="Hyperparameter search strategy (results persist in search_runs/ and resume).",
+    )
+    parser.add_argument("--n-iter", type=int, default=10, help="Candidates sampled with --search random.")
+    parser.add_argument(
+        "--form-features",
+        action="store_true",
+        help="Add rolling team form and head-to-head features from the feature store.",
+    )
+    parser.add_argument("--compress", type=int, default=3, help="joblib compression level (0-9) for the artifact.")
+    parser.add_argument("--float32", action="store_true", help="Quantize leaf values to float32 precision.")
+    parser.add_argument(
+        "--mae-tolerance",
+        type=float,
+        default=0.01,
+        help="Relative CV MAE slack for preferring a smaller/faster model (0.01 = 1%%).",
+    )
+    parser.add_argument("--max-size-mb", type=float, help="Serialized size budget for the selected model.")
+    parser.add_argument("--max-p99-ms", type=float, help="Single-row p99 latency budget for the selected model.")
+    parser.add_argument("--top-k", type=int, default=4, help="Candidates profiled during selection.")
+    args = parser.parse_args()
+
+    main(
+        search=args.search,
+        n_iter=args.n_iter,
+        form_features=args.form_features,
+        compress=args.compress,
+        float32=args.float32,
+        mae_tolerance=args.mae_tolerance,
+        max_size_mb=args.max_size_mb,
+        max_p99_ms=args.max_p99_ms,
+        top_k=args.top_k,
+    )
@@ -0,0 +1,238 @@
+import os
+import json
+import math
+import time
+import hashlib
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed, hash as joblib_hash
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler
+from sklearn.pipeline import Pipeline
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+SEARCH_DIR = os.path.join(BASE_DIR, "search_runs")
+
+# Prefijo de los hiperparametros del modelo dentro del Pipeline
+# ("preprocess" -> "model"), igual que en el param_grid de GridSearchCV.
+MODEL_PREFIX = "model__"
+
+
+def search_context(preprocess, model, X: pd.DataFrame, y: np.ndarray, cv) -> str:
+    """Hash de todo lo que, ademas de los parametros, determina el puntaje de un ensayo.
+
+    Datos (X, y), columnas, preprocesamiento y modelo base sin ajustar, folds y
+    version de sklearn: si cualquiera cambia (p. ej. tras reconstruir el cache o
+    con --form-features) los ensayos registrados dejan de coincidir.
+    """
+    return joblib_hash((
+        X, y, list(X.columns), clone(preprocess), clone(model),
+        type(cv).__name__, cv.get_n_splits(), getattr(cv, "shuffle", None), getattr(cv, "random_state", None),
+        sklearn.__version__,
+    ))
+
+
+def _trial_key(context: str, params: dict[str, Any], rung: int, n_samples: int | None) -> str:
+    """Identificador estable de un ensayo (contexto + parametros + rung + tamaño de muestra)."""
+    raw = json.dumps({"context": context, "params": params, "rung": rung, "n": n_samples}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def _model_params(params: dict[str, Any]) -> dict[str, Any]:
+    return {k[len(MODEL_PREFIX):]: v for k, v in params.items() if k.startswith(MODEL_PREFIX)}
+
+
+def _prepare_folds(preprocess, X: pd.DataFrame, y: np.ndarray, cv) -> list[tuple]:
+    """Ajusta el preprocesamiento una sola vez por fold y guarda las matrices transformadas.
+
+    Todos los candidatos de la busqueda reutilizan estas matrices, por lo que el
+    ColumnTransformer (OneHotEncoder + StandardScaler) no se reajusta por candidato.
+    """
+    folds = []
+    for train_idx, val_idx in cv.split(X, y):
+        pre = clone(preprocess)
+        Xt_train = pre.fit_transform(X.iloc[train_idx])
+        Xt_val = pre.transform(X.iloc[val_idx])
+        folds.append((Xt_train, y[train_idx], Xt_val, y[val_idx]))
+    return folds
+
+
+def _fit_fold(model, params: dict[str, Any], fold: tuple, n_samples: int | None, seed: int) -> tuple[float, float]:
+    # n_samples=None entrena con el fold completo
+    Xt_train, y_train, Xt_val, y_val = fold
+    if n_samples is not None and n_samples < Xt_train.shape[0]:
+        rows = np.random.RandomState(seed).choice(Xt_train.shape[0], n_samples, replace=False)
+        Xt_train, y_train = Xt_train[rows], y_train[rows]
+    start = time.perf_counter()
+    est = clone(model).set_params(**_model_params(params))
+    est.fit(Xt_train, y_train)
+    score = -mean_absolute_error(y_val, est.predict(Xt_val))
+    return score, time.perf_counter() - start
+
+
+class TrialLog:
+    """Registro JSONL de ensayos terminados; permite reanudar una busqueda interrumpida."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Ultima linea truncada por una interrupcion
+                        continue
+                    self.records[record["key"]] = record
+
+    def append(self, record: dict) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.records[record["key"]] = record
+
+
+def _evaluate(
+    model,
+    context: str,
+    candidates: list[dict[str, Any]],
+    folds: list[tuple],
+    n_samples: int | None,
+    rung: int,
+    log: TrialLog,
+    n_jobs: int,
+    seed: int,
+) -> list[dict]:
+    """Evalua los candidatos pendientes en paralelo (candidato x fold) y los registra."""
+    records = []
+    pending = []
+    for params in candidates:
+        key = _trial_key(context, params, rung, n_samples)
+        if key in log.records:
+            records.append(log.records[key])
+        else:
+            pending.append((key, params))
+
+    if pending:
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_fold)(model, params, fold, n_samples, seed + i)
+            for _, params in pending
+            for i, fold in enumerate(folds)
+        )
+        for t, (key, params) in enumerate(pending):
+            fold_results = results[t * len(folds):(t + 1) * len(folds)]
+            scores = [s for s, _ in fold_results]
+            record = {
+                "key": key,
+                "params": params,
+                "rung": rung,
+                "n_samples": n_samples,
+                "fold_scores": scores,
+                "mean_score": float(np.mean(scores)),
+                "std_score": float(np.std(scores)),
+                # Suma de los tiempos de ajuste de cada fold (no es tiempo de reloj: corren en paralelo)
+                "fit_seconds": float(sum(w for _, w in fold_results)),
+            }
+            log.append(record)
+            records.append(record)
+            print(
+                f"  [rung {rung}] n={n_samples or 'all'} score={record['mean_score']:.4f} "
+                f"fit={record['fit_seconds']:.2f}s {params}"
+            )
+    return records
+
+
+def run_search(
+    preprocess,
+    model,
+    X: pd.DataFrame,
+    y,
+    param_grid: dict[str, Iterable],
+    strategy: str = "grid",
+    n_iter: int = 10,
+    factor: int = 3,
+    min_resources: int | None = None,
+    n_splits: int = 5,
+    n_jobs: int = -1,
+    run_name: str = "multioutput",
+    random_state: int = 42,
+) -> tuple[Pipeline, dict, list[dict]]:
+    """Busqueda de hiperparametros reanudable con preprocesamiento cacheado por fold.
+
+    Parametros
+    ----------
+    strategy : str
+        'grid' evalua todas las combinaciones, 'random' muestrea n_iter de ellas
+        y 'halving' aplica successive halving sobre el numero de filas de
+        entrenamiento (se conserva 1/factor de los candidatos en cada rung).
+    run_name : str
+        Nombre del registro en SEARCH_DIR. Si ya existe, los ensayos terminados
+        se leen de disco y no se vuelven a entrenar, siempre que coincidan los
+        datos, las columnas, el preprocesamiento, los folds y la version de
+        sklearn (ver search_context).
+
+    Retorna (pipeline reajustado con los mejores parametros, mejores parametros,
+    registros de todos los ensayos).
+    """
+    y = np.asarray(y)
+    cv = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    log = TrialLog(os.path.join(SEARCH_DIR, f"{run_name}_{strategy}.jsonl"))
+    if log.records:
+        print(f"Reanudando busqueda: {len(log.records)} ensayos ya registrados en {log.path}")
+
+    context = search_context(preprocess, model, X, y, cv)
+    start = time.perf_counter()
+    folds = _prepare_folds(preprocess, X, y, cv)
+    print(f"Preprocesamiento por fold: {time.perf_counter() - start:.2f}s ({n_splits} folds)")
+
+    if strategy == "random":
+        candidates = list(ParameterSampler(param_grid, n_iter=n_iter, random_state=random_state))
+    else:
+        candidates = list(ParameterGrid(param_grid))
+
+    max_samples = min(fold[0].shape[0] for fold in folds)
+    records: list[dict] = []
+
+    if strategy == "halving":
+        n_rungs = max(1, math.ceil(math.log(len(candidates), factor)) + 1) if len(candidates) > 1 else 1
+        if min_resources is None:
+            min_resources = max(50, max_samples // factor ** (n_rungs - 1))
+        n_samples = min(min_resources, max_samples)
+        rung = 0
+        while True:
+            full = n_samples >= max_samples
+            rung_records = _evaluate(
+                model, context, candidates, folds, None if full else n_samples, rung, log, n_jobs, random_state
+            )
+            records.extend(rung_records)
+            if len(candidates) <= 1 or full:
+                break
+            keep = max(1, len(candidates) // factor)
+            ranked = sorted(rung_records, key=lambda r: r["mean_score"], reverse=True)
+            candidates = [r["params"] for r in ranked[:keep]]
+            n_samples = min(n_samples * factor, max_samples)
+            rung += 1
+        final = rung_records
+    else:
+        records = _evaluate(model, context, candidates, folds, None, 0, log, n_jobs, random_state)
+        final = records
+
+    best = max(final, key=lambda r: r["mean_score"])
+    total_time = sum(r["fit_seconds"] for r in records)
+    print(f"Ensayos: {len(records)}, tiempo acumulado de entrenamiento: {total_time:.2f}s")
+
+    pipe = Pipeline([("preprocess", clone(preprocess)), ("model", clone(model))])
+    pipe.set_params(**best["params"])
+    pipe.fit(X, y)
+    return pipe, best, records
@@ -1,10 +1,11 @@
 import os
 import glob
 from typing import Any
-import numpy as np
 import joblib  # type: ignore[import-untyped]
 import pandas as pd
 
+from evaluation import backtest, load_match_frame, predict_matches
+
 BASE_DIR: str = os.path.abspath(os.path.dirname(__file__))
 MODEL_DIR: str = os.path.join(BASE_DIR, "models")
 
@@ -66,31 +67,6 @@ def load_model(model_path: str | None = None, test: bool = False) -> Any:
     return joblib.load(model_path)
 
 
-def _is_multioutput(raw: np.ndarray) -> bool:
-    """Determina si la salida del modelo corresponde a un regresor multi-salida.
-
-    El regresor multi-salida devuelve un array 2-D de forma (n_samples, 2)
-    con los goles predichos (home, away) como valores numericos continuos.
-    Los clasificadores devuelven un array 1-D de etiquetas ('H', 'A', 'D').
-    """
-    arr = np.asarray(raw)
-    return arr.ndim == 2 and arr.shape[1] == 2 and np.issubdtype(arr.dtype, np.number)
-
-
-def _goals_to_result(home_goals: float, away_goals: float) -> str:
-    """Deriva el resultado del partido a partir de los goles predichos.
-
-    Redondea al entero mas cercano y recorta a 0 para evitar goles negativos.
-    """
-    h = max(0, round(home_goals))
-    a = max(0, round(away_goals))
-    if h > a:
-        return "H"
-    elif h < a:
-        return "A"
-    return "D"
-
-
 def predict_match(
     model: Any,
     home_team: str,
@@ -105,33 +81,33 @@ def predict_match(
         - home_goals: goles predichos del equipo local  (solo para regresor multi-salida)
         - away_goals: goles predichos del equipo visitante (solo para regresor multi-salida)
         - model_type: tipo de modelo utilizado ('classifier' o 'multioutput_regressor')
+
+    Para muchos partidos usar predict_matches, que hace una sola llamada al modelo.
     """
-    X = pd.DataFrame([{
-        "home_team": home_team,
-        "away_team": away_team,
-        "home_goals_half_time": home_ht,
-        "away_goals_half_time": away_ht,
-    }])
-
-    raw = model.predict(X)
-
-    if _is_multioutput(raw):
-        home_goals = float(raw[0, 0])
-        away_goals = float(raw[0, 1])
-        result = _goals_to_result(home_goals, away_goals)
-        return {
-            "result": result,
-            "home_goals": max(0, round(home_goals)),
-            "away_goals": max(0, round(away_goals)),
-            "model_type": "multioutput_regressor",
-        }
-    else:
-        return {
-            "result": str(raw[0]),
-            "home_goals": None,
-            "away_goals": None,
-            "model_type": "classifier",
-        }
+    X = pd.DataFrame({
+        "home_team": [home_team],
+        "away_team": [away_team],
+        "home_goals_half_time": [home_ht],
+        "away_goals_half_time": [away_ht],
+    })
+    row = predict_matches(model, X).iloc[0]
+    return {
+        "result": row["result"],
+        "home_goals": None if row["home_goals"] is None else int(row["home_goals"]),
+        "away_goals": None if row["away_goals"] is None else int(row["away_goals"]),
+        "model_type": row["model_type"],
+    }
+
+
+def predict_csv(model: Any, path: str, season: str | None = None) -> pd.DataFrame:
+    """Predice todos los partidos de un CSV en una sola llamada al modelo.
+
+    Devuelve los partidos del archivo con las columnas de prediccion anexadas
+    (pred_result, pred_home_goals, pred_away_goals).
+    """
+    matches = load_match_frame(path, season=season)
+    preds = predict_matches(model, matches)
+    return matches.join(preds[["result", "home_goals", "away_goals"]].add_prefix("pred_"))
 
 
 if __name__ == "__main__":
@@ -143,8 +119,43 @@ if __name__ == "__main__":
         action="store_true",
         help="Carga los tres modelos de prueba (sufijo _test.joblib) y compara sus predicciones.",
     )
+    parser.add_argument(
+        "--backtest",
+        metavar="CSV",
+        help="Evalua el modelo sobre todos los partidos de un CSV y reporta el rendimiento.",
+    )
+    parser.add_argument(
+        "--season",
+        help="Con --backtest, filtra la temporada indicada (requiere columna 'season').",
+    )
     args = parser.parse_args()
 
+    if args.backtest:
+        model_path = find_latest_model(test=args.test)
+        model = load_model(model_path)
+        try:
+            matches = load_match_frame(args.backtest, season=args.season)
+        except ValueError as e:
+            parser.error(str(e))
+        report = backtest(model, matches)
+
+        print("=" * 55)
+        print("BACKTEST")
+        print("=" * 55)
+        print(f"  Modelo           : {os.path.basename(model_path)}")
+        print(f"  Archivo          : {args.backtest}")
+        if args.season:
+            print(f"  Temporada        : {args.season}")
+        print(f"  Partidos         : {report['matches']}")
+        if report["accuracy"] is not None:
+            print(f"  Accuracy (H/D/A) : {report['accuracy']:.4f}")
+        if "mae_home" in report:
+            print(f"  MAE goles        : {report['mae_home']:.4f} - {report['mae_away']:.4f}")
+        print(f"  Tiempo           : {report['seconds'] * 1000:.1f} ms")
+        print(f"  Rendimiento      : {report['matches_per_second']:,.0f} partidos/s")
+        print("=" * 55)
+        raise SystemExit(0)
+
     # Datos de entrada para la prediccion de prueba.
     home_team  = "Club America"
     away_team  = "Tigres UANL"
@@ -0,0 +1,254 @@
+"""Backtesting walk-forward por temporada de los candidatos best_model_*.joblib.
+
+Cada fold entrena una copia sin ajustar del candidato (mismos hiperparametros)
+con todas las temporadas anteriores y la evalua en la siguiente, que es como
+se usa el modelo en la practica: se entrena con lo jugado y se predice lo que
+viene. Un train_test_split aleatorio mezcla partidos futuros en el
+entrenamiento y sobreestima el rendimiento.
+
+Los folds (candidato x temporada) corren en un pool de procesos de joblib. El
+dataset se vuelca una sola vez como arrays de NumPy y cada worker lo abre con
+mmap_mode="r": todos comparten las mismas paginas de solo lectura en lugar de
+recibir una copia serializada por tarea. Cada fold terminado se registra en
+BACKTEST_DIR con una clave derivada del hash de los datos del fold y de la
+configuracion del modelo, asi que volver a correr solo entrena lo que cambio.
+
+Uso:
+    python walkforward.py                   # todos los best_model_*.joblib
+    python walkforward.py --min-train-seasons 4 --n-jobs 4
+"""
+import os
+import glob
+import json
+import time
+import hashlib
+import datetime
+from typing import Any
+
+import joblib  # type: ignore[import-untyped]
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.base import clone, is_regressor
+from sklearn.metrics import accuracy_score, f1_score
+
+from dataset import load_cache
+from evaluation import TARGETS, actual_results, goals_to_result, is_multioutput
+from features import FEATURE_NAMES, TeamFormStore
+from search import TrialLog
+
+BASE_DIR: str = os.path.abspath(os.path.dirname(__file__))
+MODEL_DIR: str = os.path.join(BASE_DIR, "models")
+BACKTEST_DIR: str = os.path.join(BASE_DIR, "backtest_runs")
+SHARED_PATH: str = os.path.join(BACKTEST_DIR, "shared_data.joblib")
+
+CATEGORICAL: list[str] = ["home_team", "away_team"]
+NUMERIC: list[str] = ["home_goals_half_time", "away_goals_half_time"] + FEATURE_NAMES
+
+
+def build_shared_data(matches: pd.DataFrame) -> dict[str, np.ndarray]:
+    """Convierte los partidos (en orden cronologico) en arrays planos aptos para memmap.
+
+    Los equipos se guardan como codigos enteros mas un vocabulario de ancho
+    fijo; las features de forma se calculan point-in-time sobre toda la serie,
+    asi que cada fila solo ve partidos anteriores y no hay fuga entre folds.
+    """
+    matches = matches.dropna(subset=["season"]).reset_index(drop=True)
+    form = TeamFormStore().build_training_features(matches)
+    teams = pd.Categorical(pd.concat([matches["home_team"], matches["away_team"]]).astype(str))
+    codes = teams.codes.reshape(2, -1).T.astype(np.int32)
+    numeric = pd.concat([matches[NUMERIC[:2]], form], axis=1)[NUMERIC]
+    return {
+        "season": matches["season"].to_numpy(dtype=np.int16),
+        "teams": np.asarray(teams.categories, dtype=str),
+        "team_codes": np.ascontiguousarray(codes),
+        "numeric": numeric.to_numpy(dtype=np.float64),
+        "goals": matches[TARGETS].to_numpy(dtype=np.float64),
+        "result": actual_results(matches).astype("<U1"),
+    }
+
+
+def _frame(data: dict[str, np.ndarray], columns: list[str], rows: np.ndarray) -> pd.DataFrame:
+    """DataFrame con las columnas que espera el modelo, solo para las filas del fold."""
+    out = {}
+    for column in columns:
+        if column in CATEGORICAL:
+            codes = data["team_codes"][rows, CATEGORICAL.index(column)]
+            out[column] = data["teams"][codes].astype(object)
+        else:
+            out[column] = data["numeric"][rows, NUMERIC.index(column)]
+    return pd.DataFrame(out, columns=columns)
+
+
+def _run_fold(shared_path: str, model: Any, columns: list[str], target: str, season: int) -> dict[str, Any]:
+    """Entrena con las temporadas < season y evalua en season (corre en un worker)."""
+    data = joblib.load(shared_path, mmap_mode="r")
+    seasons = data["season"]
+    train = np.flatnonzero(seasons < season)
+    test = np.flatnonzero(seasons == season)
+    y_train = data[target][train]
+
+    start = time.perf_counter()
+    est = clone(model).fit(_frame(data, columns, train), y_train)
+    fit_seconds = time.perf_counter() - start
+
+    X_test = _frame(data, columns, test)
+    start = time.perf_counter()
+    raw = est.predict(X_test)
+    predict_seconds = time.perf_counter() - start
+
+    actual = data["result"][test]
+    predicted = goals_to_result(raw) if is_multioutput(raw) else np.asarray(raw).astype(str)
+    # Referencia: predecir siempre el resultado mas frecuente del entrenamiento
+    labels, counts = np.unique(data["result"][train], return_counts=True)
+    record: dict[str, Any] = {
+        "season": int(season),
+        "n_train": int(len(train)),
+        "n_test": int(len(test)),
+        "accuracy": float(accuracy_score(actual, predicted)),
+        "f1_macro": float(f1_score(actual, predicted, average="macro")),
+        "baseline_accuracy": float(np.mean(actual == labels[np.argmax(counts)])),
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+    }
+    if is_multioutput(raw):
+        goals = data["goals"][test]
+        record["mae_home"] = float(np.mean(np.abs(raw[:, 0] - goals[:, 0])))
+        record["mae_away"] = float(np.mean(np.abs(raw[:, 1] - goals[:, 1])))
+    return record
+
+
+def config_hash(model: Any) -> str:
+    """Hash de los hiperparametros (copia sin ajustar) y de la version de sklearn."""
+    return joblib.hash((clone(model), sklearn.__version__))
+
+
+def fold_key(data: dict[str, np.ndarray], columns: list[str], target: str, season: int, config: str) -> str:
+    # Los datos del fold son todas las filas con temporada <= season
+    rows = np.flatnonzero(data["season"] <= season)
+    data_hash = joblib.hash((
+        columns, target,
+        data["season"][rows], data["team_codes"][rows], data["teams"],
+        data["numeric"][rows], data["goals"][rows],
+    ))
+    raw = json.dumps({"data": data_hash, "config": config, "season": season}, sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def load_candidates(pattern: str) -> list[tuple[str, Any, list[str], str]]:
+    """(nombre, modelo, columnas, objetivo) de cada artefacto que se puede reentrenar."""
+    candidates = []
+    for model_path in sorted(glob.glob(pattern)):
+        name = os.path.basename(model_path)
+        model = joblib.load(model_path)
+        columns = [str(c) for c in getattr(model, "feature_names_in_", [])]
+        unknown = [c for c in columns if c not in CATEGORICAL + NUMERIC]
+        if not columns or unknown:
+            print(f"[OMITIDO] {name}: columnas no disponibles {unknown or '(desconocidas)'}")
+            continue
+        candidates.append((name, model, columns, "goals" if is_regressor(model) else "result"))
+    return candidates
+
+
+def summarize(folds: list[dict[str, Any]]) -> dict[str, Any]:
+    summary: dict[str, Any] = {"folds": len(folds), "n_test": sum(f["n_test"] for f in folds)}
+    for metric in ("accuracy", "f1_macro", "baseline_accuracy", "mae_home", "mae_away"):
+        values = [f[metric] for f in folds if metric in f]
+        if values:
+            summary[metric] = float(np.mean(values))
+            summary[f"{metric}_std"] = float(np.std(values))
+    summary["fit_seconds"] = float(sum(f["fit_seconds"] for f in folds))
+    return summary
+
+
+def run_walkforward(
+    pattern: str = os.path.join(MODEL_DIR, "best_model_*.joblib"),
+    min_train_seasons: int = 3,
+    n_jobs: int = -1,
+    run_name: str = "walkforward",
+) -> dict[str, Any]:
+    """Evalua cada candidato con folds train-on-past / test-on-next y devuelve el reporte."""
+    data = build_shared_data(load_cache())
+    os.makedirs(BACKTEST_DIR, exist_ok=True)
+    joblib.dump(data, SHARED_PATH)  # sin compresion: requisito para mmap_mode
+
+    seasons = [int(s) for s in np.unique(data["season"])]
+    test_seasons = seasons[min_train_seasons:]
+    if not test_seasons:
+        raise ValueError(f"Se necesitan mas de {min_train_seasons} temporadas (hay {len(seasons)})")
+
+    candidates = load_candidates(pattern)
+    log = TrialLog(os.path.join(BACKTEST_DIR, f"{run_name}.jsonl"))
+    results: dict[str, dict[int, dict]] = {name: {} for name, *_ in candidates}
+    pending = []
+    for name, model, columns, target in candidates:
+        config = config_hash(model)
+        for season in test_seasons:
+            key = fold_key(data, columns, target, season, config)
+            if key in log.records:
+                results[name][season] = log.records[key]
+            else:
+                pending.append((key, name, model, columns, target, season))
+    print(f"Folds: {len(candidates) * len(test_seasons)} ({len(pending)} por entrenar), temporadas de prueba: {test_seasons}")
+
+    if pending:
+        start = time.perf_counter()
+        records = Parallel(n_jobs=n_jobs, return_as="generator")(
+            delayed(_run_fold)(SHARED_PATH, model, columns, target, season)
+            for _, _, model, columns, target, season in pending
+        )
+        for (key, name, *_), record in zip(pending, records):
+            record = {"key": key, "model": name, **record}
+            log.append(record)
+            results[name][record["season"]] = record
+            print(f"  {name} {record['season']}: acc={record['accuracy']:.4f} f1={record['f1_macro']:.4f}")
+        print(f"Entrenamiento en paralelo: {time.perf_counter() - start:.2f}s")
+
+    models = {}
+    for name, folds in results.items():
+        ordered = [folds[s] for s in test_seasons]
+        models[name] = {"summary": summarize(ordered), "folds": ordered}
+    ranking = sorted(models, key=lambda n: models[n]["summary"]["accuracy"], reverse=True)
+    return {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "sklearn_version": sklearn.__version__,
+        "seasons": seasons,
+        "test_seasons": test_seasons,
+        "ranking": ranking,
+        "models": models,
+    }
+
+
+def print_report(report: dict[str, Any]) -> None:
+    seasons = report["test_seasons"]
+    header = f"{'modelo':<45} " + " ".join(f"{s:>6}" for s in seasons) + f" {'media':>7} {'±':>6} {'f1':>6} {'base':>6}"
+    print(header)
+    print("-" * len(header))
+    for name in report["ranking"]:
+        summary = report["models"][name]["summary"]
+        accs = " ".join(f"{f['accuracy']:>6.3f}" for f in report["models"][name]["folds"])
+        print(
+            f"{name:<45} {accs} {summary['accuracy']:>7.4f} {summary['accuracy_std']:>6.3f} "
+            f"{summary['f1_macro']:>6.3f} {summary['baseline_accuracy']:>6.3f}"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backtesting walk-forward por temporada de los modelos exportados.")
+    parser.add_argument("--pattern", default=os.path.join(MODEL_DIR, "best_model_*.joblib"),
+                        help="Glob de los artefactos candidatos.")
+    parser.add_argument("--min-train-seasons", type=int, default=3,
+                        help="Temporadas de entrenamiento del primer fold.")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Procesos del pool (-1 = todos los CPU).")
+    parser.add_argument("--run-name", default="walkforward", help="Registro de folds en backtest_runs/.")
+    args = parser.parse_args()
+
+    report = run_walkforward(args.pattern, args.min_train_seasons, args.n_jobs, args.run_name)
+    print_report(report)
+    report_path = os.path.join(BACKTEST_DIR, f"{args.run_name}_report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print("Reporte:", report_path)